@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Connection reuse benchmark for the shared HTTP client layer.
+
+Sends sequential requests to the local stand-in server, building a fresh
+model for every request as the CLI and daemon do, and counts the TCP
+connections the server saw. Compares models built by `create_model` (which
+share one pooled client) against bare ChatOpenAI instances with their own
+default clients.
+
+Usage:
+    python benchmarks/connections.py
+    python benchmarks/connections.py --requests 200 --latency 0.01
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.mock_server import MockOpenAIServer  # noqa: E402
+from gpt4shell import create_model  # noqa: E402
+
+
+def _measure(build_model, requests, latency):
+    with MockOpenAIServer(response_text="ok", latency=latency) as server:
+        timings = []
+        for _ in range(requests):
+            model = build_model(server.url)
+            start = time.perf_counter()
+            model.invoke("hi")
+            timings.append((time.perf_counter() - start) * 1000)
+        return {
+            "requests": requests,
+            "connections": len(server.connections),
+            "requests_per_connection": round(requests / len(server.connections), 2),
+            "mean_ms": round(statistics.mean(timings), 3),
+            "p95_ms": round(sorted(timings)[int(len(timings) * 0.95) - 1], 3),
+        }
+
+
+def run(requests, latency):
+    from langchain_openai import ChatOpenAI
+
+    return {
+        "unshared_client": _measure(lambda url: ChatOpenAI(openai_api_base=url), requests, latency),
+        "shared_pool": _measure(lambda url: create_model({"api_base": url}), requests, latency),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTTP connection reuse across models")
+    parser.add_argument("--requests", type=int, default=50, help="Sequential requests per scenario")
+    parser.add_argument("--latency", type=float, default=0.0, help="Server latency per request in seconds")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "mock-key")
+    print(json.dumps(run(args.requests, args.latency), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
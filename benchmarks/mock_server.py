@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible stand-in server.
+
+Implements just enough of `POST /v1/chat/completions` for LangChain's
+ChatOpenAI to talk to it, both as a single JSON response and as a
+Server-Sent Events stream, and of `POST /v1/embeddings` for
+OpenAIEmbeddings (hashed bags of words, so rewordings come out similar). Point gpt4shell at it through `api_base`:
+
+    python -m benchmarks.mock_server --port 8089 --latency 0.2 --tokens-per-second 50
+    python -m benchmarks.mock_server --error-rate 0.1   # answer 10% of requests with a 500
+    # ~/.gpt4shell/config.json: {"api_base": "http://127.0.0.1:8089/v1"}
+    OPENAI_API_KEY=mock gpt --stream "anything"
+
+In tests it is used as a context manager:
+
+    with MockOpenAIServer(response_text="Hello there") as server:
+        config["api_base"] = server.url
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_RESPONSE = "This is a mock answer from the local stand-in server."
+
+EMBEDDING_DIMENSIONS = 256
+
+
+def split_tokens(text):
+    """Split text into word-sized pseudo tokens, keeping trailing whitespace."""
+    return re.findall(r"\S+\s*|\s+", text)
+
+
+def bag_of_words(text, dimensions=EMBEDDING_DIMENSIONS):
+    """Embed text as hashed word counts; questions sharing most words score close."""
+    vector = [0.0] * dimensions
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        vector[zlib.crc32(word.encode()) % dimensions] += 1.0
+    return vector
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockOpenAI/1.0"
+    # Headers and body go out in separate writes; without this, Nagle's
+    # algorithm and delayed ACKs add ~40ms to every keep-alive response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        # Keep benchmark and test output clean
+        pass
+
+    def do_POST(self):
+        mock = self.server.mock
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        mock._record(self, body)
+
+        path = self.path.rstrip("/")
+        if path.endswith("/embeddings"):
+            self._send_embeddings(body)
+            return
+        if not path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        limited = mock._check_rate_limit()
+        if limited is not None:
+            self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests",
+                                            "code": "rate_limit_exceeded"}},
+                            headers={"Retry-After": limited} if limited else None)
+            return
+
+        if mock.latency:
+            time.sleep(mock.latency)
+
+        if mock._should_fail():
+            self._send_json(mock.error_status, {"error": {"message": "Simulated server error",
+                                                          "type": "server_error"}})
+            return
+
+        if body.get("stream"):
+            self._send_stream(body)
+        else:
+            self._send_completion(body)
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_embeddings(self, body):
+        texts = body.get("input", [])
+        texts = [texts] if isinstance(texts, str) else texts
+        self._send_json(200, {
+            "object": "list",
+            "data": [{"object": "embedding", "index": index, "embedding": bag_of_words(text)}
+                     for index, text in enumerate(texts)],
+            "model": body.get("model", "mock"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+    def _completion_text(self, body):
+        return self.server.mock.response_for(body)
+
+    def _send_completion(self, body):
+        mock = self.server.mock
+        text = self._completion_text(body)
+        tokens = split_tokens(text)
+        if mock.tokens_per_second:
+            time.sleep(len(tokens) / mock.tokens_per_second)
+        prompt_tokens = sum(len(split_tokens(m.get("content") or "")) for m in body.get("messages", []))
+        self._send_json(200, {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(tokens),
+                "total_tokens": prompt_tokens + len(tokens),
+            },
+        })
+
+    def _send_stream(self, body):
+        mock = self.server.mock
+        model = body.get("model", "mock")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta, finish_reason=None):
+            chunk = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+
+        event({"role": "assistant", "content": ""})
+        for token in split_tokens(self._completion_text(body)):
+            if mock.tokens_per_second:
+                time.sleep(1 / mock.tokens_per_second)
+            event({"content": token})
+        event({}, finish_reason="stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class _Server(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients giving up at a deadline hang up mid-answer; that is not a server error
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class MockOpenAIServer:
+    """
+    Threaded OpenAI-compatible server bound to localhost.
+
+    Args:
+        response_text: Text returned for every request (or a callable taking the
+            request body and returning the text).
+        latency: Seconds to wait before the first byte of every response.
+        tokens_per_second: Generation speed; 0 sends everything at once.
+        port: Port to bind; 0 picks a free one.
+        rate_limit: Requests allowed per `rate_limit_window` seconds before
+            answering 429; None disables rate limiting.
+        rate_limit_window: Length of the rate limit window in seconds.
+        send_retry_after: Whether 429 responses carry a Retry-After header.
+        error_rate: Share of requests answered with `error_status` after the latency.
+        error_status: HTTP status of simulated errors.
+        seed: Seed for choosing which requests fail, for repeatable runs.
+    """
+
+    def __init__(self, response_text=DEFAULT_RESPONSE, latency=0.0, tokens_per_second=0, port=0,
+                 rate_limit=None, rate_limit_window=1.0, send_retry_after=True,
+                 error_rate=0.0, error_status=500, seed=None):
+        self.response_text = response_text
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.send_retry_after = send_retry_after
+        self.rate_limited = 0
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.errors = 0
+        self._random = random.Random(seed)
+        # (host, port) of every client connection seen; one entry per TCP connection
+        self.connections = set()
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self.requests = []
+        self._lock = threading.Lock()
+        self._httpd = _Server(("127.0.0.1", port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self._thread = None
+
+    @property
+    def url(self):
+        """Base URL to use as `api_base`."""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def response_for(self, body):
+        if callable(self.response_text):
+            return self.response_text(body)
+        return self.response_text
+
+    def _record(self, handler, body):
+        with self._lock:
+            self.requests.append(body)
+            self.connections.add(handler.client_address)
+
+    def _check_rate_limit(self):
+        """Return None if the request is admitted, else the Retry-After value ("" for none)."""
+        if self.rate_limit is None:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.rate_limit_window:
+                self._window_start = now
+                self._window_count = 0
+            if self._window_count < self.rate_limit:
+                self._window_count += 1
+                return None
+            self.rate_limited += 1
+            remaining = self.rate_limit_window - (now - self._window_start)
+            return f"{remaining:.3f}" if self.send_retry_after else ""
+
+    def _should_fail(self):
+        if not self.error_rate:
+            return False
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+            self.errors += failed
+        return failed
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible stand-in server")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before the first byte")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="Generation speed (0 = instant)")
+    parser.add_argument("--response", type=str, default=DEFAULT_RESPONSE, help="Text to answer with")
+    parser.add_argument("--rate-limit", type=int, default=None,
+                        help="Requests allowed per window before answering 429")
+    parser.add_argument("--rate-limit-window", type=float, default=1.0, help="Rate limit window in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with a 500")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(args.response, args.latency, args.tokens_per_second, args.port,
+                              rate_limit=args.rate_limit, rate_limit_window=args.rate_limit_window,
+                              error_rate=args.error_rate)
+    print(f"Mock OpenAI server listening on {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
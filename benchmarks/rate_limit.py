@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Rate-limit benchmark for the asyncio scheduler.
+
+Runs a batch of questions through ChatOpenAI.ainvoke against the local
+stand-in server configured to answer 429 above a request quota, once with
+no client-side limit (429s handled by backoff only) and once with the
+scheduler paced to the quota. Reports throughput, 429s and retries as JSON.
+
+Usage:
+    python benchmarks/rate_limit.py
+    python benchmarks/rate_limit.py --requests 60 --quota 20 --window 1.0
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.mock_server import MockOpenAIServer  # noqa: E402
+from gpt4shell import create_model  # noqa: E402
+from gpt4shell.batch import arun_batch  # noqa: E402
+from gpt4shell.scheduler import RateLimitScheduler  # noqa: E402
+
+
+async def _run(server, requests, concurrency, requests_per_minute):
+    model = create_model({"api_base": server.url, "temperature": 0, "max_retries": 0})
+    scheduler = RateLimitScheduler(requests_per_minute=requests_per_minute, base_delay=0.1, max_retries=20)
+
+    async def ask(question):
+        message = await scheduler.run(lambda: model.ainvoke(question))
+        return message.content
+
+    items = ({"question": f"question {i}"} for i in range(requests))
+    start = time.perf_counter()
+    records = [record async for record in arun_batch(ask, items, concurrency)]
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "failed": sum(1 for r in records if r["error"]),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 3),
+        "server_429s": server.rate_limited,
+        "scheduler": scheduler.stats,
+    }
+
+
+def run(requests, concurrency, quota, window):
+    results = {}
+    quota_per_minute = quota * 60 / window
+    for name, rpm in (("backoff_only", None), ("paced", quota_per_minute)):
+        with MockOpenAIServer(response_text="ok", rate_limit=quota, rate_limit_window=window) as server:
+            results[name] = asyncio.run(_run(server, requests, concurrency, rpm))
+    results["quota_rps"] = round(quota / window, 3)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the rate-limit-aware scheduler")
+    parser.add_argument("--requests", type=int, default=40, help="Questions in the batch")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight")
+    parser.add_argument("--quota", type=int, default=10, help="Server quota per window")
+    parser.add_argument("--window", type=float, default=1.0, help="Server quota window in seconds")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "mock-key")
+    print(json.dumps(run(args.requests, args.concurrency, args.quota, args.window), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
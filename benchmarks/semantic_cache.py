@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Lookup latency benchmark for the semantic cache index.
+
+Fills a temporary index with random unit vectors (plus one known entry) and
+times embedding a question and searching the memory-mapped index
+separately. The cache is built with SemanticCache.from_config, as the
+command line builds it, so the built-in local embedding gets the same
+threshold and matches the same questions: a question differing only in
+case, punctuation and filler words is a hit, a reworded one is not. Exits
+non-zero if the p95 search exceeds --max-ms.
+
+Usage:
+    python benchmarks/semantic_cache.py
+    python benchmarks/semantic_cache.py --entries 100000 --lookups 200 --max-ms 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from gpt4shell.semantic_cache import SemanticCache  # noqa: E402
+
+QUESTION = "How do I list files in Python?"
+SAME_WORDS = "how do i list the files in python"
+REWORDED = "python list files in directory"
+
+
+def _percentiles(timings):
+    timings = sorted(timings)
+    return round(statistics.median(timings), 3), round(timings[max(0, int(len(timings) * 0.95) - 1)], 3)
+
+
+def run(entries, lookups):
+    with tempfile.TemporaryDirectory() as home, patch.dict(os.environ, {"HOME": home}):
+        cache = SemanticCache.from_config({"semantic_cache": True}, "{question}")
+        index = cache.index
+        index.directory.mkdir(parents=True)
+
+        vectors = np.random.default_rng(0).standard_normal((entries - 1, index.dimensions)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        (index.directory / "vectors.f32").write_bytes(vectors.tobytes())
+        (index.directory / "keys.bin").write_bytes(bytes(32 * (entries - 1)))
+        cache.add(cache.embed(QUESTION), "ab" * 32)
+
+        embed_timings, lookup_timings = [], []
+        hits = reworded_hits = 0
+        for _ in range(lookups):
+            start = time.perf_counter()
+            vector = cache.embed(SAME_WORDS)
+            embedded = time.perf_counter()
+            key = cache.lookup(vector)
+            embed_timings.append((embedded - start) * 1000)
+            lookup_timings.append((time.perf_counter() - embedded) * 1000)
+            hits += key == "ab" * 32
+            reworded_hits += cache.lookup(cache.embed(REWORDED)) == "ab" * 32
+
+        embed_p50, embed_p95 = _percentiles(embed_timings)
+        lookup_p50, lookup_p95 = _percentiles(lookup_timings)
+        return {
+            "entries": len(index),
+            "lookups": lookups,
+            "threshold": cache.threshold,
+            "hits": hits,
+            "reworded_hits": reworded_hits,
+            "embed_p50_ms": embed_p50,
+            "embed_p95_ms": embed_p95,
+            "lookup_p50_ms": lookup_p50,
+            "lookup_p95_ms": lookup_p95,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark semantic cache lookups")
+    parser.add_argument("--entries", type=int, default=100_000, help="Entries in the index")
+    parser.add_argument("--lookups", type=int, default=100, help="Lookups to time")
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail if the p95 index search is slower")
+    args = parser.parse_args()
+
+    results = run(args.entries, args.lookups)
+    print(json.dumps(results, indent=2))
+    if args.max_ms is not None and results["lookup_p95_ms"] > args.max_ms:
+        print(f"p95 lookup {results['lookup_p95_ms']}ms exceeds {args.max_ms}ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the gpt4shell CLI.
+
+Measures the wall-clock time of the entry points that should never load the
+provider stack (`gpt --help`, `gpt --config-example`) and the cumulative
+import time of the `gpt4shell` package as reported by `python -X importtime`.
+
+Usage:
+    python benchmarks/startup.py                 # Print results as JSON
+    python benchmarks/startup.py --max-ms 150    # Fail if any entry point is slower
+    python benchmarks/startup.py --runs 20 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Modules that must not be imported by the lightweight entry points
+HEAVY_MODULES = ["asyncio", "langchain_core", "langchain_openai", "openai", "pydantic", "rich"]
+
+ENTRY_POINTS = {
+    "help": ["-m", "gpt4shell", "--help"],
+    "config-example": ["-m", "gpt4shell", "--config-example"],
+}
+
+
+def _clean_env(home):
+    env = os.environ.copy()
+    env["HOME"] = home
+    env.pop("OPENAI_API_KEY", None)
+    return env
+
+
+def measure_entry_point(args, runs, env):
+    """Return wall-clock timings in milliseconds for running the CLI with args."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *args], env=env, capture_output=True, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def measure_import_time(env):
+    """
+    Return (cumulative import time of gpt4shell in ms, heavy modules imported).
+
+    Parses the `-X importtime` report written to stderr; the cumulative column
+    of the top-level `gpt4shell` line covers everything it pulls in.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import gpt4shell"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    cumulative_us = 0
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        imported.add(name.split(".")[0])
+        if name == "gpt4shell":
+            cumulative_us = int(cumulative)
+    heavy = sorted(module for module in HEAVY_MODULES if module in imported)
+    return cumulative_us / 1000, heavy
+
+
+def run(runs):
+    """Run every measurement and return the results as a dict."""
+    with tempfile.TemporaryDirectory() as home:
+        env = _clean_env(home)
+        import_ms, heavy = measure_import_time(env)
+        results = {
+            "python": sys.version.split()[0],
+            "import_ms": round(import_ms, 3),
+            "heavy_modules_imported": heavy,
+            "entry_points": {},
+        }
+        for name, args in ENTRY_POINTS.items():
+            timings = measure_entry_point(args, runs, env)
+            results["entry_points"][name] = {
+                "runs": runs,
+                "min_ms": round(min(timings), 3),
+                "median_ms": round(statistics.median(timings), 3),
+                "max_ms": round(max(timings), 3),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gpt4shell startup time")
+    parser.add_argument("--runs", type=int, default=10, help="Runs per entry point")
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="Fail if any entry point median exceeds this many milliseconds")
+    parser.add_argument("--output", type=str, default=None, help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    results = run(args.runs)
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+    failures = []
+    if results["heavy_modules_imported"]:
+        failures.append(f"heavy modules imported at startup: {', '.join(results['heavy_modules_imported'])}")
+    if args.max_ms is not None:
+        for name, stats in results["entry_points"].items():
+            if stats["median_ms"] > args.max_ms:
+                failures.append(f"{name}: median {stats['median_ms']}ms exceeds {args.max_ms}ms")
+
+    for failure in failures:
+        print(f"Startup regression: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
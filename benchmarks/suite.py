@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark suite against the local stand-in server.
+
+Measures, for both the `gpt` command line and the Python API (gpt4shell.Client):
+
+- cold start: from launching a fresh interpreter until the request is sent
+  (CLI) or answered (API)
+- time to first token when streaming
+- end-to-end latency of one question
+- batch throughput
+- memory: peak RSS of CLI processes, and traced allocations per request in
+  the Python API
+
+The stand-in server's latency, token rate and error rate are configurable,
+so the numbers isolate gpt4shell's own overhead. CLI timings come from the
+`metrics_file` records each run writes (see gpt4shell/timings.py). Results
+are printed as JSON together with the commit they were measured at; pass an
+earlier result file to --compare to see the change per metric.
+
+Usage:
+    python benchmarks/suite.py --output before.json
+    python benchmarks/suite.py --compare before.json --max-regression 20
+    python benchmarks/suite.py --latency 0.05 --tokens-per-second 200 --error-rate 0.05
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.mock_server import MockOpenAIServer  # noqa: E402
+
+RESPONSE = "Use ls -la to list every file in the current directory, including hidden ones."
+
+# Run by the API cold start measurement in a fresh interpreter
+API_COLD_START = """
+import sys, time
+start = time.perf_counter()
+from gpt4shell import Client
+Client({"api_base": sys.argv[1], "temperature": 0, "cache": False}).ask("question")
+print((time.perf_counter() - start) * 1000)
+"""
+
+
+def summarize(samples):
+    """Median and p95 of a list of millisecond samples."""
+    ordered = sorted(samples)
+    return {
+        "median_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(ordered[max(0, int(round(0.95 * (len(ordered) - 1))))], 3),
+    }
+
+
+def git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+class CommandLine:
+    """Runs `gpt` in fresh interpreters with an isolated home directory."""
+
+    def __init__(self, home, server_url):
+        self.home = Path(home)
+        self.metrics_path = self.home / "metrics.jsonl"
+        config_dir = self.home / ".gpt4shell"
+        config_dir.mkdir()
+        (config_dir / "config.json").write_text(json.dumps({
+            "api_base": server_url, "temperature": 0, "cache": False, "daemon": False,
+            "metrics_file": str(self.metrics_path),
+        }))
+        self.env = dict(os.environ, HOME=str(self.home), OPENAI_API_KEY="mock-key",
+                        PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])))
+
+    def run(self, *args, stdin=None):
+        """Run the CLI; returns (wall-clock ms, the spans it recorded)."""
+        if self.metrics_path.exists():
+            self.metrics_path.unlink()
+        start = time.perf_counter()
+        # Failed answers still count; a batch with simulated errors exits with 1
+        result = subprocess.run([sys.executable, "-m", "gpt4shell", *args], env=self.env, input=stdin,
+                                capture_output=True, text=True)
+        elapsed = (time.perf_counter() - start) * 1000
+        if not self.metrics_path.exists():
+            raise RuntimeError(f"gpt {' '.join(args)} recorded no timings:\n{result.stderr}")
+        record = json.loads(self.metrics_path.read_text().splitlines()[-1])
+        return elapsed, {span["name"]: span for span in record["spans"]}
+
+
+def _since_launch(spans, name, end=False):
+    """Milliseconds from process launch to the start (or end) of a span."""
+    span = spans[name]
+    startup = spans.get("interpreter startup", {}).get("duration_ms", 0.0)
+    return startup + span["start_ms"] + (span["duration_ms"] if end else 0.0)
+
+
+def bench_cli(server_url, runs, requests, concurrency):
+    with tempfile.TemporaryDirectory() as home:
+        cli = CommandLine(home, server_url)
+        cold_start, end_to_end, first_token = [], [], []
+        for _ in range(runs):
+            elapsed, spans = cli.run("How do I list files?")
+            end_to_end.append(elapsed)
+            cold_start.append(_since_launch(spans, "request"))
+            _, spans = cli.run("--stream", "How do I list files?")
+            first_token.append(_since_launch(spans, "first token", end=True))
+
+        questions = "".join(f"question {index}\n" for index in range(requests))
+        elapsed, _ = cli.run("--batch", "-", "--concurrency", str(concurrency), stdin=questions)
+
+    return {
+        "cold_start": summarize(cold_start),
+        "time_to_first_token": summarize(first_token),
+        "end_to_end": summarize(end_to_end),
+        "batch_throughput_rps": round(requests / (elapsed / 1000), 3),
+        # ru_maxrss is the largest child seen so far, in KiB on Linux and bytes on macOS
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+                             / (1024 * 1024 if sys.platform == "darwin" else 1024), 3),
+    }
+
+
+def bench_api(server_url, runs, requests, concurrency):
+    from gpt4shell import Client
+
+    cold_start = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", API_COLD_START, server_url], cwd=ROOT,
+                                capture_output=True, text=True, check=True)
+        cold_start.append(float(result.stdout.strip().splitlines()[-1]))
+
+    client = Client({"api_base": server_url, "temperature": 0, "cache": False}, "{question}")
+    client.ask("warm up")
+
+    end_to_end, first_token, memory = [], [], []
+    tracemalloc.start()
+    try:
+        for _ in range(runs):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            start = time.perf_counter()
+            client.ask("How do I list files?")
+            end_to_end.append((time.perf_counter() - start) * 1000)
+            memory.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        for chunk in client.stream("How do I list files?"):
+            if chunk:
+                first_token.append((time.perf_counter() - start) * 1000)
+                break
+
+    start = time.perf_counter()
+    # Simulated errors are part of the workload, not a reason to stop
+    client.batch([f"question {index}" for index in range(requests)], concurrency, return_exceptions=True)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "cold_start": summarize(cold_start),
+        "time_to_first_token": summarize(first_token),
+        "end_to_end": summarize(end_to_end),
+        "batch_throughput_rps": round(requests / elapsed, 3),
+        "memory_per_request_kb": round(statistics.median(memory) / 1024, 3),
+    }
+
+
+SECTIONS = {"cli": bench_cli, "api": bench_api}
+
+
+def run(sections, runs, requests, concurrency, latency, tokens_per_second, error_rate):
+    """Run the selected sections against one stand-in server and return the results."""
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "settings": {"runs": runs, "requests": requests, "concurrency": concurrency, "latency": latency,
+                     "tokens_per_second": tokens_per_second, "error_rate": error_rate},
+    }
+    with MockOpenAIServer(RESPONSE, latency=latency, tokens_per_second=tokens_per_second,
+                          error_rate=error_rate, seed=0) as server:
+        for name in sections:
+            results[name] = SECTIONS[name](server.url, runs, requests, concurrency)
+        results["server"] = {"requests": len(server.requests), "errors": server.errors}
+    return results
+
+
+def flatten(results):
+    """Map dotted metric names, e.g. "cli.end_to_end.median_ms", to values."""
+    metrics = {}
+    for section in SECTIONS:
+        for name, value in results.get(section, {}).items():
+            if isinstance(value, dict):
+                for stat, number in value.items():
+                    metrics[f"{section}.{name}.{stat}"] = number
+            else:
+                metrics[f"{section}.{name}"] = value
+    return metrics
+
+
+def compare(baseline, results):
+    """Return (metric, old, new, percent worse) for metrics present in both; throughput is better when higher."""
+    old_metrics, new_metrics = flatten(baseline), flatten(results)
+    changes = []
+    for name, new in new_metrics.items():
+        old = old_metrics.get(name)
+        if not old:
+            continue
+        worse = (old - new) / old if name.endswith("_rps") else (new - old) / old
+        changes.append((name, old, new, round(worse * 100, 1)))
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gpt4shell end to end against a local stand-in server")
+    parser.add_argument("--sections", type=str, default="cli,api", help="Comma-separated sections to run")
+    parser.add_argument("--runs", type=int, default=5, help="Samples per latency metric")
+    parser.add_argument("--requests", type=int, default=50, help="Questions in the batch throughput runs")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight in batch runs")
+    parser.add_argument("--latency", type=float, default=0.0, help="Server seconds before the first byte")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="Server generation speed (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests the server fails")
+    parser.add_argument("--output", type=str, default=None, help="Write JSON results to this file")
+    parser.add_argument("--compare", type=str, default=None, metavar="FILE",
+                        help="Earlier results to compare against")
+    parser.add_argument("--max-regression", type=float, default=None, metavar="PERCENT",
+                        help="With --compare, fail if any metric got this much worse")
+    args = parser.parse_args()
+
+    sections = [name.strip() for name in args.sections.split(",") if name.strip()]
+    unknown = [name for name in sections if name not in SECTIONS]
+    if unknown:
+        parser.error(f"unknown sections: {', '.join(unknown)}")
+
+    os.environ.setdefault("OPENAI_API_KEY", "mock-key")
+    results = run(sections, args.runs, args.requests, args.concurrency, args.latency,
+                  args.tokens_per_second, args.error_rate)
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+    if not args.compare:
+        return 0
+    with open(args.compare, "r") as f:
+        baseline = json.load(f)
+    failures = 0
+    for name, old, new, worse in compare(baseline, results):
+        print(f"{name}: {old} -> {new} ({worse:+.1f}% worse)" if worse > 0
+              else f"{name}: {old} -> {new} ({abs(worse):.1f}% better)", file=sys.stderr)
+        if args.max_regression is not None and worse > args.max_regression:
+            failures += 1
+    if failures:
+        print(f"{failures} metrics regressed by more than {args.max_regression}% "
+              f"against {baseline.get('commit')}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
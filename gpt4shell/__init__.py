@@ -1,67 +1,477 @@
 import argparse
+import importlib
+import sys
 
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from gpt4shell import timings
+from gpt4shell.output import output_mode, show_answer, stream_raw
+from gpt4shell.pipe import PipeError, stdin_is_piped
+from gpt4shell.prompts import UnknownPromptError, compile_prompt, get_prompt_template
+from gpt4shell.settings import get_config, create_example_config
+from gpt4shell.tokens import PromptTooLargeError, check_prompt, dry_run_report
 
-import rich
-from gpt4shell.settings import get_config, create_example_config, SUPPORTED_PROVIDERS
+
+# Heavy dependencies are imported on first use so that `gpt --help` and
+# `gpt --config-example` never pay for LangChain, OpenAI, pydantic or rich,
+# nor for asyncio and the caches behind Client.
+# Maps the public attribute name to (module, attribute); attribute None means
+# the module itself.
+_LAZY_IMPORTS = {
+    "ChatOpenAI": ("langchain_openai", "ChatOpenAI"),
+    "ChatPromptTemplate": ("langchain_core.prompts", "ChatPromptTemplate"),
+    "StrOutputParser": ("langchain_core.output_parsers", "StrOutputParser"),
+    "rich": ("rich", None),
+    "Client": ("gpt4shell.client", "Client"),
+    "ResponseCache": ("gpt4shell.cache", "ResponseCache"),
+    "cache_key": ("gpt4shell.cache", "cache_key"),
+    "BudgetExceededError": ("gpt4shell.usage", "BudgetExceededError"),
+}
+
+
+def __getattr__(name):
+    """Resolve heavy dependencies lazily on first attribute access."""
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attribute = _LAZY_IMPORTS[name]
+    with timings.span(f"import {module_name}"):
+        module = importlib.import_module(module_name)
+    value = module if attribute is None else getattr(module, attribute)
+    # Cache on the module so later lookups (and unittest.mock patches) hit globals
+    globals()[name] = value
+    return value
+
+
+# Subcommands dispatched before question parsing: name -> (module, function).
+# Each function receives the remaining arguments and returns an exit code.
+_COMMANDS = {
+    "cache": ("gpt4shell.cache", "cache_command"),
+    "serve": ("gpt4shell.daemon", "serve_command"),
+    "routes": ("gpt4shell.router", "routes_command"),
+    "sessions": ("gpt4shell.sessions", "sessions_command"),
+    "shell-init": ("gpt4shell.command", "shell_init_command"),
+    "usage": ("gpt4shell.usage", "usage_command"),
+}
+
+
+def _load(name):
+    """Return a lazily imported dependency, honouring anything already bound."""
+    if name in globals():
+        return globals()[name]
+    return __getattr__(name)
+
+
+def _request_errors():
+    """
+    Return the errors a request ends with that are reported in one line.
+
+    A used-up budget, an open circuit, a missed deadline, failed routes and
+    errors from the provider's client once retries are exhausted. Provider
+    errors can only have been raised if the provider was imported, so this
+    never imports it.
+    """
+    errors = (_load("BudgetExceededError"), ConnectionError, TimeoutError)
+    openai = sys.modules.get("openai")
+    return errors + (openai.OpenAIError,) if openai is not None else errors
 
 
 def create_model(config):
     """Create a language model based on the configuration."""
-    provider = config.get("provider", "openai").lower()
-    
-    if provider not in SUPPORTED_PROVIDERS:
-        supported_list = ", ".join(SUPPORTED_PROVIDERS)
-        raise ValueError(f"Unsupported provider: {provider}. Currently supported providers: {supported_list}")
-    
-    if provider == "openai":
-        model_kwargs = {
-            "model": config.get("model", "gpt-3.5-turbo"),
-            "temperature": config.get("temperature", 1.0),
-        }
-        
-        # Add optional parameters if specified
-        if config.get("max_tokens"):
-            model_kwargs["max_tokens"] = config["max_tokens"]
-        if config.get("api_base"):
-            model_kwargs["openai_api_base"] = config["api_base"]
-            
-        return ChatOpenAI(**model_kwargs)
-
-
-def main():
+    with timings.span("create_model"):
+        if config.get("routes"):
+            from gpt4shell.router import Router
+            return Router(config)
+
+        from gpt4shell.policy import ResilientModel
+        return ResilientModel.from_config(config)
+
+
+class _StreamingMarkdown:
+    """Renderable that only parses the unfinished block when rich refreshes."""
+
+    def __init__(self):
+        self.text = ""
+
+    def __rich__(self):
+        from rich.markdown import Markdown
+        return Markdown(self.text)
+
+
+def stream_answer(chain, inputs):
+    """
+    Stream the output of `chain.stream(inputs)` to the terminal as tokens arrive.
+
+    `chain` is anything with a `stream` method: a runnable chain with its
+    input dict, or a Client with a question.
+
+    Each finished Markdown block (paragraph, list, fenced code) is printed
+    once, above a rich Live view showing only the block still being written,
+    which is re-parsed at most `refresh_per_second` times. Rendering work so
+    stays proportional to the answer's length rather than growing with it on
+    every refresh. Returns the full answer once the stream is exhausted.
+    """
+    import time
+
+    from rich.live import Live
+
+    from gpt4shell.output import BlockPrinter, MarkdownBlocks
+
+    console = _load("rich").get_console()
+    printer = BlockPrinter(console)
+    blocks = MarkdownBlocks()
+    renderable = _StreamingMarkdown()
+    parts = []
+    with timings.span("stream"):
+        # Transient: the unfinished block is printed for good once it completes
+        with Live(renderable, console=console, refresh_per_second=12, transient=True,
+                  vertical_overflow="ellipsis") as live:
+            started = time.perf_counter()
+            for chunk in chain.stream(inputs):
+                parts.append(chunk)
+                for block in blocks.feed(chunk):
+                    printer.print(block)
+                renderable.text = blocks.pending()
+                # Show the first token immediately; later ones ride the auto refresh
+                if len(parts) == 1:
+                    live.refresh()
+                    timings.record("first token", started, time.perf_counter())
+        for block in blocks.close():
+            printer.print(block)
+    return "".join(parts)
+
+
+def _build_chain(config, prompt_template):
+    """Compose prompt, model and output parser into a single runnable chain."""
+    prompt = compile_prompt(prompt_template)
+    model = create_model(config)
+    return prompt | model | _load("StrOutputParser")()
+
+
+def _run_batch(args, client):
+    """Answer every question from the batch input with one shared chain."""
+    from gpt4shell.batch import arun_batch, awrite_results, read_questions
+    from gpt4shell.transport import run_async
+
+    concurrency = args.concurrency or client.config.get("concurrency", 4)
+    try:
+        source = sys.stdin if args.batch == "-" else open(args.batch, "r")
+    except OSError as e:
+        print(f"Error: cannot read {args.batch}: {e.strerror or e}", file=sys.stderr)
+        return 1
+    try:
+        records = arun_batch(client.ask_async, read_questions(source), concurrency, ordered=not args.unordered)
+        failures = run_async(awrite_results(records, sys.stdout))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    return 1 if failures else 0
+
+
+def _question_with_piped_input(args, client):
+    """
+    Fold piped standard input into the question.
+
+    Input that fits in one chunk is attached to the question directly; larger
+    input is map-reduced into notes first. Without a question on the command
+    line, the input itself is the question. Returns the question to answer, or
+    None after a --dry-run report for input that would need map requests.
+    """
+    from gpt4shell.pipe import (SINGLE_TEMPLATE, amap_reduce, chunk_budget, iter_chunks,
+                                open_stdin, split_first)
+    from gpt4shell.tokens import count_tokens
+    from gpt4shell.transport import run_async
+
+    config = client.config
+    model = config.get("model", "gpt-3.5-turbo")
+
+    def count(text):
+        return count_tokens(text, model)
+
+    budget = chunk_budget(config, client.prompt_template, args.question or "", count)
+    single, chunks = split_first(iter_chunks(open_stdin(), budget, count))
+    if not args.question:
+        if chunks is not None:
+            raise PipeError("Standard input is too long to be the question; "
+                            "give the question as an argument and attach the input with --stdin")
+        if not single.strip():
+            raise PipeError("No question given on the command line or on standard input")
+        return single.strip()
+    if chunks is None:
+        if not single.strip():
+            return args.question
+        return SINGLE_TEMPLATE.format(instruction=args.question, text=single.rstrip("\n"))
+
+    if args.dry_run:
+        parts = sum(1 for _ in chunks)
+        print(f"Piped input: {parts} chunks of up to {budget} tokens, "
+              f"each summarised by a separate request before the final answer")
+        return None
+
+    concurrency = args.concurrency or config.get("concurrency", 4)
+    return run_async(amap_reduce(client.ask_async, args.question, chunks, budget, count, concurrency))
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    try:
+        return _main(argv)
+    finally:
+        # Prints --timings and exports metrics; nothing happens unless enabled
+        timings.finish()
+
+
+def _main(argv):
+    # Subcommands such as `gpt cache stats` take over the whole command line
+    if argv and argv[0] in _COMMANDS:
+        module_name, function_name = _COMMANDS[argv[0]]
+        command = getattr(importlib.import_module(module_name), function_name)
+        return command(argv[1:])
+
     parser = argparse.ArgumentParser(description='Ask a question to GPT-4')
     parser.add_argument('question', type=str, nargs='?', help='The question to ask GPT-4')
-    parser.add_argument('--config-example', action='store_true', 
+    parser.add_argument('--config-example', action='store_true',
                        help='Create an example configuration file and exit')
-    args = parser.parse_args()
+    parser.add_argument('--stream', action='store_true',
+                       help='Stream the answer token by token as it is generated')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Neither read from nor write to the response cache')
+    parser.add_argument('--stdin', action='store_true',
+                       help='Attach standard input to the question (without a question, piped input '
+                            'is read as the question)')
+    parser.add_argument('--batch', type=str, metavar='FILE',
+                       help='Answer every question in FILE (one per line or JSONL; "-" for stdin) '
+                            'and write JSONL results to stdout')
+    parser.add_argument('--concurrency', type=int, default=None,
+                       help='Maximum requests in flight in batch mode or for piped input')
+    parser.add_argument('--unordered', action='store_true',
+                       help='In batch mode, write results as they complete instead of in input order')
+    parser.add_argument('--dry-run', action='store_true',
+                       help='Show prompt size and estimated cost without sending the question')
+    parser.add_argument('-i', '--interactive', action='store_true',
+                       help='Start an interactive chat that remembers the conversation')
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument('--raw', action='store_true',
+                        help='Write the answer as plain text without Markdown formatting '
+                             '(the default when stdout is not a terminal)')
+    output.add_argument('--json', dest='json_output', action='store_true',
+                        help='Write the question, answer and model as one JSON object')
+    parser.add_argument('--models', type=str, metavar='A,B',
+                       help='Ask several models the same question at once and compare their answers, '
+                            'latency, tokens and cost')
+    parser.add_argument('--session', type=str, metavar='NAME',
+                       help='Continue the named conversation and remember this exchange in it')
+    parser.add_argument('--cmd', action='store_true',
+                       help='Answer with a single shell command for your shell and OS')
+    parser.add_argument('--run', action='store_true',
+                       help='With --cmd, run the command after confirmation')
+    # Used by the `gpt shell-init` integration to warm the cache while a request is typed
+    parser.add_argument('--prefetch', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--deadline', type=float, metavar='SECONDS',
+                       help='Give up on the request, retries included, after this many seconds')
+    parser.add_argument('--prompt', type=str, metavar='NAME',
+                       help='Use the named template from "prompts" in the configuration')
+    parser.add_argument('--timings', action='store_true',
+                       help='Print a breakdown of where the time went to stderr')
+    args = parser.parse_args(argv)
+
+    if args.timings:
+        timings.enable().show = True
 
     # Handle config example creation
     if args.config_example:
         create_example_config()
         return 0
 
+    # Standard input is only read when asked for, or when it is the only place a question can
+    # come from: scripts such as `while read line; do gpt "$line"; done` keep theirs to themselves
+    read_stdin = args.stdin or (not args.question and not args.batch and not args.interactive
+                                and not args.cmd and stdin_is_piped())
+    if args.stdin and (args.batch == "-" or args.interactive or args.cmd):
+        parser.error("--stdin cannot be combined with --batch -, --interactive or --cmd")
+    if (not read_stdin and args.question and not args.batch and not args.interactive and not args.cmd
+            and stdin_is_piped()):
+        print("Warning: Standard input is not read when a question is given; "
+              "use --stdin to attach it to the question", file=sys.stderr)
+
     # Ensure question is provided when not creating config example
-    if not args.question:
-        parser.error("Question is required unless using --config-example")
+    if not args.question and not args.batch and not args.interactive and not read_stdin:
+        parser.error("Question is required unless using --config-example, --batch or --interactive")
+    if args.models and (args.batch or args.interactive):
+        parser.error("--models cannot be combined with --batch or --interactive")
+    if args.session and (args.batch or args.models):
+        parser.error("--session cannot be combined with --batch or --models")
+    # --cmd has its own template, cmd_prompt_template, so a named prompt would be ignored
+    if args.cmd and (args.batch or args.interactive or args.models or args.session or args.prompt):
+        parser.error("--cmd cannot be combined with --batch, --interactive, --models, --session or --prompt")
+    if (args.run or args.prefetch) and not args.cmd:
+        parser.error("--run and --prefetch require --cmd")
 
     # Load configuration
     config = get_config()
-    
-    # Create prompt template from config
-    prompt_template = config.get("prompt_template", 
-                                "Answer the question from the user in simple terms:\n{question}")
-    prompt = ChatPromptTemplate.from_template(prompt_template)
-    
-    # Create model from config
-    model = create_model(config)
-    output_parser = StrOutputParser()
+    timings.configure(config)
+
+    try:
+        prompt_template = get_prompt_template(config, args.prompt)
+    except UnknownPromptError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if args.prompt:
+        # Cache keys, the daemon and routes all see the selected template
+        config = dict(config, prompt_template=prompt_template)
+    if args.deadline is not None:
+        config = dict(config, request_deadline=args.deadline)
+
+    if args.cmd:
+        from gpt4shell.command import command_mode, prefetch
+        if args.prefetch:
+            return prefetch(config, args.question)
+        try:
+            return command_mode(config, args.question, run=args.run, use_cache=not args.no_cache)
+        except (PromptTooLargeError,) + _request_errors() as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+
+    session = None
+    if args.session:
+        from gpt4shell.sessions import Session, SessionError
+        try:
+            session = Session.open(args.session)
+        except SessionError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+
+    # The model is only built once a question actually needs it
+    client = _load("Client")(config, prompt_template, use_cache=not args.no_cache)
+    cache = client.cache
+
+    if args.batch:
+        return _run_batch(args, client)
+
+    if args.interactive:
+        from gpt4shell.repl import run_repl
+        return run_repl(config, prompt_template, first_question=args.question, session=session)
+
+    question = args.question
+    # Reject (or truncate) oversized prompts before anything is sent
+    try:
+        if read_stdin:
+            question = _question_with_piped_input(args, client)
+            if question is None:
+                return 0
+        if args.models:
+            from gpt4shell.compare import run_comparison
+
+            mode = output_mode(config, raw=args.raw, json_output=args.json_output)
+            return run_comparison(config, prompt_template, question, args.models, mode, dry_run=args.dry_run)
+        # A session's earlier turns are sent along, so they count against the window too
+        history, history_tokens = None, 0
+        if session is not None:
+            from gpt4shell.repl import load_conversation
+
+            with timings.span("load session"):
+                conversation = load_conversation(config, session)
+            history, history_tokens = conversation.messages(), conversation.total_tokens
+        check = check_prompt(config, prompt_template, question, history_tokens=history_tokens)
+    except (PromptTooLargeError, PipeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    if args.dry_run:
+        print(dry_run_report(check))
+        return 0
+    inputs = {"question": check["question"]}
+
+    mode = output_mode(config, raw=args.raw, json_output=args.json_output)
+    # A JSON object is written once the answer is complete, so there is nothing to stream
+    streaming = (args.stream or config.get("stream")) and mode != "json"
+
+    def show(answer):
+        with timings.span("render"):
+            show_answer(answer, mode, question=args.question or question, config=config)
+
+    # Answers depend on the earlier turns, so sessions skip the caches and the daemon
+    if session is not None:
+        from gpt4shell.repl import build_chat_chain
+
+        chain = build_chat_chain(config, prompt_template)
+        session_inputs = {"history": history, **inputs}
+        try:
+            if streaming and mode == "rich":
+                answer = stream_answer(chain, session_inputs)
+            elif streaming:
+                with timings.span("stream"):
+                    answer = stream_raw(chain.stream(session_inputs))
+            else:
+                with timings.span("request"):
+                    answer = chain.invoke(session_inputs)
+                show(answer)
+        except _request_errors() as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        session.append(inputs["question"], answer, model=config.get("model", "gpt-3.5-turbo"))
+        return
+
+    # Similar earlier questions can be answered from the cache before anything is sent
+    semantic = None
+    if not args.no_cache and config.get("semantic_cache"):
+        from gpt4shell.semantic_cache import SemanticCache
+
+        # Answers are kept for similarity lookups even when exact caching is off
+        answers = cache if cache is not None else _load("ResponseCache").from_config(config)
+        key = _load("cache_key")(config, prompt_template, inputs)
+        try:
+            with timings.span("semantic cache lookup"):
+                semantic = SemanticCache.from_config(config, prompt_template)
+                vector = semantic.embed(inputs["question"])
+                similar = semantic.lookup(vector)
+        except Exception as e:
+            # A failing embedding endpoint costs the cache hit, not the answer
+            print(f"Warning: Semantic cache unavailable: {e}", file=sys.stderr)
+            semantic = None
+        else:
+            cached = answers.get(similar) if similar is not None else None
+            if cached is not None:
+                show(cached)
+                return
+
+    def remember_similar(answer):
+        if semantic is not None:
+            if answers is not cache:
+                answers.set(key, answer)
+            semantic.add(vector, key, answers)
+
+    def answer_with(source):
+        # `source` is the in-process Client or a DaemonClient; both are shown the same way
+        if streaming and mode == "rich":
+            return stream_answer(source, inputs["question"])
+        if streaming:
+            with timings.span("stream"):
+                return stream_raw(source.stream(inputs["question"]))
+        with timings.span("request"):
+            answer = source.ask(inputs["question"])
+        show(answer)
+        return answer
+
+    # A running `gpt serve` daemon already has everything imported and warmed up
+    if config.get("daemon"):
+        from gpt4shell.daemon import DaemonClient, DaemonError
+
+        remote = DaemonClient.connect(config, no_cache=args.no_cache)
+        if remote is not None:
+            try:
+                with timings.span("daemon"):
+                    answer = answer_with(remote)
+            except DaemonError as e:
+                print(f"Error: {e}", file=sys.stderr)
+                return 1
+            remember_similar(answer)
+            return
 
-    # Execute the chain
-    chain = prompt | model | output_parser
-    answer = chain.invoke({"question": args.question})
+    # The client serves cached answers before anything from the provider stack is imported
+    try:
+        answer = answer_with(client)
+    except _request_errors() as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    remember_similar(answer)
 
-    rich.print(answer)
 
+timings.mark_imported()
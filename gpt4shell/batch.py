@@ -0,0 +1,130 @@
+"""
+Batch mode for gpt4shell.
+
+Answers many questions in one process on a single event loop, reusing one
+chain (and so a single model and HTTP connection pool) with bounded
+concurrency. Input is a
+text file with one question per line, or JSON Lines objects with a
+"question" key (and optional "id"); output is one JSON record per question.
+"""
+
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, TextIO
+
+
+def read_questions(stream: TextIO) -> Iterator[Dict[str, Any]]:
+    """
+    Parse batch input lazily, one item per non-empty line.
+
+    Lines starting with "{" are read as JSON objects; anything else is taken
+    as the question text itself. Malformed JSON is passed through as an item
+    carrying the parse error so it shows up in the output instead of aborting.
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {"question": line, "error": f"Invalid JSON: {e}"}
+                continue
+            yield item
+        else:
+            yield {"question": line}
+
+
+def _new_record(index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+    record = {"index": index}
+    if "id" in item:
+        record["id"] = item["id"]
+    record["question"] = item.get("question")
+    if item.get("error"):
+        raise ValueError(item["error"])
+    if not record["question"]:
+        raise ValueError("Missing question")
+    return record
+
+
+def _finish_record(record, start, answer=None, error=None):
+    record["answer"] = answer
+    record["error"] = f"{type(error).__name__}: {error}" if error is not None else None
+    record["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return record
+
+
+async def _arun_item(aask: Callable[[str], Awaitable[str]], index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    record = {"index": index, "question": item.get("question")}
+    try:
+        record = _new_record(index, item)
+        return _finish_record(record, start, answer=await aask(record["question"]))
+    except Exception as e:
+        return _finish_record(record, start, error=e)
+
+
+async def arun_batch(
+    aask: Callable[[str], Awaitable[str]],
+    items: Iterable[Dict[str, Any]],
+    concurrency: int = 4,
+    ordered: bool = True,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Answer every item with at most `concurrency` requests in flight.
+
+    Yields one result record per item, in input order unless `ordered` is
+    False, in which case records are yielded as soon as they complete. Input
+    is consumed incrementally, so only a small window of items is held in
+    memory no matter how long the input is.
+
+    Runs on a single event loop, so one async HTTP client serves every
+    request; pair `aask` with a RateLimitScheduler to respect provider quotas.
+    """
+    concurrency = max(1, concurrency)
+    window = concurrency * 2
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(index, item):
+        async with semaphore:
+            return await _arun_item(aask, index, item)
+
+    pending = deque()
+    for index, item in enumerate(items):
+        pending.append(asyncio.ensure_future(bounded(index, item)))
+        if len(pending) >= window:
+            async for record in _adrain(pending, ordered):
+                yield record
+    while pending:
+        async for record in _adrain(pending, ordered):
+            yield record
+
+
+async def _adrain(pending, ordered):
+    """Yield the next finished record(s), removing their tasks from pending."""
+    if ordered:
+        yield await pending.popleft()
+        return
+    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    for task in done:
+        pending.remove(task)
+        yield task.result()
+
+
+def write_record(record: Dict[str, Any], stream: TextIO) -> None:
+    """Write one record as a JSON line and flush it straight away."""
+    stream.write(json.dumps(record) + "\n")
+    stream.flush()
+
+
+async def awrite_results(records: AsyncIterator[Dict[str, Any]], stream: TextIO) -> int:
+    """Write records as JSON Lines and return the number of failed items."""
+    failures = 0
+    async for record in records:
+        if record["error"]:
+            failures += 1
+        write_record(record, stream)
+    return failures
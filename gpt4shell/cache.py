@@ -0,0 +1,246 @@
+"""
+Persistent response cache for gpt4shell.
+
+Answers are stored under ~/.gpt4shell/cache/ as one JSON file per request,
+keyed by a hash of the provider, endpoint (`api_base` and any `routes`),
+model, temperature, max_tokens and the rendered prompt. Entries expire after a TTL and the cache is kept under a
+size bound by evicting the least recently used files first. A running total
+of the entry sizes is kept in a small `.size` file, so the directory is only
+scanned when a write takes the total over the bound.
+
+Every write goes to a temporary file that is atomically renamed into place,
+so concurrent readers in other processes never observe a partial entry.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from gpt4shell.settings import DEFAULT_CONFIG, get_config, get_config_path
+
+
+DEFAULT_TTL = DEFAULT_CONFIG["cache_ttl"]
+DEFAULT_MAX_BYTES = DEFAULT_CONFIG["cache_max_bytes"]
+
+
+def get_cache_dir() -> Path:
+    """Get the directory holding cached responses."""
+    return get_config_path().parent / "cache"
+
+
+def cache_enabled(config: Dict[str, Any]) -> bool:
+    """
+    Decide whether a request with this configuration should use the cache.
+
+    The "cache" config key accepts true, false or "auto"; "auto" only caches
+    deterministic calls (temperature 0), where a repeated answer is expected.
+    """
+    mode = config.get("cache", "auto")
+    if mode == "auto":
+        return config.get("temperature", 1.0) == 0
+    return bool(mode)
+
+
+def cache_key(config: Dict[str, Any], prompt_template: str, inputs: Dict[str, Any]) -> str:
+    """Hash everything that determines the answer into a cache key."""
+    payload = {
+        "provider": config.get("provider", "openai").lower(),
+        # The same model name can be served by different endpoints, e.g. locally and hosted
+        "api_base": config.get("api_base"),
+        "routes": config.get("routes"),
+        "model": config.get("model", "gpt-3.5-turbo"),
+        "temperature": config.get("temperature", 1.0),
+        "max_tokens": config.get("max_tokens"),
+        "prompt": prompt_template.format(**inputs),
+    }
+    encoded = json.dumps(payload, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ResponseCache:
+    """On-disk cache with TTL expiry and size-bounded LRU eviction."""
+
+    def __init__(self, directory: Path, ttl: float = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "ResponseCache":
+        return cls(
+            get_cache_dir(),
+            ttl=config.get("cache_ttl", DEFAULT_TTL),
+            max_bytes=config.get("cache_max_bytes", DEFAULT_MAX_BYTES),
+        )
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _size_path(self) -> Path:
+        return self.directory / ".size"
+
+    def _update_size(self, change) -> Optional[int]:
+        """
+        Apply `change` to the running size total under an exclusive lock.
+
+        `change` receives the stored total (None if there is none yet) and
+        returns the new one. Returns the new total.
+        """
+        import fcntl
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self._size_path(), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                total = int(os.read(fd, 32))
+            except ValueError:
+                total = None
+            total = change(total)
+            if total is not None:
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                os.write(fd, str(total).encode("ascii"))
+            return total
+        finally:
+            os.close(fd)
+
+    def _entries(self):
+        if not self.directory.exists():
+            return
+        for path in self.directory.glob("*/*.json"):
+            try:
+                yield path, path.stat()
+            except FileNotFoundError:
+                # Evicted by another process while we were scanning
+                continue
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached answer for key, or None on a miss or expired entry."""
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if self.ttl and time.time() - entry.get("created", 0) > self.ttl:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            return None
+
+        # The file mtime doubles as the LRU timestamp
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return entry.get("answer")
+
+    def contains(self, key: str) -> bool:
+        """Check for an entry without touching its LRU timestamp."""
+        return self._path(key).exists()
+
+    def set(self, key: str, answer: str) -> None:
+        """Store an answer atomically and evict old entries if over the size bound."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps({"created": time.time(), "answer": answer}).encode("utf-8")
+        try:
+            replaced = path.stat().st_size
+        except FileNotFoundError:
+            replaced = 0
+
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        # Entries expired or removed elsewhere are still counted, so the total
+        # only errs high and an eviction pass brings it back in line
+        total = self._update_size(lambda total: None if total is None else total + len(data) - replaced)
+        if total is None or total > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> int:
+        """Remove expired entries, then least recently used ones until under max_bytes."""
+        now = time.time()
+        entries = []
+        total = 0
+        removed = 0
+        for path, stat in self._entries():
+            # Entries are created no later than they were last used, so this is safe
+            if self.ttl and now - stat.st_mtime > self.ttl:
+                removed += self._remove(path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        while entries and total > self.max_bytes:
+            _, size, path = entries.pop(0)
+            removed += self._remove(path)
+            total -= size
+        self._update_size(lambda _: total)
+        return removed
+
+    def _remove(self, path: Path) -> int:
+        try:
+            path.unlink()
+            return 1
+        except FileNotFoundError:
+            return 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Summarise the cache contents."""
+        entries = list(self._entries())
+        mtimes = [stat.st_mtime for _, stat in entries]
+        return {
+            "directory": str(self.directory),
+            "entries": len(entries),
+            "bytes": sum(stat.st_size for _, stat in entries),
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "oldest": min(mtimes) if mtimes else None,
+            "newest": max(mtimes) if mtimes else None,
+        }
+
+    def clear(self) -> int:
+        """Delete every cached entry and return how many were removed."""
+        removed = sum(self._remove(path) for path, _ in list(self._entries()))
+        if self.directory.exists():
+            self._update_size(lambda _: 0)
+        return removed
+
+
+def cache_command(argv) -> int:
+    """Entry point for `gpt cache stats|clear`."""
+    parser = argparse.ArgumentParser(prog="gpt cache", description="Inspect or clear the response cache")
+    parser.add_argument("action", choices=["stats", "clear"], help="Show cache statistics or delete all entries")
+    args = parser.parse_args(argv)
+
+    cache = ResponseCache.from_config(get_config())
+    if args.action == "clear":
+        removed = cache.clear()
+        # The semantic indexes only point at cached answers, so they go too
+        shutil.rmtree(cache.directory / "semantic", ignore_errors=True)
+        print(f"Removed {removed} cached responses from {cache.directory}")
+        return 0
+
+    stats = cache.stats()
+    print(f"Directory: {stats['directory']}")
+    print(f"Entries:   {stats['entries']}")
+    print(f"Size:      {stats['bytes']} / {stats['max_bytes']} bytes")
+    print(f"TTL:       {stats['ttl']} seconds")
+    return 0
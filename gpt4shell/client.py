@@ -0,0 +1,226 @@
+"""
+Reusable Python API for gpt4shell.
+
+A Client builds the prompt, model and output parser once and answers any
+number of questions with them, so services embedding gpt4shell do not pay
+for a new chain per call:
+
+    from gpt4shell import Client
+
+    client = Client({"model": "gpt-4o-mini", "temperature": 0})
+    client.ask("How do I list files in Python?")
+    for chunk in client.stream("Explain git rebase"):
+        print(chunk, end="")
+    answers = client.batch(["question one", "question two"], concurrency=8)
+    answer = await client.ask_async("How do I undo a commit?")
+
+Questions are size-checked, cached and coalesced with identical requests
+in other processes exactly as on the command line, which is itself a thin
+wrapper around a Client. A Client is safe to share between
+threads. Async calls get a chain and RateLimitScheduler per event loop,
+because async connection pools cannot move between loops.
+"""
+
+import threading
+import weakref
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import gpt4shell
+from gpt4shell.cache import ResponseCache, cache_enabled, cache_key
+from gpt4shell.prompts import get_prompt_template
+from gpt4shell.settings import get_config
+from gpt4shell.singleflight import Lease, SingleFlight
+from gpt4shell.tokens import check_prompt
+from gpt4shell.usage import record_cache_hit
+
+
+class Client:
+    """
+    Answers questions with one compiled chain.
+
+    Args:
+        config: Configuration dict; None loads the user's layered configuration.
+            Missing keys take their defaults.
+        prompt_template: Template with a {question} placeholder; defaults to
+            the configured prompt_template.
+        use_cache: Whether to use the response cache when the configuration
+            enables it.
+        prompt: Name of a template from the configured `prompts` to use
+            instead of prompt_template.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, prompt_template: Optional[str] = None,
+                 use_cache: bool = True, prompt: Optional[str] = None):
+        self.config = get_config() if config is None else config
+        self.prompt_template = prompt_template or get_prompt_template(self.config, prompt)
+        self.cache = ResponseCache.from_config(self.config) if use_cache and cache_enabled(self.config) else None
+        self.flights = SingleFlight.from_config(self.config)
+        self._chain = None
+        self._async = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @property
+    def chain(self):
+        """The prompt | model | parser chain, built on first use."""
+        # Built lazily so cached answers never import the provider stack
+        with self._lock:
+            if self._chain is None:
+                self._chain = gpt4shell._build_chain(self.config, self.prompt_template)
+            return self._chain
+
+    def close(self) -> None:
+        """
+        Drop the chains built so far; they are rebuilt if the Client is used again.
+
+        The HTTP connection pools are shared with every other Client in the
+        process and stay open.
+        """
+        with self._lock:
+            self._chain = None
+            self._async.clear()
+
+    def _async_state(self):
+        """Return (chain, scheduler) for the running event loop."""
+        import asyncio
+
+        from gpt4shell.scheduler import RateLimitScheduler
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._async.get(loop)
+            if state is None:
+                # The scheduler owns retries so 429s back off together instead of per request,
+                # and the deadline is applied around all of them in ask_async
+                chain = gpt4shell._build_chain(dict(self.config, max_retries=0, retry_budget=None,
+                                                    request_deadline=None), self.prompt_template)
+                state = self._async[loop] = (chain, RateLimitScheduler.from_config(self.config))
+            return state
+
+    def _prepare(self, question: str):
+        """Return the chain inputs and cache key for a question, or raise PromptTooLargeError."""
+        check = check_prompt(self.config, self.prompt_template, question)
+        inputs = {"question": check["question"]}
+        needs_key = self.cache is not None or self.flights is not None
+        key = cache_key(self.config, self.prompt_template, inputs) if needs_key else None
+        return check, inputs, key
+
+    def _cached(self, key: Optional[str]) -> Optional[str]:
+        answer = self.cache.get(key) if self.cache is not None else None
+        if answer is not None:
+            record_cache_hit(self.config)
+        return answer
+
+    def _remember(self, key: Optional[str], answer: str) -> None:
+        if self.cache is not None:
+            self.cache.set(key, answer)
+
+    def _join(self, key: Optional[str]):
+        """Return (answer, None) if an identical call elsewhere answered, else (None, lease)."""
+        if self.flights is None:
+            return None, Lease(None, None)
+        answer, lease = self.flights.join(key)
+        if lease is None:
+            record_cache_hit(self.config)
+        return answer, lease
+
+    def ask(self, question: str) -> str:
+        """Answer a question."""
+        _, inputs, key = self._prepare(question)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        answer, lease = self._join(key)
+        if lease is None:
+            return answer
+        with lease:
+            answer = self.chain.invoke(inputs)
+            lease.finish(answer)
+        self._remember(key, answer)
+        return answer
+
+    def stream(self, question: str) -> Iterator[str]:
+        """Yield the answer in chunks as they are generated; a cached answer comes as one chunk."""
+        _, inputs, key = self._prepare(question)
+        cached = self._cached(key)
+        if cached is not None:
+            yield cached
+            return
+        answer, lease = self._join(key)
+        if lease is None:
+            yield answer
+            return
+        parts = []
+        with lease:
+            for chunk in self.chain.stream(inputs):
+                parts.append(chunk)
+                yield chunk
+            lease.finish("".join(parts))
+        self._remember(key, "".join(parts))
+
+    async def ask_async(self, question: str) -> str:
+        """Answer a question without blocking the event loop, within the configured rate limits."""
+        import asyncio
+
+        from gpt4shell.tokens import count_tokens
+
+        check, inputs, key = self._prepare(question)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        answer, lease = await self.flights.ajoin(key) if self.flights is not None else (None, Lease(None, None))
+        if lease is None:
+            record_cache_hit(self.config)
+            return answer
+        chain, scheduler = self._async_state()
+        prompt_tokens = check["prompt_tokens"]
+        if prompt_tokens is None:
+            prompt_tokens = count_tokens(self.prompt_template.format(**inputs),
+                                         self.config.get("model", "gpt-3.5-turbo"))
+        tokens = prompt_tokens + (self.config.get("max_tokens") or 0)
+        call = scheduler.run(lambda: chain.ainvoke(inputs), tokens=tokens)
+        deadline = self.config.get("request_deadline")
+        with lease:
+            if deadline is None:
+                answer = await call
+            else:
+                from gpt4shell.policy import DeadlineExceededError, endpoint_name
+
+                try:
+                    answer = await asyncio.wait_for(call, deadline)
+                except asyncio.TimeoutError:
+                    raise DeadlineExceededError(endpoint_name(self.config), deadline) from None
+            lease.finish(answer)
+        self._remember(key, answer)
+        return answer
+
+    def batch(self, questions: Iterable[str], concurrency: Optional[int] = None,
+              return_exceptions: bool = False) -> List[Any]:
+        """
+        Answer many questions concurrently, returning answers in input order.
+
+        A failed question raises its error, or with `return_exceptions` puts
+        the exception in its place. Must not be called from a running event
+        loop; use ask_async there.
+        """
+        import asyncio
+
+        concurrency = concurrency or self.config.get("concurrency", 4)
+        semaphore = None
+
+        async def answer(question):
+            async with semaphore:
+                try:
+                    return await self.ask_async(question)
+                except Exception as e:
+                    if return_exceptions:
+                        return e
+                    raise
+
+        async def run():
+            nonlocal semaphore
+            semaphore = asyncio.Semaphore(max(1, concurrency))
+            return await asyncio.gather(*(answer(question) for question in questions))
+
+        from gpt4shell.transport import run_async
+
+        return run_async(run())
@@ -0,0 +1,218 @@
+"""
+Shell command generation for gpt4shell (`gpt --cmd`).
+
+`gpt --cmd "find big files modified today"` answers with a single command
+for the user's shell and operating system instead of prose, using
+`cmd_prompt_template`. With `--run` the command is shown and executed after
+confirmation on the terminal.
+
+Commands are cached per (request, shell, OS): the shell and OS are part of
+the rendered prompt and so of the response cache key. Unlike prose answers
+they are cached at any temperature, unless `cache` is false.
+
+`gpt shell-init bash|zsh` prints a shell integration binding Ctrl-G: type
+a request as a comment (`# find big files modified today`) and press
+Ctrl-G to replace the line with the command. While the request is being
+typed, the integration runs `gpt --cmd --prefetch` in the background
+so the command is usually cached by the time Ctrl-G is pressed. Prefetches
+are debounced: each one waits briefly and gives up if a newer request was
+typed meanwhile, so only the text the user pauses on is sent.
+"""
+
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from gpt4shell import timings
+from gpt4shell.settings import DEFAULT_CONFIG, get_config_path
+
+
+# Seconds a prefetch waits for the request to stop changing before sending it
+PREFETCH_DELAY = 0.3
+
+_FENCE = re.compile(r"```[^\n]*\n(.*?)```", re.DOTALL)
+
+
+def get_prefetch_path() -> Path:
+    """Get the file recording the most recent prefetch request."""
+    return get_config_path().parent / "cmd-prefetch"
+
+
+def detect_shell() -> str:
+    """Return the name of the user's shell, e.g. "bash" or "zsh"."""
+    return Path(os.environ.get("SHELL") or "sh").name
+
+
+def detect_os() -> str:
+    """Return the operating system name used in the prompt."""
+    system = platform.system()
+    return {"Darwin": "macOS", "": "Unix"}.get(system, system)
+
+
+def normalize_request(request: str) -> str:
+    """Collapse whitespace so a request typed slightly differently hits the same cache entry."""
+    return " ".join(request.split())
+
+
+def command_template(config: Dict[str, Any], shell: Optional[str] = None, os_name: Optional[str] = None) -> str:
+    """Return cmd_prompt_template with the shell and OS filled in, leaving {question}."""
+    template = config.get("cmd_prompt_template") or DEFAULT_CONFIG["cmd_prompt_template"]
+    return template.replace("{shell}", shell or detect_shell()).replace("{os}", os_name or detect_os())
+
+
+def extract_command(answer: str) -> str:
+    """Strip Markdown fences, prompts and surrounding text from a model's reply."""
+    match = _FENCE.search(answer)
+    text = match.group(1) if match else answer
+    lines = [line for line in text.strip().splitlines() if line.strip()]
+    lines = [line[2:] if line.startswith("$ ") else line for line in lines]
+    return "\n".join(lines).strip("`").strip()
+
+
+def command_client(config: Dict[str, Any], use_cache: bool = True):
+    """Return a Client answering with commands for this shell and OS."""
+    from gpt4shell.client import Client
+
+    if config.get("cache", "auto") == "auto":
+        # The same request on the same shell and OS should give the same command
+        config = dict(config, cache=True)
+    return Client(config, command_template(config), use_cache=use_cache)
+
+
+def generate_command(config: Dict[str, Any], request: str, use_cache: bool = True) -> str:
+    """Return a single shell command for the request."""
+    client = command_client(config, use_cache)
+    with timings.span("request"):
+        return extract_command(client.ask(normalize_request(request)))
+
+
+def prefetch(config: Dict[str, Any], request: str, delay: float = PREFETCH_DELAY) -> int:
+    """Generate and cache a command unless a newer request is typed within `delay` seconds."""
+    request = normalize_request(request)
+    if not request:
+        return 0
+    path = get_prefetch_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(request)
+    time.sleep(delay)
+    try:
+        if path.read_text() != request:
+            return 0
+    except OSError:
+        return 0
+    client = command_client(config)
+    if client.cache is None:
+        return 0
+    try:
+        client.ask(request)
+    except Exception:
+        # A failed prefetch only means the request is sent again when the user asks
+        return 1
+    return 0
+
+
+def confirm(prompt: str) -> bool:
+    """Ask a yes/no question on the terminal, even when stdin is piped."""
+    try:
+        tty = open("/dev/tty", "r+")
+    except OSError:
+        return False
+    with tty:
+        tty.write(prompt)
+        tty.flush()
+        return tty.readline().strip().lower() in ("y", "yes")
+
+
+def run_command(command: str) -> int:
+    """Run a command in the user's shell and return its exit status."""
+    shell = os.environ.get("SHELL") or "/bin/sh"
+    return subprocess.run([shell, "-c", command]).returncode
+
+
+def command_mode(config: Dict[str, Any], request: str, run: bool = False, use_cache: bool = True) -> int:
+    """Entry point for `gpt --cmd`: print (and optionally run) the generated command."""
+    from gpt4shell.output import write_raw
+
+    command = generate_command(config, request, use_cache)
+    if not command:
+        print("Error: The model did not return a command", file=sys.stderr)
+        return 1
+    if not run:
+        write_raw(command + "\n")
+        return 0
+    print(command, file=sys.stderr)
+    if not confirm("Run this command? [y/N] "):
+        return 1
+    return run_command(command)
+
+
+BASH_INIT = r'''
+# gpt4shell: type "# <request>" and press Ctrl-G to turn it into a command
+_gpt4shell_suggest() {
+  local request="${READLINE_LINE#\# }" suggestion
+  [ -n "$request" ] || return
+  suggestion=$(gpt --cmd "$request" 2>/dev/null) || return
+  READLINE_LINE="$suggestion"
+  READLINE_POINT=${#READLINE_LINE}
+}
+# Bash has no hook per keystroke, so requests are prefetched at every word
+_gpt4shell_space() {
+  READLINE_LINE="${READLINE_LINE:0:READLINE_POINT} ${READLINE_LINE:READLINE_POINT}"
+  READLINE_POINT=$((READLINE_POINT + 1))
+  case "$READLINE_LINE" in
+    "# "??*) (gpt --cmd --prefetch "${READLINE_LINE#\# }" >/dev/null 2>&1 &) ;;
+  esac
+}
+bind -x '"\C-g": _gpt4shell_suggest'
+bind -x '" ": _gpt4shell_space'
+'''
+
+ZSH_INIT = r'''
+# gpt4shell: type "# <request>" and press Ctrl-G to turn it into a command
+setopt interactive_comments
+_gpt4shell_suggest() {
+  local request=${BUFFER#\# } suggestion
+  [[ -n $request ]] || return
+  suggestion=$(gpt --cmd "$request" 2>/dev/null) || return
+  BUFFER=$suggestion
+  CURSOR=${#BUFFER}
+}
+_gpt4shell_prefetch() {
+  if [[ $BUFFER == '# '??* && $BUFFER != $_gpt4shell_last ]]; then
+    _gpt4shell_last=$BUFFER
+    gpt --cmd --prefetch "${BUFFER#\# }" >/dev/null 2>&1 &!
+  fi
+}
+zle -N _gpt4shell_suggest
+autoload -Uz add-zle-hook-widget
+add-zle-hook-widget line-pre-redraw _gpt4shell_prefetch
+bindkey '^G' _gpt4shell_suggest
+'''
+
+SHELL_INITS = {"bash": BASH_INIT, "zsh": ZSH_INIT}
+
+
+def shell_init_command(argv) -> int:
+    """Entry point for `gpt shell-init bash|zsh`: print the shell integration."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="gpt shell-init",
+        description='Print a shell integration for --cmd; add `eval "$(gpt shell-init zsh)"` to your shell startup file',
+    )
+    parser.add_argument("shell", nargs="?", choices=sorted(SHELL_INITS),
+                        help="Shell to integrate with (default: the current shell)")
+    args = parser.parse_args(argv)
+
+    shell = args.shell or detect_shell()
+    if shell not in SHELL_INITS:
+        print(f"Error: No integration for {shell}; supported shells: {', '.join(sorted(SHELL_INITS))}",
+              file=sys.stderr)
+        return 1
+    print(SHELL_INITS[shell].strip())
+    return 0
@@ -0,0 +1,240 @@
+"""
+Side-by-side comparison of several models.
+
+`gpt --models gpt-4o,gpt-4o-mini "question"` sends the same rendered prompt
+to every listed model at once, shows each answer in its own section and
+finishes with a table of time to first token, total latency, tokens and
+estimated cost per model. The requests run concurrently, so the comparison
+takes as long as the slowest model rather than the sum of all of them.
+
+Each entry is a model name used with the rest of the configuration, or
+"provider:model" to switch provider as well (e.g. "mock:echo" or
+"openai-compatible:llama3" with the configured api_base). The response
+cache is bypassed so every number comes from a real request.
+"""
+
+import json
+import queue
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from gpt4shell import timings
+from gpt4shell.output import write_raw
+from gpt4shell.tokens import MESSAGE_OVERHEAD, check_prompt, count_tokens, dry_run_report, estimate_cost
+
+
+def model_configs(config: Dict[str, Any], models: str) -> List[Dict[str, Any]]:
+    """Expand a comma-separated --models list into one configuration per model."""
+    from gpt4shell.providers import available_providers
+
+    # Routing would pick its own model, defeating the comparison
+    base = {key: value for key, value in config.items() if key not in ("routes", "hedge_after")}
+    configs = []
+    seen = set()
+    for entry in models.split(","):
+        entry = entry.strip()
+        if not entry or entry in seen:
+            continue
+        seen.add(entry)
+        provider, separator, model = entry.partition(":")
+        # Model names may contain colons too (e.g. "llama3:8b"), so only known providers count
+        if separator and model and provider.lower() in available_providers():
+            overrides = {"provider": provider.lower(), "model": model}
+        else:
+            overrides = {"model": entry}
+        configs.append(dict(base, **overrides, label=entry))
+    if not configs:
+        raise ValueError("--models must list at least one model")
+    return configs
+
+
+def _ask_model(model_config: Dict[str, Any], prompt_template: str, question: str,
+               on_chunk: Callable[[str], None]) -> Dict[str, Any]:
+    """Stream one model's answer, measuring it; errors are reported in the result."""
+    from gpt4shell.client import Client
+
+    model = model_config.get("model", "gpt-3.5-turbo")
+    result = {"model": model_config["label"], "answer": None, "error": None,
+              "first_token_ms": None, "latency_ms": None,
+              "prompt_tokens": None, "completion_tokens": None, "cost": None}
+    started = time.perf_counter()
+    parts = []
+    try:
+        check = check_prompt(model_config, prompt_template, question)
+        client = Client(model_config, prompt_template, use_cache=False)
+        # Building the chain imports the provider; only the request itself is timed
+        client.chain
+        started = time.perf_counter()
+        for chunk in client.stream(question):
+            if not parts:
+                result["first_token_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            parts.append(chunk)
+            on_chunk(chunk)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["latency_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    timings.record(f"model {model_config['label']}", started, time.perf_counter())
+    if result["error"] is None:
+        answer = "".join(parts)
+        prompt_tokens = check["prompt_tokens"]
+        if prompt_tokens is None:
+            prompt_tokens = count_tokens(check["prompt"], model) + MESSAGE_OVERHEAD
+        completion_tokens = count_tokens(answer, model)
+        result.update(answer=answer, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                      cost=estimate_cost(model, prompt_tokens, completion_tokens))
+    return result
+
+
+def compare_models(configs: List[Dict[str, Any]], prompt_template: str, question: str,
+                   on_event: Optional[Callable[[int, Optional[str], Optional[Dict[str, Any]]], None]] = None
+                   ) -> List[Dict[str, Any]]:
+    """
+    Ask every model the same question concurrently; return one result per model, in order.
+
+    `on_event(index, chunk, result)` is called from the calling thread for
+    every streamed chunk (result None) and once per model when it finishes
+    (chunk None), so a display never has to be thread-safe.
+    """
+    events = queue.Queue()
+    results: List[Optional[Dict[str, Any]]] = [None] * len(configs)
+
+    def run(index, model_config):
+        result = _ask_model(model_config, prompt_template, question,
+                            lambda chunk: events.put((index, chunk, None)))
+        events.put((index, None, result))
+
+    threads = [threading.Thread(target=run, args=(index, model_config), daemon=True)
+               for index, model_config in enumerate(configs)]
+    for thread in threads:
+        thread.start()
+    pending = len(threads)
+    while pending:
+        index, chunk, result = events.get()
+        if result is not None:
+            results[index] = result
+            pending -= 1
+        if on_event is not None:
+            on_event(index, chunk, result)
+    return results
+
+
+def _summary_rows(results: List[Dict[str, Any]]) -> List[List[str]]:
+    def ms(value):
+        return "-" if value is None else f"{value / 1000:.2f}s"
+
+    rows = []
+    for result in results:
+        if result["error"] is not None:
+            rows.append([result["model"], "-", ms(result["latency_ms"]), "-", "-", "-", "failed"])
+            continue
+        cost = "unknown" if result["cost"] is None else f"${result['cost']:.6f}"
+        rows.append([result["model"], ms(result["first_token_ms"]), ms(result["latency_ms"]),
+                     str(result["prompt_tokens"]), str(result["completion_tokens"]), cost, "ok"])
+    return rows
+
+
+SUMMARY_COLUMNS = ["Model", "First token", "Latency", "Prompt", "Completion", "Cost", "Status"]
+
+
+def summary_table(results: List[Dict[str, Any]]) -> str:
+    """Format the per-model measurements as a plain-text table."""
+    rows = [SUMMARY_COLUMNS] + _summary_rows(results)
+    widths = [max(len(row[column]) for row in rows) for column in range(len(SUMMARY_COLUMNS))]
+    return "\n".join("  ".join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+                     for row in rows)
+
+
+def _show_raw(configs, prompt_template, question):
+    # Sections are written whole as each model finishes, so answers never interleave
+    def on_event(index, chunk, result):
+        if result is None:
+            return
+        body = result["answer"] if result["error"] is None else f"Error: {result['error']}"
+        body = body.rstrip("\n")
+        write_raw(f"=== {result['model']} ===\n{body}\n\n")
+
+    results = compare_models(configs, prompt_template, question, on_event)
+    write_raw(summary_table(results) + "\n")
+    return results
+
+
+def _show_rich(configs, prompt_template, question):
+    import gpt4shell
+    from rich.columns import Columns
+    from rich.live import Live
+    from rich.panel import Panel
+    from rich.rule import Rule
+    from rich.table import Table
+    from rich.text import Text
+
+    from gpt4shell.output import BlockPrinter, markdown_blocks
+
+    console = gpt4shell._load("rich").get_console()
+    texts = [""] * len(configs)
+    status = ["waiting"] * len(configs)
+    # Each pane shows the tail of its answer; full answers are printed once all are done
+    tail_lines = max(3, (console.height - 4) // max(1, (len(configs) + 1) // 2) - 2)
+
+    class Panes:
+        def __rich__(self):
+            width = max(30, console.width // min(2, len(configs)) - 1)
+            return Columns([Panel(Text("\n".join(texts[i].splitlines()[-tail_lines:])),
+                                  title=configs[i]["label"], subtitle=status[i], width=width)
+                            for i in range(len(configs))])
+
+    def on_event(index, chunk, result):
+        if result is None:
+            texts[index] += chunk
+            status[index] = "streaming"
+        else:
+            status[index] = "failed" if result["error"] is not None else f"{result['latency_ms'] / 1000:.2f}s"
+
+    with Live(Panes(), console=console, refresh_per_second=8, transient=True):
+        results = compare_models(configs, prompt_template, question, on_event)
+
+    for result in results:
+        console.print(Rule(result["model"]))
+        if result["error"] is not None:
+            console.print(Text(f"Error: {result['error']}", style="red"))
+            continue
+        printer = BlockPrinter(console)
+        for block in markdown_blocks(result["answer"]):
+            printer.print(block)
+    table = Table(*SUMMARY_COLUMNS)
+    for row in _summary_rows(results):
+        table.add_row(*row)
+    console.print()
+    console.print(table)
+    return results
+
+
+def run_comparison(config: Dict[str, Any], prompt_template: str, question: str, models: str,
+                   mode: str, dry_run: bool = False) -> int:
+    """Entry point for `gpt --models`: compare the models and return the exit code."""
+    try:
+        configs = model_configs(config, models)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    if dry_run:
+        for model_config in configs:
+            print(f"=== {model_config['label']} ===")
+            try:
+                print(dry_run_report(check_prompt(model_config, prompt_template, question)))
+            except ValueError as e:
+                print(f"Error: {e}")
+            print()
+        return 0
+
+    with timings.span("compare", models=len(configs)):
+        if mode == "json":
+            results = compare_models(configs, prompt_template, question)
+            write_raw(json.dumps({"question": question, "results": results}) + "\n")
+        elif mode == "raw":
+            results = _show_raw(configs, prompt_template, question)
+        else:
+            results = _show_rich(configs, prompt_template, question)
+    return 1 if any(result["error"] is not None for result in results) else 0
@@ -0,0 +1,325 @@
+"""
+Resident daemon for gpt4shell.
+
+`gpt serve` keeps a process running that holds warmed Clients (chain, HTTP
+connection pool and all of LangChain already imported) and answers
+questions over a Unix socket at ~/.gpt4shell/daemon.sock. The CLI forwards
+questions to it when it is running and falls back to answering in-process
+when it is not. Forwarded questions go through a Client in the daemon, so
+caching, single-flight and usage accounting behave exactly as in-process.
+
+The protocol is newline-delimited JSON. The client sends one request:
+
+    {"question": "...", "config": {...}, "stream": false, "no_cache": false}
+
+and the daemon answers with zero or more {"chunk": "..."} lines when
+streaming, followed by a final {"answer": "..."} or {"error": "..."} line.
+The client sends its own configuration, so the daemon answers exactly as
+an in-process call would; Clients are built once per distinct configuration,
+and only the MAX_CLIENTS most recently used ones are kept.
+
+This module is imported on the client path, so it must stay light: no
+LangChain, rich or HTTP imports at module level.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from gpt4shell.settings import DEFAULT_CONFIG, get_config_path
+
+
+# Warm Clients kept; every --deadline, model or temperature override needs its own
+MAX_CLIENTS = 8
+
+
+CONNECT_TIMEOUT = 0.5
+
+
+def get_socket_path() -> Path:
+    """Get the path of the daemon's Unix socket."""
+    return get_config_path().parent / "daemon.sock"
+
+
+class DaemonError(Exception):
+    """Raised on the client when the daemon reports a failure."""
+
+
+def _send(stream, message: Dict[str, Any]) -> None:
+    stream.write((json.dumps(message) + "\n").encode("utf-8"))
+    stream.flush()
+
+
+def _connect(socket_path: Path) -> Optional[socket.socket]:
+    """Connect to a running daemon, or return None if there is none."""
+    if not socket_path.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT)
+    try:
+        sock.connect(str(socket_path))
+    except OSError:
+        sock.close()
+        return None
+    # Generation can take a long time; only the connect is bounded
+    sock.settimeout(None)
+    return sock
+
+
+def request(message: Dict[str, Any], socket_path: Optional[Path] = None):
+    """
+    Send a request to the daemon and yield its response messages.
+
+    Yields nothing if no daemon is listening, so callers can fall back.
+    """
+    sock = _connect(socket_path or get_socket_path())
+    if sock is None:
+        return
+    with sock, sock.makefile("rwb") as stream:
+        _send(stream, message)
+        for line in stream:
+            yield json.loads(line)
+
+
+class DaemonClient:
+    """
+    Answers one question through a running daemon.
+
+    Has the ask and stream methods of gpt4shell.Client, so the CLI shows a
+    forwarded answer exactly like one answered in-process. Create it with
+    `connect`; each instance holds one connection and answers one question.
+    """
+
+    def __init__(self, sock: socket.socket, config: Dict[str, Any], no_cache: bool = False):
+        self._sock = sock
+        self.config = config
+        self.no_cache = no_cache
+
+    @classmethod
+    def connect(cls, config: Dict[str, Any], no_cache: bool = False,
+                socket_path: Optional[Path] = None) -> Optional["DaemonClient"]:
+        """Connect to the running daemon, or return None if there is none."""
+        sock = _connect(socket_path or get_socket_path())
+        return None if sock is None else cls(sock, config, no_cache)
+
+    def _exchange(self, question: str, stream: bool) -> Iterator[Dict[str, Any]]:
+        message = {"question": question, "config": self.config, "stream": stream, "no_cache": self.no_cache}
+        with self._sock, self._sock.makefile("rwb") as connection:
+            _send(connection, message)
+            for line in connection:
+                response = json.loads(line)
+                if "error" in response:
+                    raise DaemonError(response["error"])
+                yield response
+        raise DaemonError("The daemon closed the connection without an answer")
+
+    def ask(self, question: str) -> str:
+        """Answer a question. Raises DaemonError if the daemon failed to answer."""
+        for response in self._exchange(question, stream=False):
+            if "answer" in response:
+                return response["answer"]
+
+    def stream(self, question: str) -> Iterator[str]:
+        """Yield the answer in chunks as the daemon generates them."""
+        for response in self._exchange(question, stream=True):
+            if "chunk" in response:
+                yield response["chunk"]
+            elif "answer" in response:
+                return
+
+
+def ask(
+    question: str,
+    config: Dict[str, Any],
+    stream: bool = False,
+    no_cache: bool = False,
+    on_chunk: Optional[Callable[[str], None]] = None,
+    socket_path: Optional[Path] = None,
+) -> Optional[str]:
+    """
+    Answer a question through the daemon.
+
+    Returns the full answer, or None if no daemon is running. Streamed
+    chunks are passed to `on_chunk` as they arrive. Raises DaemonError if
+    the daemon failed to answer.
+    """
+    client = DaemonClient.connect(config, no_cache=no_cache, socket_path=socket_path)
+    if client is None:
+        return None
+    if not stream:
+        return client.ask(question)
+    parts = []
+    for chunk in client.stream(question):
+        parts.append(chunk)
+        if on_chunk is not None:
+            on_chunk(chunk)
+    return "".join(parts)
+
+
+def is_running(socket_path: Optional[Path] = None) -> bool:
+    """Check whether a daemon answers on the socket."""
+    return any(response.get("pong") for response in request({"command": "ping"}, socket_path))
+
+
+class DaemonServer:
+    """Unix socket server that answers questions with warmed, reused Clients."""
+
+    def __init__(self, socket_path: Path):
+        import socketserver
+
+        self.socket_path = Path(socket_path)
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                line = self.rfile.readline()
+                if not line:
+                    return
+                try:
+                    message = json.loads(line)
+                except ValueError as e:
+                    _send(self.wfile, {"error": f"Invalid request: {e}"})
+                    return
+                if not isinstance(message, dict):
+                    _send(self.wfile, {"error": "Invalid request: expected a JSON object"})
+                    return
+                server.handle(message, self.wfile)
+
+        class Server(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+
+        self._remove_stale_socket()
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        # Created private rather than restricted after bind, so no other user can connect in between
+        umask = os.umask(0o077)
+        try:
+            self._server = Server(str(self.socket_path), Handler)
+        finally:
+            os.umask(umask)
+
+    def _remove_stale_socket(self) -> None:
+        if not self.socket_path.exists():
+            return
+        if is_running(self.socket_path):
+            raise RuntimeError(f"A gpt4shell daemon is already running on {self.socket_path}")
+        self.socket_path.unlink()
+
+    def client_for(self, config: Dict[str, Any], use_cache: bool):
+        """Return the Client for this configuration, building it on first use."""
+        from gpt4shell.client import Client
+
+        key = json.dumps([config, use_cache], sort_keys=True, default=str)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                return client
+            prompt_template = config.get("prompt_template", DEFAULT_CONFIG["prompt_template"])
+            client = self._clients[key] = Client(config, prompt_template, use_cache=use_cache)
+            if len(self._clients) > MAX_CLIENTS:
+                _, evicted = self._clients.popitem(last=False)
+                evicted.close()
+            return client
+
+    def handle(self, message: Dict[str, Any], stream) -> None:
+        """Answer one request, writing response messages to stream."""
+        command = message.get("command")
+        if command == "ping":
+            _send(stream, {"pong": True, "pid": os.getpid(), "chains": len(self._clients)})
+            return
+        if command == "shutdown":
+            _send(stream, {"stopping": True})
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
+            return
+
+        try:
+            client = self.client_for(message["config"], use_cache=not message.get("no_cache"))
+            question = message["question"]
+            # The Client serves the cache, joins identical in-flight requests and records usage
+            if message.get("stream"):
+                parts = []
+                for chunk in client.stream(question):
+                    parts.append(chunk)
+                    _send(stream, {"chunk": chunk})
+                answer = "".join(parts)
+            else:
+                answer = client.ask(question)
+            _send(stream, {"answer": answer})
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away (e.g. Ctrl-C); nothing left to tell it
+            pass
+        except Exception as e:
+            _send(stream, {"error": f"{type(e).__name__}: {e}"})
+
+    def serve_forever(self) -> None:
+        try:
+            self._server.serve_forever()
+        finally:
+            self.close()
+
+    def shutdown(self) -> None:
+        self._server.shutdown()
+
+    def close(self) -> None:
+        from gpt4shell.transport import close_http_clients
+
+        self._server.server_close()
+        close_http_clients()
+        try:
+            self.socket_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def serve_command(argv) -> int:
+    """Entry point for `gpt serve`."""
+    parser = argparse.ArgumentParser(prog="gpt serve",
+                                     description="Run a resident gpt4shell daemon on a Unix socket")
+    parser.add_argument("--socket", type=str, default=None, help="Socket path (default: ~/.gpt4shell/daemon.sock)")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--status", action="store_true", help="Report whether a daemon is running and exit")
+    group.add_argument("--stop", action="store_true", help="Stop the running daemon and exit")
+    args = parser.parse_args(argv)
+
+    socket_path = Path(args.socket) if args.socket else get_socket_path()
+
+    if args.status:
+        for response in request({"command": "ping"}, socket_path):
+            print(f"Daemon running on {socket_path} (pid {response['pid']}, {response['chains']} warm chains)")
+            return 0
+        print(f"No daemon running on {socket_path}")
+        return 1
+
+    if args.stop:
+        for _ in request({"command": "shutdown"}, socket_path):
+            print(f"Stopped daemon on {socket_path}")
+            return 0
+        print(f"No daemon running on {socket_path}")
+        return 1
+
+    try:
+        server = DaemonServer(socket_path)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    # Pay the import cost now rather than on the first question
+    import gpt4shell
+    for name in ("ChatOpenAI", "ChatPromptTemplate", "StrOutputParser"):
+        gpt4shell._load(name)
+
+    print(f"gpt4shell daemon listening on {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
@@ -0,0 +1,179 @@
+"""
+Answer output for gpt4shell.
+
+Answers are written in one of three modes:
+
+- "rich": Markdown with syntax-highlighted code blocks, rendered with rich.
+  The answer is split into top-level blocks (paragraphs, lists, fenced code)
+  and each block is rendered once, as soon as it is complete, so a long
+  answer neither waits for the whole text nor gets re-parsed on every
+  streamed token.
+- "raw": the answer text written straight to stdout's byte stream; rich is
+  never imported.
+- "json": one JSON object with the question, answer and model, for scripts.
+
+The `output` setting picks the default: "auto" (rich on a terminal, raw when
+stdout is piped or redirected), "rich" or "raw". `--raw` and `--json`
+override it per call.
+"""
+
+import json
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+
+def output_mode(config: Dict[str, Any], raw: bool = False, json_output: bool = False, stream=None) -> str:
+    """Decide how to write the answer: "rich", "raw" or "json"."""
+    if json_output:
+        return "json"
+    if raw:
+        return "raw"
+    mode = config.get("output", "auto")
+    if mode in ("rich", "raw"):
+        return mode
+    stream = stream or sys.stdout
+    try:
+        return "rich" if stream.isatty() else "raw"
+    except (AttributeError, ValueError):
+        return "raw"
+
+
+def write_raw(text: str, stream=None) -> None:
+    """Write text to the stream's underlying bytes, bypassing any formatting."""
+    stream = stream or sys.stdout
+    buffer = getattr(stream, "buffer", None)
+    if buffer is None:
+        stream.write(text)
+        stream.flush()
+        return
+    # Text already written through the wrapper must go out first
+    stream.flush()
+    buffer.write(text.encode(getattr(stream, "encoding", None) or "utf-8", "replace"))
+    buffer.flush()
+
+
+class MarkdownBlocks:
+    """
+    Splits streamed Markdown into top-level blocks as they complete.
+
+    A block ends at a blank line followed by an unindented line, or at the
+    closing fence of a code block. Indented lines after a blank line continue
+    the block, so loose lists and multi-paragraph list items stay together.
+    """
+
+    def __init__(self):
+        self._lines: List[str] = []
+        self._partial = ""
+        self._fence: Optional[str] = None
+        self._blank = False
+
+    def _flush(self) -> List[str]:
+        block = "\n".join(self._lines).strip("\n")
+        self._lines = []
+        self._blank = False
+        return [block] if block else []
+
+    def _line(self, line: str) -> List[str]:
+        stripped = line.strip()
+        if self._fence is not None:
+            self._lines.append(line)
+            if stripped.startswith(self._fence) and not stripped.strip(self._fence[0]):
+                self._fence = None
+                return self._flush()
+            return []
+        if not stripped:
+            if self._lines:
+                self._blank = True
+            return []
+        done = []
+        fence = None
+        if stripped[:3] in ("```", "~~~"):
+            # Only a fence at least as long as this one closes it, as in CommonMark
+            fence = stripped[:len(stripped) - len(stripped.lstrip(stripped[0]))]
+        if fence is not None or (self._blank and not line[:1].isspace()):
+            done = self._flush()
+        elif self._blank:
+            self._lines.append("")
+        self._blank = False
+        self._fence = fence
+        self._lines.append(line)
+        return done
+
+    def feed(self, chunk: str) -> List[str]:
+        """Add streamed text; return the blocks it completed."""
+        lines = (self._partial + chunk).split("\n")
+        self._partial = lines.pop()
+        done = []
+        for line in lines:
+            done.extend(self._line(line))
+        return done
+
+    def pending(self) -> str:
+        """The text of the block still being written."""
+        return "\n".join(self._lines + [self._partial]).strip("\n")
+
+    def close(self) -> List[str]:
+        """Return whatever is left once the stream has ended."""
+        done = self._line(self._partial) if self._partial else []
+        self._partial = ""
+        return done + self._flush()
+
+
+def markdown_blocks(text: str) -> List[str]:
+    """Split a complete answer into top-level Markdown blocks."""
+    blocks = MarkdownBlocks()
+    return blocks.feed(text) + blocks.close()
+
+
+class BlockPrinter:
+    """Prints Markdown blocks with rich, separated like paragraphs."""
+
+    def __init__(self, console):
+        from rich.markdown import Markdown
+
+        self.console = console
+        self._markdown = Markdown
+        self._printed = False
+
+    def print(self, block: str) -> None:
+        if self._printed:
+            self.console.print()
+        self.console.print(self._markdown(block))
+        self._printed = True
+
+
+def show_answer(answer: str, mode: str, question: Optional[str] = None,
+                config: Optional[Dict[str, Any]] = None) -> None:
+    """Write a complete answer in the given mode."""
+    if mode == "json":
+        write_raw(json.dumps(answer_record(answer, question, config)) + "\n")
+    elif mode == "raw":
+        write_raw(answer if answer.endswith("\n") else answer + "\n")
+    else:
+        import gpt4shell
+
+        printer = BlockPrinter(gpt4shell._load("rich").get_console())
+        for block in markdown_blocks(answer):
+            printer.print(block)
+
+
+def answer_record(answer: str, question: Optional[str], config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    config = config or {}
+    return {"question": question, "answer": answer, "model": config.get("model", "gpt-3.5-turbo")}
+
+
+def stream_raw(chunks: Iterable[str]) -> str:
+    """Write chunks to stdout as they arrive and return the full answer."""
+    from gpt4shell import timings
+
+    parts = []
+    started = time.perf_counter()
+    for chunk in chunks:
+        parts.append(chunk)
+        write_raw(chunk)
+        if len(parts) == 1:
+            timings.record("first token", started, time.perf_counter())
+    if parts and not parts[-1].endswith("\n"):
+        write_raw("\n")
+    return "".join(parts)
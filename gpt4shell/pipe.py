@@ -0,0 +1,168 @@
+"""
+Piped input for gpt4shell (`cat huge.log | gpt "summarise the errors"`).
+
+Standard input is read incrementally and cut into chunks of at most
+`chunk_tokens` tokens on line boundaries. Input that fits in one chunk is
+simply attached to the question. Anything larger is map-reduced: every
+chunk is summarised against the question by concurrent map requests, and
+the notes are folded into a final prompt. Only a window of chunks is in
+flight at a time, and whenever the collected notes outgrow the chunk budget
+they are merged into one by an extra request, so memory stays bounded
+however large the input is.
+"""
+
+import io
+import os
+import stat
+import sys
+from itertools import chain
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, TextIO
+
+from gpt4shell.settings import DEFAULT_CONFIG
+from gpt4shell.tokens import MESSAGE_OVERHEAD, context_window
+
+
+SINGLE_TEMPLATE = "{instruction}\n\n<input>\n{text}\n</input>"
+
+MAP_TEMPLATE = (
+    "The text below is part {index} of a larger input that is too long to read at once.\n"
+    "Task for the whole input: {instruction}\n\n"
+    "Extract only what is relevant to the task from this part, as concise notes. "
+    "If nothing is relevant, reply with \"(nothing relevant)\".\n\n"
+    "<input>\n{text}\n</input>"
+)
+
+COMBINE_TEMPLATE = (
+    "Below are notes taken from consecutive parts of a larger input.\n"
+    "Task for the whole input: {instruction}\n\n"
+    "Merge them into a single, shorter set of notes, keeping everything relevant to the task.\n\n"
+    "<notes>\n{text}\n</notes>"
+)
+
+REDUCE_TEMPLATE = (
+    "Below are notes taken from consecutive parts of a larger input.\n\n"
+    "<notes>\n{text}\n</notes>\n\n"
+    "{instruction}"
+)
+
+
+class PipeError(Exception):
+    """Raised when part of a piped input could not be processed."""
+
+
+def stdin_is_piped(stream: Optional[TextIO] = None) -> bool:
+    """
+    Check whether standard input is a pipe or a redirected file.
+
+    Terminals, /dev/null and streams without a file descriptor (such as a
+    test runner's replacement stdin) do not count, so a plain `gpt "..."`
+    never blocks waiting for input.
+    """
+    stream = sys.stdin if stream is None else stream
+    try:
+        mode = os.fstat(stream.fileno()).st_mode
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return False
+    return stat.S_ISFIFO(mode) or stat.S_ISREG(mode)
+
+
+def open_stdin() -> TextIO:
+    """Return standard input as text, replacing undecodable bytes instead of failing."""
+    buffer = getattr(sys.stdin, "buffer", None)
+    if buffer is None:
+        return sys.stdin
+    return io.TextIOWrapper(buffer, encoding="utf-8", errors="replace")
+
+
+def chunk_budget(config: Dict[str, Any], prompt_template: str, instruction: str,
+                 count: Callable[[str], int]) -> int:
+    """Return the chunk size in tokens, capped so a map prompt fits the context window."""
+    budget = config.get("chunk_tokens") or DEFAULT_CONFIG["chunk_tokens"]
+    window = context_window(config)
+    if window is not None:
+        overhead = count(prompt_template) + count(MAP_TEMPLATE) + count(instruction)
+        available = window - (config.get("max_tokens") or 0) - MESSAGE_OVERHEAD - overhead
+        budget = min(budget, available)
+    return max(1, budget)
+
+
+def iter_chunks(stream: TextIO, max_tokens: int, count: Callable[[str], int]) -> Iterator[str]:
+    """
+    Yield consecutive chunks of the stream of at most `max_tokens` tokens.
+
+    Chunks end on line boundaries; lines too long for one chunk are read in
+    pieces, so no more than one chunk is ever held in memory.
+    """
+    # Cap each read so a file with no newlines is still consumed piece by piece
+    limit = max_tokens
+    lines, tokens = [], 0
+    while True:
+        line = stream.readline(limit)
+        if not line:
+            break
+        size = count(line)
+        if lines and tokens + size > max_tokens:
+            yield "".join(lines)
+            lines, tokens = [], 0
+        lines.append(line)
+        tokens += size
+    if lines:
+        yield "".join(lines)
+
+
+def split_first(chunks: Iterator[str]) -> tuple:
+    """
+    Look ahead far enough to tell whether the input fits in one chunk.
+
+    Returns (single, chunks): `single` is the only chunk's text (or "" for
+    empty input) and `chunks` is None; otherwise `single` is None and
+    `chunks` iterates over every chunk from the start.
+    """
+    first = next(chunks, None)
+    if first is None:
+        return "", None
+    second = next(chunks, None)
+    if second is None:
+        return first, None
+    return None, chain([first, second], chunks)
+
+
+async def amap_reduce(
+    aask: Callable[[str], Awaitable[str]],
+    instruction: str,
+    chunks: Iterable[str],
+    max_tokens: int,
+    count: Callable[[str], int],
+    concurrency: int = 4,
+) -> str:
+    """
+    Summarise every chunk against the instruction and return the final question.
+
+    Map requests run with at most `concurrency` in flight. Notes are kept in
+    input order; when they exceed `max_tokens` they are merged into a single
+    note before more are collected. Raises PipeError if any part fails.
+    """
+    from gpt4shell.batch import arun_batch
+
+    items = ({"question": MAP_TEMPLATE.format(index=index, instruction=instruction, text=text)}
+             for index, text in enumerate(chunks, start=1))
+
+    notes: List[str] = []
+    tokens = 0
+    async for record in arun_batch(aask, items, concurrency, ordered=True):
+        if record["error"]:
+            raise PipeError(f"Part {record['index'] + 1} of the input failed: {record['error']}")
+        note = f"Part {record['index'] + 1}:\n{record['answer'].strip()}"
+        size = count(note)
+        if notes and tokens + size > max_tokens:
+            try:
+                merged = await aask(COMBINE_TEMPLATE.format(instruction=instruction, text="\n\n".join(notes)))
+            except Exception as e:
+                raise PipeError(f"Merging the notes on parts 1-{record['index']} of the input failed: "
+                                f"{type(e).__name__}: {e}") from e
+            merged = merged.strip()
+            notes, tokens = [merged], count(merged)
+        notes.append(note)
+        tokens += size
+
+    return REDUCE_TEMPLATE.format(instruction=instruction, text="\n\n".join(notes))
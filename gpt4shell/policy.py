@@ -0,0 +1,480 @@
+"""
+Retries, deadlines and circuit breaking around model calls.
+
+`create_model` wraps every provider model in a ResilientModel that applies
+one policy to each request:
+
+- A deadline (`request_deadline`) bounds the whole request, retries and
+  backoff included, so a hung endpoint cannot hold a script forever.
+- Rate limits, 5xx answers, timeouts and connection errors are retried up
+  to `max_retries` times with jittered exponential backoff (or the
+  Retry-After delay the server asks for). Streams are only retried before
+  their first chunk, so nothing is printed twice.
+- Retries are capped by a budget per endpoint: each request earns
+  `retry_budget` retries on top of a small reserve, so an outage cannot
+  multiply the traffic sent to a struggling endpoint.
+- A circuit breaker per endpoint opens after `circuit_failure_threshold`
+  consecutive failures. While it is open, requests fail at once instead of
+  waiting for timeouts; after `circuit_reset_timeout` seconds one request
+  is let through to probe the endpoint and closes the circuit if it
+  succeeds. The state is kept in ~/.gpt4shell/circuits.json, so a new
+  process fails fast too while the endpoint is down. While it is open the
+  provider's model is not built until the circuit lets a request through,
+  so failing fast does not import the provider's client library.
+
+Rate limits and other 4xx answers show the endpoint is up and never count
+towards opening the circuit, and neither do missed deadlines, which only
+say the endpoint was slower than one caller wanted.
+
+Finished requests are recorded in the usage ledger (see gpt4shell.usage),
+which also refuses requests once a daily budget is used up.
+"""
+
+import asyncio
+import json
+import os
+import queue
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from langchain_core.runnables import Runnable
+
+from gpt4shell.scheduler import is_transient, retry_after
+from gpt4shell.settings import DEFAULT_CONFIG, get_config_path
+from gpt4shell.usage import UsageMeter
+
+
+# Retries when max_retries is not set; matches the OpenAI client default
+DEFAULT_MAX_RETRIES = 2
+
+# Backoff before the first retry and its cap, in seconds
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+# Retries each endpoint may make before the budget has to be earned
+RETRY_RESERVE = 10
+
+
+def get_circuits_path() -> Path:
+    """Get the path of the persisted circuit breaker state."""
+    return get_config_path().parent / "circuits.json"
+
+
+def endpoint_name(config: Dict[str, Any]) -> str:
+    """Return the endpoint a configuration talks to, e.g. "openai:default"."""
+    return "{}:{}".format(config.get("provider", "openai").lower(), config.get("api_base") or "default")
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of calling an endpoint whose circuit is open."""
+
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(f"{endpoint} is failing, not sending requests to it for another {retry_in:.0f}s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a request did not finish within its deadline."""
+
+    def __init__(self, endpoint: str, deadline: float):
+        super().__init__(f"No answer from {endpoint} within the {deadline:g}s deadline")
+        self.endpoint = endpoint
+        self.deadline = deadline
+
+
+def is_outage(error: BaseException) -> bool:
+    """
+    Whether an error suggests the endpoint itself is down.
+
+    Connection errors, provider timeouts, 5xx and 408 answers do. A missed
+    request_deadline does not: it is the caller's choice, and the shared
+    circuit must not make other processes refuse a slow but working endpoint.
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        return is_transient(error)
+    return status >= 500 or status == 408
+
+
+class RetryBudget:
+    """Lets retries add at most `ratio` calls per request, beyond a small reserve."""
+
+    def __init__(self, ratio: float, reserve: int = RETRY_RESERVE):
+        self.ratio = ratio
+        self.capacity = max(1, reserve)
+        self.balance = float(self.capacity)
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        """Credit the budget for a new request."""
+        with self._lock:
+            self.balance = min(self.capacity, self.balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        """Take one retry from the budget; False when it is spent."""
+        with self._lock:
+            if self.balance < 1:
+                return False
+            self.balance -= 1
+            return True
+
+
+_budgets: Dict[str, RetryBudget] = {}
+_budgets_lock = threading.Lock()
+
+
+def get_retry_budget(endpoint: str, ratio: float) -> RetryBudget:
+    """Return the process-wide retry budget of an endpoint."""
+    with _budgets_lock:
+        budget = _budgets.get(endpoint)
+        if budget is None or budget.ratio != ratio:
+            budget = _budgets[endpoint] = RetryBudget(ratio, RETRY_RESERVE)
+        return budget
+
+
+class CircuitBreaker:
+    """
+    Circuit breakers for every endpoint, persisted as JSON.
+
+    The file maps an endpoint to its consecutive failure count and, while its
+    circuit is open, the time it opened. Only failures and state changes are
+    written; a request to a healthy endpoint just reads the file, and only
+    when another process changed it.
+    """
+
+    def __init__(self, path: Path, failure_threshold: int = DEFAULT_CONFIG["circuit_failure_threshold"],
+                 reset_timeout: float = DEFAULT_CONFIG["circuit_reset_timeout"], clock=time.time):
+        self.path = Path(path)
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state: Dict[str, Dict[str, Any]] = {}
+        self._version = None
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> Optional["CircuitBreaker"]:
+        """Return a breaker for the configuration, or None when circuit breaking is off."""
+        threshold = config.get("circuit_failure_threshold", DEFAULT_CONFIG["circuit_failure_threshold"])
+        if not threshold:
+            return None
+        reset_timeout = config.get("circuit_reset_timeout")
+        if reset_timeout is None:
+            reset_timeout = DEFAULT_CONFIG["circuit_reset_timeout"]
+        return cls(get_circuits_path(), threshold, reset_timeout)
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            stat = self.path.stat()
+        except OSError:
+            self._state, self._version = {}, None
+            return self._state
+        version = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if version != self._version:
+            try:
+                with open(self.path, "r") as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = {}
+            self._state = state if isinstance(state, dict) else {}
+            self._version = version
+        return self._state
+
+    def _update(self, change: Callable[[Dict[str, Dict[str, Any]]], bool]) -> None:
+        """Apply `change` to the current state under the lock; write it if `change` returns True."""
+        import fcntl
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.path.with_suffix(".lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._version = None
+            state = dict(self._read())
+            if not change(state):
+                return
+            fd, temp_path = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(state, f)
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+            self._state, self._version = state, None
+
+    def state(self, endpoint: str) -> str:
+        """Return "closed", "open" or "half-open" for an endpoint."""
+        entry = self._read().get(endpoint)
+        if not entry or entry.get("opened_at") is None:
+            return "closed"
+        if self._clock() < entry["opened_at"] + self.reset_timeout:
+            return "open"
+        return "half-open"
+
+    def before_call(self, endpoint: str) -> None:
+        """Raise CircuitOpenError unless a request may be sent to the endpoint."""
+        entry = self._read().get(endpoint)
+        if not entry or entry.get("opened_at") is None:
+            return
+        now = self._clock()
+        if now < entry["opened_at"] + self.reset_timeout:
+            raise CircuitOpenError(endpoint, entry["opened_at"] + self.reset_timeout - now)
+
+        allowed = []
+
+        def probe(state):
+            entry = state.get(endpoint)
+            if not entry or entry.get("opened_at") is None:
+                allowed.append(True)
+                return False
+            if now < entry["opened_at"] + self.reset_timeout:
+                return False
+            # Restart the clock so other requests keep failing fast while this one probes
+            state[endpoint] = dict(entry, opened_at=now, probing=True)
+            allowed.append(True)
+            return True
+
+        self._update(probe)
+        if not allowed:
+            raise CircuitOpenError(endpoint, self.reset_timeout)
+
+    def record_success(self, endpoint: str) -> None:
+        if endpoint in self._state:
+            self._update(lambda state: state.pop(endpoint, None) is not None)
+
+    def record_failure(self, endpoint: str) -> None:
+        now = self._clock()
+
+        def fail(state):
+            entry = dict(state.get(endpoint) or {"failures": 0, "opened_at": None})
+            entry["failures"] = entry.get("failures", 0) + 1
+            if entry.pop("probing", False) or entry["failures"] >= self.failure_threshold:
+                entry["opened_at"] = now
+            state[endpoint] = entry
+            return True
+
+        self._update(fail)
+
+
+def _within(deadline: Optional[float], seconds: Optional[float], endpoint: str,
+            produce: Callable[[], Iterator[Any]]) -> Iterator[Any]:
+    """
+    Yield what `produce` yields, raising DeadlineExceededError once the deadline passes.
+
+    With a deadline the call runs in a daemon thread reporting through a
+    queue, so waiting can stop on time however long the call blocks.
+    """
+    if deadline is None:
+        yield from produce()
+        return
+
+    events = queue.Queue()
+    stopped = threading.Event()
+
+    def run():
+        try:
+            for item in produce():
+                if stopped.is_set():
+                    return
+                events.put(("item", item))
+            events.put(("done", None))
+        except Exception as e:
+            events.put(("error", e))
+
+    threading.Thread(target=run, daemon=True).start()
+    try:
+        while True:
+            try:
+                kind, value = events.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise DeadlineExceededError(endpoint, seconds) from None
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        stopped.set()
+
+
+class ResilientModel(Runnable):
+    """
+    Chat model stand-in applying deadlines, retries and circuit breaking.
+
+    Supports invoke, stream and ainvoke; anything else LangChain derives from
+    those (batch, astream) works too.
+
+    Args:
+        model: The provider's model, made without retries of its own, or None
+            to build it with `build` when the first request is let through.
+        endpoint: Name of the endpoint for the circuit breaker and retry budget.
+        max_retries: Retries per request for rate limits and transient errors.
+        deadline: Seconds the whole request may take, or None for no limit.
+        budget: Retry budget shared with other requests, or None for no cap.
+        breaker: Circuit breaker, or None to always call the endpoint.
+        meter: Usage ledger recorder and budget check, or None to record nothing.
+        base_delay: First backoff delay in seconds when no Retry-After is given.
+        max_delay: Cap for the exponential backoff.
+        build: Function returning the provider's model when `model` is None.
+    """
+
+    def __init__(self, model, endpoint: str, max_retries: int = DEFAULT_MAX_RETRIES,
+                 deadline: Optional[float] = None, budget: Optional[RetryBudget] = None,
+                 breaker: Optional[CircuitBreaker] = None, meter: Optional[UsageMeter] = None,
+                 base_delay: float = BACKOFF_BASE, max_delay: float = BACKOFF_MAX,
+                 build: Optional[Callable[[], Any]] = None):
+        self._model = model
+        self._build = build
+        self._model_lock = threading.Lock()
+        self.endpoint = endpoint
+        self.max_retries = max_retries
+        self.deadline = deadline
+        self.budget = budget
+        self.breaker = breaker
+        self.meter = meter
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "ResilientModel":
+        """Create the configured provider's model wrapped in the configured policy."""
+        from gpt4shell.providers import get_provider
+
+        # Only the selected provider's module is imported
+        factory = get_provider(config.get("provider", "openai").lower())
+        endpoint = endpoint_name(config)
+        breaker = CircuitBreaker.from_config(config)
+        # Requests fail fast while the circuit is open; building the model would only cost imports
+        circuit_open = breaker is not None and breaker.state(endpoint) == "open"
+        max_retries = config.get("max_retries")
+        ratio = config.get("retry_budget", DEFAULT_CONFIG["retry_budget"])
+        return cls(
+            None if circuit_open else factory(config),
+            endpoint,
+            max_retries=DEFAULT_MAX_RETRIES if max_retries is None else max_retries,
+            deadline=config.get("request_deadline"),
+            budget=None if ratio is None else get_retry_budget(endpoint, ratio),
+            breaker=breaker,
+            meter=UsageMeter.from_config(config),
+            base_delay=BACKOFF_BASE,
+            max_delay=BACKOFF_MAX,
+            build=lambda: factory(config),
+        )
+
+    @property
+    def model(self):
+        with self._model_lock:
+            if self._model is None:
+                self._model = self._build()
+            return self._model
+
+    def _deadline(self) -> Optional[float]:
+        return None if self.deadline is None else time.monotonic() + self.deadline
+
+    def _start(self) -> float:
+        """Refuse the request if a budget is used up; return its start time."""
+        if self.meter is not None:
+            self.meter.check()
+        if self.budget is not None:
+            self.budget.deposit()
+        return time.perf_counter()
+
+    def _finish(self, input, outputs, started: float) -> None:
+        if self.meter is not None:
+            self.meter.record(input, outputs, (time.perf_counter() - started) * 1000)
+
+    def _before_call(self) -> None:
+        if self.breaker is not None:
+            self.breaker.before_call(self.endpoint)
+
+    def _succeeded(self) -> None:
+        if self.breaker is not None:
+            self.breaker.record_success(self.endpoint)
+
+    def _failed(self, error: BaseException) -> None:
+        if self.breaker is None:
+            return
+        if is_outage(error):
+            self.breaker.record_failure(self.endpoint)
+        elif getattr(error, "status_code", None) is not None:
+            # Any answer, even an error, shows the endpoint is up
+            self.breaker.record_success(self.endpoint)
+
+    def _retry_delay(self, error: BaseException, attempt: int, deadline: Optional[float]) -> Optional[float]:
+        """Seconds to wait before retrying, or None when the error should be raised."""
+        if attempt >= self.max_retries or not is_transient(error):
+            return None
+        delay = retry_after(error)
+        if delay is None:
+            delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+            # Full jitter keeps retries from many clients from lining up again
+            delay = random.uniform(delay / 2, delay)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return None
+        if self.budget is not None and not self.budget.withdraw():
+            return None
+        return delay
+
+    def _run(self, input, produce: Callable[[], Iterator[Any]]) -> Iterator[Any]:
+        deadline = self._deadline()
+        started = self._start()
+        attempt = 0
+        while True:
+            self._before_call()
+            outputs = []
+            try:
+                for item in _within(deadline, self.deadline, self.endpoint, produce):
+                    outputs.append(item)
+                    yield item
+            except Exception as e:
+                self._failed(e)
+                # A stream that already produced output cannot be retried unseen
+                delay = None if outputs else self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self._succeeded()
+            self._finish(input, outputs, started)
+            return
+
+    def invoke(self, input, config=None, **kwargs):
+        def produce():
+            yield self.model.invoke(input, config, **kwargs)
+
+        return list(self._run(input, produce))[0]
+
+    def stream(self, input, config=None, **kwargs) -> Iterator[Any]:
+        yield from self._run(input, lambda: self.model.stream(input, config, **kwargs))
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        deadline = self._deadline()
+        started = self._start()
+        attempt = 0
+        while True:
+            self._before_call()
+            try:
+                call = self.model.ainvoke(input, config, **kwargs)
+                if deadline is None:
+                    result = await call
+                else:
+                    try:
+                        result = await asyncio.wait_for(call, max(0.0, deadline - time.monotonic()))
+                    except asyncio.TimeoutError:
+                        raise DeadlineExceededError(self.endpoint, self.deadline) from None
+            except Exception as e:
+                self._failed(e)
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self._succeeded()
+            self._finish(input, [result], started)
+            return result
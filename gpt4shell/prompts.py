@@ -0,0 +1,73 @@
+"""
+Named prompt templates and the compiled template cache.
+
+Besides `prompt_template`, the configuration can hold named templates that
+are selected per call with `gpt --prompt NAME`:
+
+    "prompts": {
+        "shell": "Answer with a single shell command and nothing else:\\n{question}",
+        "explain": "Explain this to a beginner, step by step:\\n{question}"
+    }
+
+Templates are checked when the configuration is loaded, so a typo such as
+`{questoin}` is reported once up front instead of failing a request. Parsed
+templates are kept in a cache keyed by the template string, so a process
+answering many questions (the daemon, a Client, batch mode) parses each
+template once.
+
+This module is imported by settings and must stay light.
+"""
+
+import string
+from functools import lru_cache
+from typing import Any, Collection, Dict, Optional, Set
+
+
+class UnknownPromptError(ValueError):
+    """Raised when --prompt names a template that is not configured."""
+
+
+def template_variables(template: str) -> Set[str]:
+    """Return the variables a template uses; raises ValueError if it is malformed."""
+    return {field.split(".")[0].split("[")[0]
+            for _, field, _, _ in string.Formatter().parse(template) if field is not None}
+
+
+def check_template(template: Any, allowed: Collection[str] = ("question",)) -> Optional[str]:
+    """
+    Describe what is wrong with a template, or return None if it can be used.
+
+    `allowed` lists the variables the template may use; {question} is always required.
+    """
+    if not isinstance(template, str):
+        return f"is a {type(template).__name__}, not a string"
+    try:
+        variables = template_variables(template)
+    except ValueError as e:
+        return f"is not a valid template: {e}"
+    unknown = ", ".join("{" + name + "}" for name in sorted(variables - set(allowed)))
+    if "question" not in variables:
+        return "has no {question} placeholder" + (f" (found {unknown})" if unknown else "")
+    if unknown:
+        return "uses unknown variables: " + unknown
+    return None
+
+
+def get_prompt_template(config: Dict[str, Any], name: Optional[str] = None) -> str:
+    """Return the named template, or the default prompt_template when name is None."""
+    if name is None:
+        from gpt4shell.settings import DEFAULT_CONFIG
+        return config.get("prompt_template", DEFAULT_CONFIG["prompt_template"])
+    prompts = config.get("prompts") or {}
+    if name not in prompts:
+        available = ", ".join(sorted(prompts)) or "none configured"
+        raise UnknownPromptError(f"Unknown prompt: {name}. Available prompts: {available}")
+    return prompts[name]
+
+
+@lru_cache(maxsize=64)
+def compile_prompt(template: str):
+    """Return the ChatPromptTemplate for a template string, parsing it only once."""
+    import gpt4shell
+
+    return gpt4shell._load("ChatPromptTemplate").from_template(template)
@@ -0,0 +1,71 @@
+"""
+Model provider registry for gpt4shell.
+
+A provider is a factory taking the configuration dict and returning a
+LangChain chat model. Built-in providers are listed in BUILTIN_PROVIDERS as
+"module:function" strings; third-party packages add more by declaring an
+entry point in the "gpt4shell.providers" group:
+
+    [tool.poetry.plugins."gpt4shell.providers"]
+    anthropic = "my_package.gpt4shell_provider:create_model"
+
+Nothing is imported until a provider is selected: only the chosen
+provider's module is loaded, and installed entry points are only scanned
+when the name is not a built-in one, so startup cost does not grow with the
+number of providers available.
+"""
+
+import importlib
+from functools import lru_cache
+from typing import Any, Callable, Dict, List
+
+
+# Entry point group for third-party providers
+ENTRY_POINT_GROUP = "gpt4shell.providers"
+
+# Built-in providers: name -> "module:function"
+BUILTIN_PROVIDERS = {
+    "openai": "gpt4shell.providers.openai:create_model",
+    "openai-compatible": "gpt4shell.providers.openai:create_compatible_model",
+    "mock": "gpt4shell.providers.mock:create_model",
+}
+
+_factories: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+
+
+@lru_cache(maxsize=None)
+def _entry_points() -> Dict[str, Any]:
+    from importlib.metadata import entry_points
+
+    return {entry_point.name.lower(): entry_point for entry_point in entry_points(group=ENTRY_POINT_GROUP)}
+
+
+def available_providers() -> List[str]:
+    """List built-in providers followed by installed third-party ones."""
+    extra = sorted(name for name in _entry_points() if name not in BUILTIN_PROVIDERS)
+    return list(BUILTIN_PROVIDERS) + extra
+
+
+def get_provider(name: str) -> Callable[[Dict[str, Any]], Any]:
+    """
+    Return the model factory for a provider, importing it on first use.
+
+    Built-in names take precedence over entry points. Raises ValueError for
+    unknown providers.
+    """
+    name = name.lower()
+    factory = _factories.get(name)
+    if factory is not None:
+        return factory
+
+    if name in BUILTIN_PROVIDERS:
+        module_name, function_name = BUILTIN_PROVIDERS[name].split(":")
+        factory = getattr(importlib.import_module(module_name), function_name)
+    elif name in _entry_points():
+        factory = _entry_points()[name].load()
+    else:
+        supported_list = ", ".join(available_providers())
+        raise ValueError(f"Unsupported provider: {name}. Currently supported providers: {supported_list}")
+
+    _factories[name] = factory
+    return factory
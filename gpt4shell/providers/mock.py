@@ -0,0 +1,61 @@
+"""
+In-process mock provider.
+
+Answers without any network access, which makes it useful for trying out
+configuration, for tests and for measuring gpt4shell's own overhead in
+benchmarks. By default it echoes the last message back; set `mock_response`
+in the configuration to answer with fixed text instead. Streaming yields
+one word at a time.
+"""
+
+import re
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class MockChatModel(BaseChatModel):
+    """Chat model that echoes the prompt, or answers with `response` when set."""
+
+    model: str = "mock"
+    response: Optional[str] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "gpt4shell-mock"
+
+    def _answer(self, messages: List[BaseMessage]) -> str:
+        if self.response is not None:
+            return self.response
+        return str(messages[-1].content) if messages else ""
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._answer(messages)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return self._generate(messages, stop)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for token in re.findall(r"\S+\s*|\s+", self._answer(messages)):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager is not None:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        for token in re.findall(r"\S+\s*|\s+", self._answer(messages)):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+def create_model(config: Dict[str, Any]) -> MockChatModel:
+    """Create the mock model; `mock_response` fixes the answer text."""
+    return MockChatModel(model=config.get("model", "mock"), response=config.get("mock_response"))
@@ -0,0 +1,55 @@
+"""
+OpenAI and OpenAI-compatible providers.
+
+"openai" talks to the OpenAI API (or whatever `api_base` points at).
+"openai-compatible" is for self-hosted servers speaking the same protocol,
+such as vLLM, llama.cpp or Ollama: `api_base` is required and an API key
+is optional.
+"""
+
+import os
+from typing import Any, Dict
+
+from gpt4shell.transport import get_async_http_client, get_http_client, request_timeout
+
+
+def _model_kwargs(config: Dict[str, Any]) -> Dict[str, Any]:
+    model_kwargs = {
+        "model": config.get("model", "gpt-3.5-turbo"),
+        "temperature": config.get("temperature", 1.0),
+    }
+
+    # Add optional parameters if specified
+    if config.get("max_tokens"):
+        model_kwargs["max_tokens"] = config["max_tokens"]
+    if config.get("api_base"):
+        model_kwargs["openai_api_base"] = config["api_base"]
+    # gpt4shell.policy retries according to max_retries; the client must not retry as well
+    model_kwargs["max_retries"] = 0
+
+    # Share pooled, keep-alive connections instead of a client per model
+    model_kwargs["http_client"] = get_http_client(config)
+    model_kwargs["http_async_client"] = get_async_http_client(config)
+    model_kwargs["request_timeout"] = request_timeout(config)
+    return model_kwargs
+
+
+def create_model(config: Dict[str, Any]):
+    """Create a ChatOpenAI model from the configuration."""
+    import gpt4shell
+
+    return gpt4shell._load("ChatOpenAI")(**_model_kwargs(config))
+
+
+def create_compatible_model(config: Dict[str, Any]):
+    """Create a model for a self-hosted OpenAI-compatible server."""
+    if not config.get("api_base"):
+        raise ValueError("The openai-compatible provider needs api_base, e.g. http://localhost:8000/v1")
+
+    import gpt4shell
+
+    model_kwargs = _model_kwargs(config)
+    if not os.environ.get("OPENAI_API_KEY"):
+        # Local servers usually ignore the key, but the client insists on one
+        model_kwargs["openai_api_key"] = "not-needed"
+    return gpt4shell._load("ChatOpenAI")(**model_kwargs)
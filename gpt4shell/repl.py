@@ -0,0 +1,167 @@
+"""
+Interactive chat mode for gpt4shell (`gpt -i`).
+
+Keeps the conversation in memory and sends it with every turn, built on the
+configured `prompt_template`: earlier turns go into a MessagesPlaceholder
+ahead of the rendered template for the new question. Each message is turned
+into a LangChain message and token-counted once, when it is added, and the
+running total is updated incrementally. When the history grows past
+`history_max_tokens`, the oldest turns are dropped, so per-turn latency and
+cost stay flat however long the session runs.
+
+With `--session NAME` the conversation starts from the newest turns of the
+named session that fit the budget, and every turn is appended to it.
+"""
+
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from gpt4shell.settings import DEFAULT_CONFIG
+from gpt4shell.tokens import check_prompt, count_tokens
+
+
+EXIT_COMMANDS = {"/exit", "/quit", "exit", "quit"}
+
+
+class Conversation:
+    """
+    Chat history with cached per-message token counts and a token budget.
+
+    Args:
+        max_tokens: Budget for the history sent with each turn.
+        count_tokens: Function returning the token count of a string.
+    """
+
+    def __init__(self, max_tokens: int, count_tokens: Callable[[str], int] = count_tokens):
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens
+        # Entries are (message, tokens); a turn is always a human/ai pair
+        self._messages = deque()
+        self.total_tokens = 0
+        self.trimmed_turns = 0
+
+    def __len__(self):
+        return len(self._messages)
+
+    def add_turn(self, question: str, answer: str) -> None:
+        """Append a completed exchange and trim the oldest turns if over budget."""
+        from langchain_core.messages import AIMessage, HumanMessage
+
+        for message in (HumanMessage(content=question), AIMessage(content=answer)):
+            tokens = self.count_tokens(message.content)
+            self._messages.append((message, tokens))
+            self.total_tokens += tokens
+        self._trim()
+
+    def _trim(self) -> None:
+        # Drop whole turns from the front; the newest turn is always kept
+        while self.total_tokens > self.max_tokens and len(self._messages) > 2:
+            for _ in range(2):
+                _, tokens = self._messages.popleft()
+                self.total_tokens -= tokens
+            self.trimmed_turns += 1
+
+    def messages(self) -> List[Any]:
+        """Return the history as LangChain messages, oldest first."""
+        return [message for message, _ in self._messages]
+
+    def clear(self) -> None:
+        self._messages.clear()
+        self.total_tokens = 0
+
+
+def load_conversation(config: Dict[str, Any], session=None) -> Conversation:
+    """Create a Conversation for the configured model, resumed from a session if given."""
+    model = config.get("model", "gpt-3.5-turbo")
+    conversation = Conversation(config.get("history_max_tokens") or DEFAULT_CONFIG["history_max_tokens"],
+                                count_tokens=lambda text: count_tokens(text, model))
+    if session is not None:
+        for turn in session.tail(max_tokens=conversation.max_tokens, count_tokens=conversation.count_tokens):
+            conversation.add_turn(turn["question"], turn["answer"])
+    return conversation
+
+
+def build_chat_chain(config: Dict[str, Any], prompt_template: str):
+    """Build a chain that sends the history ahead of the rendered prompt template."""
+    import gpt4shell
+    from langchain_core.prompts import MessagesPlaceholder
+
+    prompt = gpt4shell._load("ChatPromptTemplate").from_messages([
+        MessagesPlaceholder("history"),
+        ("human", prompt_template),
+    ])
+    return prompt | gpt4shell.create_model(config) | gpt4shell._load("StrOutputParser")()
+
+
+def run_repl(
+    config: Dict[str, Any],
+    prompt_template: str,
+    first_question: Optional[str] = None,
+    read_input: Callable[[str], str] = input,
+    session=None,
+) -> int:
+    """
+    Run the chat loop until the user exits.
+
+    Commands: /clear forgets the conversation, /exit (or Ctrl-D) quits.
+    Every turn is size-checked with the history it is sent with, like a
+    one-shot question, before anything is sent. Ctrl-C while an answer is
+    streaming abandons that answer only, and so does a failed request
+    (provider error, budget, open circuit, deadline, oversized prompt): the
+    error is printed and the question is not kept in the history. With a
+    session, /clear only forgets the turns for the rest of this chat; the
+    session itself keeps them.
+    """
+    import gpt4shell
+
+    try:
+        import readline  # noqa: F401 - enables line editing and history for input()
+    except ImportError:
+        pass
+
+    chain = build_chat_chain(config, prompt_template)
+    model = config.get("model", "gpt-3.5-turbo")
+    conversation = load_conversation(config, session)
+    console = gpt4shell._load("rich").get_console()
+    console.print("[dim]Interactive mode. /clear forgets the conversation, /exit or Ctrl-D quits.[/dim]")
+    if len(conversation):
+        console.print(f"[dim]Resuming session {session.name} with {len(conversation) // 2} earlier turns.[/dim]")
+
+    question = first_question
+    while True:
+        if question is None:
+            try:
+                question = read_input("› ").strip()
+            except EOFError:
+                console.print()
+                return 0
+            except KeyboardInterrupt:
+                console.print()
+                question = None
+                continue
+
+        if not question:
+            question = None
+            continue
+        if question in EXIT_COMMANDS:
+            return 0
+        if question == "/clear":
+            conversation.clear()
+            console.print("[dim]Conversation cleared.[/dim]")
+            question = None
+            continue
+
+        try:
+            # The history counts against the context window as much as the question does
+            question = check_prompt(config, prompt_template, question,
+                                    history_tokens=conversation.total_tokens)["question"]
+            answer = gpt4shell.stream_answer(chain, {"history": conversation.messages(), "question": question})
+        except KeyboardInterrupt:
+            console.print("[dim]Interrupted.[/dim]")
+        except Exception as e:
+            console.print(f"Error: {e}", style="red", markup=False)
+        else:
+            conversation.add_turn(question, answer)
+            if session is not None:
+                session.append(question, answer, model=model)
+        question = None
@@ -0,0 +1,407 @@
+"""
+Latency-based routing and fallback across several models or endpoints.
+
+With `routes` set in the configuration, `create_model` returns a Router
+instead of a single model. Each route is a model name or a dict of settings
+merged over the rest of the configuration, e.g.
+
+    "routes": ["gpt-4o-mini",
+               {"provider": "openai-compatible", "api_base": "http://gpu:8000/v1", "model": "llama3"}]
+
+For every request the router ranks the routes: healthy ones first, then by
+median time to first output, keeping the configured order for ties. Routes
+without a successful measurement yet come after the measured ones, so a
+known-fast route is not passed over for an unknown one. The best
+route is called first; if it fails or times out, the next one is tried. With
+`hedge_after` set, a backup request goes to the next route when the first
+has produced nothing after that many seconds ("auto" uses the route's p95),
+and whichever answers first wins.
+
+Latencies and errors are kept in a rolling window per route and persisted to
+~/.gpt4shell/routes.json, so a new process starts on the fastest healthy
+route straight away. Each save merges with what other processes wrote.
+"""
+
+import asyncio
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.runnables import Runnable
+
+from gpt4shell.settings import get_config_path
+
+
+# Samples kept per route, and how old they may get before being forgotten
+STATS_WINDOW = 50
+STATS_MAX_AGE = 24 * 60 * 60
+
+# Health only looks at recent outcomes so a route recovers from an outage
+HEALTH_WINDOW = 10 * 60
+HEALTH_MIN_SAMPLES = 3
+HEALTH_MAX_ERROR_RATE = 0.5
+
+
+def get_stats_path() -> Path:
+    """Get the path of the persisted routing statistics."""
+    return get_config_path().parent / "routes.json"
+
+
+class RoutingError(ConnectionError):
+    """Raised when every route failed."""
+
+
+class RouteStats:
+    """
+    Rolling latency and error samples per route, persisted as JSON.
+
+    A sample is (timestamp, latency in seconds), with None as the latency for
+    a failed request.
+    """
+
+    def __init__(self, path: Optional[Path] = None, clock=time.time):
+        self.path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+        if path is not None:
+            self._load()
+
+    def _read(self) -> Dict[str, List[tuple]]:
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        oldest = self._clock() - STATS_MAX_AGE
+        return {name: [tuple(sample) for sample in samples if sample[0] >= oldest]
+                for name, samples in data.items()}
+
+    def _merge(self, data: Dict[str, List[tuple]]) -> None:
+        """Add samples read from disk, keeping the newest STATS_WINDOW per route."""
+        for name, samples in data.items():
+            merged = sorted(set(self._samples.get(name, ())) | set(samples))
+            self._samples[name] = deque(merged, maxlen=STATS_WINDOW)
+
+    def _load(self) -> None:
+        self._merge(self._read())
+
+    def save(self) -> None:
+        """
+        Merge with the file and write the result atomically.
+
+        The file is re-read under an exclusive lock, so samples other
+        processes saved in the meantime are kept. Failures to write are
+        ignored.
+        """
+        if self.path is None:
+            return
+        import fcntl
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path.with_suffix(".lock"), "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                on_disk = self._read()
+                with self._lock:
+                    self._merge(on_disk)
+                    data = {name: list(samples) for name, samples in self._samples.items()}
+                fd, temp_path = tempfile.mkstemp(dir=self.path.parent, prefix=".routes-")
+                try:
+                    with os.fdopen(fd, "w") as f:
+                        json.dump(data, f)
+                    os.replace(temp_path, self.path)
+                except BaseException:
+                    os.unlink(temp_path)
+                    raise
+        except OSError:
+            pass
+
+    def record(self, name: str, latency: Optional[float]) -> None:
+        """Record a request's latency, or None if it failed, and persist."""
+        with self._lock:
+            samples = self._samples.setdefault(name, deque(maxlen=STATS_WINDOW))
+            samples.append((self._clock(), latency))
+        self.save()
+
+    def percentile(self, name: str, percent: float) -> Optional[float]:
+        """Return a latency percentile for the route, or None without data."""
+        latencies = sorted(latency for _, latency in self._samples.get(name, ()) if latency is not None)
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, int(round(percent / 100 * (len(latencies) - 1))))
+        return latencies[index]
+
+    def error_rate(self, name: str) -> Optional[float]:
+        """Return the share of recent requests that failed, or None without data."""
+        since = self._clock() - HEALTH_WINDOW
+        recent = [latency for timestamp, latency in self._samples.get(name, ()) if timestamp >= since]
+        if not recent:
+            return None
+        return sum(latency is None for latency in recent) / len(recent)
+
+    def healthy(self, name: str) -> bool:
+        since = self._clock() - HEALTH_WINDOW
+        recent = sum(1 for timestamp, _ in self._samples.get(name, ()) if timestamp >= since)
+        return recent < HEALTH_MIN_SAMPLES or self.error_rate(name) < HEALTH_MAX_ERROR_RATE
+
+    def summary(self, name: str) -> Dict[str, Any]:
+        return {
+            "p50": self.percentile(name, 50),
+            "p95": self.percentile(name, 95),
+            "error_rate": self.error_rate(name),
+            "healthy": self.healthy(name),
+        }
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def get_route_stats() -> RouteStats:
+    """Return the process-wide statistics, loading them on first use."""
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = RouteStats(get_stats_path())
+        return _stats
+
+
+class Route:
+    """One model or endpoint the router can send requests to."""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.name = "{}:{}:{}".format(
+            config.get("provider", "openai").lower(),
+            config.get("api_base") or "default",
+            config.get("model", "gpt-3.5-turbo"),
+        )
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        # Models are only built for routes that are actually used
+        with self._lock:
+            if self._model is None:
+                from gpt4shell.policy import ResilientModel
+                self._model = ResilientModel.from_config(self.config)
+            return self._model
+
+
+def build_routes(config: Dict[str, Any]) -> List[Route]:
+    """Expand the `routes` setting into Route objects, in configured order."""
+    base = {key: value for key, value in config.items() if key not in ("routes", "hedge_after")}
+    routes = []
+    for entry in config["routes"]:
+        overrides = {"model": entry} if isinstance(entry, str) else entry
+        routes.append(Route({**base, **overrides}))
+    return routes
+
+
+class Router(Runnable):
+    """
+    Chat model stand-in that routes each request across several models.
+
+    Supports invoke, stream and ainvoke; anything else LangChain derives from
+    those (batch, astream) works too.
+    """
+
+    def __init__(self, config: Dict[str, Any], stats: Optional[RouteStats] = None):
+        self.routes = build_routes(config)
+        if not self.routes:
+            raise ValueError("routes must list at least one model")
+        self.hedge_after = config.get("hedge_after")
+        self.stats = stats if stats is not None else get_route_stats()
+
+    def ranked(self) -> List[Route]:
+        """Return the routes in the order they should be tried."""
+        def key(item):
+            index, route = item
+            median = self.stats.percentile(route.name, 50)
+            return (not self.stats.healthy(route.name), median is None, median or 0.0, index)
+
+        return [route for _, route in sorted(enumerate(self.routes), key=key)]
+
+    def hedge_delay(self, route: Route) -> Optional[float]:
+        """Seconds to wait on a route before hedging, or None to never hedge."""
+        if self.hedge_after == "auto":
+            return self.stats.percentile(route.name, 95)
+        return self.hedge_after
+
+    def _produce(self, attempt, route, input, config, streaming, events, cancelled):
+        try:
+            if streaming:
+                for chunk in route.model.stream(input, config):
+                    if attempt in cancelled:
+                        return
+                    events.put((attempt, "chunk", chunk))
+            else:
+                events.put((attempt, "chunk", route.model.invoke(input, config)))
+            events.put((attempt, "done", None))
+        except Exception as e:
+            events.put((attempt, "error", e))
+
+    def _race(self, input, config, streaming: bool) -> Iterator[Any]:
+        """
+        Run the request across routes and yield the winner's output.
+
+        Each attempt runs in its own thread and reports through a queue. The
+        first attempt to produce output is committed to; the others are
+        abandoned. Before anything is committed, errors fail over to the next
+        route, and silence longer than the hedge delay starts one backup.
+        """
+        order = self.ranked()
+        events = queue.Queue()
+        cancelled = set()
+        started = {}
+
+        def launch():
+            attempt = len(started)
+            started[attempt] = time.monotonic()
+            threading.Thread(target=self._produce, daemon=True,
+                             args=(attempt, order[attempt], input, config, streaming, events, cancelled)).start()
+            return attempt
+
+        running = {launch()}
+        try:
+            yield from self._collect(order, events, started, running, cancelled, launch)
+        finally:
+            # Stop every producer once the caller is done, including on Ctrl-C
+            cancelled.update(started)
+
+    def _collect(self, order, events, started, running, cancelled, launch):
+        errors = []
+        committed = None
+        hedged = False
+        while True:
+            timeout = None
+            if committed is None and not hedged and len(started) < len(order):
+                delay = self.hedge_delay(order[max(running)])
+                if delay is not None:
+                    timeout = max(0.0, started[max(running)] + delay - time.monotonic())
+            try:
+                attempt, kind, value = events.get(timeout=timeout)
+            except queue.Empty:
+                hedged = True
+                running.add(launch())
+                continue
+
+            route = order[attempt]
+            if kind == "error":
+                running.discard(attempt)
+                if attempt in cancelled:
+                    continue
+                self.stats.record(route.name, None)
+                if attempt == committed:
+                    raise value
+                errors.append(f"{route.name}: {type(value).__name__}: {value}")
+                if committed is None and not running:
+                    if len(started) < len(order):
+                        running.add(launch())
+                        continue
+                    raise RoutingError("All routes failed: " + "; ".join(errors)) from value
+            elif kind == "chunk":
+                if committed is None:
+                    committed = attempt
+                    self.stats.record(route.name, time.monotonic() - started[attempt])
+                    cancelled.update(running - {attempt})
+                if attempt == committed:
+                    yield value
+            elif kind == "done":
+                running.discard(attempt)
+                if committed is None:
+                    # An empty stream still counts as an answer
+                    self.stats.record(route.name, time.monotonic() - started[attempt])
+                    return
+                if attempt == committed:
+                    return
+
+    def invoke(self, input, config=None, **kwargs):
+        result = None
+        for result in self._race(input, config, streaming=False):
+            pass
+        return result
+
+    def stream(self, input, config=None, **kwargs):
+        yield from self._race(input, config, streaming=True)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        order = self.ranked()
+        tasks = {}
+        errors = []
+        hedged = False
+
+        def launch():
+            route = order[len(tasks)]
+            task = asyncio.ensure_future(route.model.ainvoke(input, config))
+            tasks[task] = (route, time.monotonic())
+            return task
+
+        running = {launch()}
+        try:
+            while True:
+                timeout = None
+                if not hedged and len(tasks) < len(order):
+                    newest = max(running, key=lambda task: tasks[task][1])
+                    delay = self.hedge_delay(tasks[newest][0])
+                    if delay is not None:
+                        timeout = max(0.0, tasks[newest][1] + delay - time.monotonic())
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    running.add(launch())
+                    continue
+                for task in done:
+                    running.discard(task)
+                    route, start = tasks[task]
+                    error = task.exception()
+                    if error is None:
+                        self.stats.record(route.name, time.monotonic() - start)
+                        return task.result()
+                    self.stats.record(route.name, None)
+                    errors.append(f"{route.name}: {type(error).__name__}: {error}")
+                if not running:
+                    if len(tasks) < len(order):
+                        running.add(launch())
+                        continue
+                    raise RoutingError("All routes failed: " + "; ".join(errors)) from error
+        finally:
+            for task in running:
+                task.cancel()
+
+
+def routes_command(argv) -> int:
+    """Entry point for `gpt routes`: show the configured routes and their statistics."""
+    import argparse
+
+    from gpt4shell.settings import get_config
+
+    parser = argparse.ArgumentParser(prog="gpt routes",
+                                     description="Show configured routes in the order they would be tried")
+    parser.parse_args(argv)
+
+    config = get_config()
+    if not config.get("routes"):
+        print("No routes configured; set \"routes\" in ~/.gpt4shell/config.json")
+        return 1
+
+    router = Router(config)
+
+    def seconds(value):
+        return "-" if value is None else f"{value:.2f}s"
+
+    for route in router.ranked():
+        summary = router.stats.summary(route.name)
+        error_rate = "-" if summary["error_rate"] is None else f"{summary['error_rate']:.0%}"
+        status = "healthy" if summary["healthy"] else "unhealthy"
+        print(f"{route.name}  p50 {seconds(summary['p50'])}  p95 {seconds(summary['p95'])}  "
+              f"errors {error_rate}  {status}")
+    return 0
@@ -0,0 +1,215 @@
+"""
+Rate-limit-aware asyncio scheduler for model calls.
+
+Requests are admitted through token buckets sized from the configured
+requests-per-minute and tokens-per-minute limits, so a batch runs close to
+the provider quota without overshooting it. When the provider still answers
+429, every in-flight task pauses behind a shared cooldown (taken from the
+Retry-After header when present, exponential with jitter otherwise) instead
+of each one retrying on its own schedule. Retries follow the same
+`max_retries` and per-endpoint retry budget as synchronous requests (see
+gpt4shell.policy).
+"""
+
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+# Status codes worth retrying besides 429; matches the OpenAI client defaults
+RETRYABLE_STATUS_CODES = {408, 409, 500, 502, 503, 504}
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    return getattr(error, "status_code", None)
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Return the delay requested by a Retry-After(-ms) response header, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_connection_error(error: BaseException) -> bool:
+    try:
+        import openai
+    except ImportError:
+        return False
+    return isinstance(error, openai.APIConnectionError)
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether an error is worth retrying: a rate limit, a transient status or a lost connection."""
+    status = _status_code(error)
+    return status == 429 or status in RETRYABLE_STATUS_CODES or _is_connection_error(error)
+
+
+class TokenBucket:
+    """Refills `rate` units per second up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay_for(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if they are now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def consume(self, amount: float) -> None:
+        # Requests larger than the bucket go into debt, delaying the next ones
+        self._refill()
+        self.level -= amount
+
+    def drain(self) -> None:
+        """Empty the bucket so capacity ramps back up gradually."""
+        self._refill()
+        self.level = 0.0
+
+
+class RateLimitScheduler:
+    """
+    Admits async calls under request and token quotas and retries rate limits.
+
+    Args:
+        requests_per_minute: Request quota, or None for no limit.
+        tokens_per_minute: Token quota, or None for no limit.
+        max_retries: Retries per call for 429s and transient errors.
+        base_delay: First backoff delay in seconds when no Retry-After is given.
+        max_delay: Cap for the exponential backoff.
+        budget: RetryBudget each call tops up and each retry is taken from,
+            or None for no cap.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        budget=None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.requests = self._bucket(requests_per_minute, clock)
+        self.tokens = self._bucket(tokens_per_minute, clock)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self._clock = clock
+        self._cooldown_until = 0.0
+        self._lock = asyncio.Lock()
+        self.stats = {"calls": 0, "rate_limited": 0, "retries": 0}
+
+    @staticmethod
+    def _bucket(per_minute, clock):
+        # Allow at most one second's worth of burst; providers enforce quotas
+        # on windows much shorter than the nominal minute
+        if not per_minute:
+            return None
+        rate = per_minute / 60
+        return TokenBucket(rate, max(1.0, rate), clock)
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "RateLimitScheduler":
+        from gpt4shell.policy import (BACKOFF_BASE, BACKOFF_MAX, DEFAULT_MAX_RETRIES, endpoint_name,
+                                      get_retry_budget)
+        from gpt4shell.settings import DEFAULT_CONFIG
+
+        max_retries = config.get("max_retries")
+        ratio = config.get("retry_budget", DEFAULT_CONFIG["retry_budget"])
+        return cls(
+            requests_per_minute=config.get("requests_per_minute"),
+            tokens_per_minute=config.get("tokens_per_minute"),
+            max_retries=DEFAULT_MAX_RETRIES if max_retries is None else max_retries,
+            base_delay=BACKOFF_BASE,
+            max_delay=BACKOFF_MAX,
+            budget=None if ratio is None else get_retry_budget(endpoint_name(config), ratio),
+        )
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        # Full jitter keeps retries from many tasks from lining up again
+        return random.uniform(delay / 2, delay)
+
+    async def _acquire(self, tokens: int) -> None:
+        # The lock serialises admission so waiting tasks are released one by one
+        async with self._lock:
+            while True:
+                delay = self._cooldown_until - self._clock()
+                if self.requests is not None:
+                    delay = max(delay, self.requests.delay_for(1))
+                if self.tokens is not None:
+                    delay = max(delay, self.tokens.delay_for(tokens))
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            if self.requests is not None:
+                self.requests.consume(1)
+            if self.tokens is not None:
+                self.tokens.consume(tokens)
+
+    async def run(self, call: Callable[[], Awaitable[Any]], tokens: int = 1) -> Any:
+        """Run `call` once capacity allows, retrying rate limits and transient errors."""
+        attempt = 0
+        if self.budget is not None:
+            self.budget.deposit()
+        while True:
+            await self._acquire(tokens)
+            self.stats["calls"] += 1
+            try:
+                return await call()
+            except Exception as e:
+                status = _status_code(e)
+                if attempt >= self.max_retries or not is_transient(e):
+                    raise
+                if self.budget is not None and not self.budget.withdraw():
+                    raise
+                if status == 429:
+                    self.stats["rate_limited"] += 1
+                    delay = retry_after(e)
+                    if delay is None:
+                        delay = self._backoff(attempt)
+                    # Everyone waits, not just this task, and quota refills from empty
+                    self._cooldown_until = max(self._cooldown_until, self._clock() + delay)
+                    if self.requests is not None:
+                        self.requests.drain()
+                else:
+                    await asyncio.sleep(self._backoff(attempt))
+                self.stats["retries"] += 1
+                attempt += 1
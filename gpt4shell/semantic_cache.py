@@ -0,0 +1,258 @@
+"""
+Semantic response cache for gpt4shell.
+
+Reuses the answer to an earlier question when a new one is close enough:
+with an `embedding_model`, "how do I list files in python" can be answered
+from "python list files in directory". Each question is embedded into a
+unit vector and appended to a memory-mapped index under
+~/.gpt4shell/cache/semantic/; a lookup is one vectorised matrix-vector
+product over the whole index and succeeds when the best cosine similarity
+reaches `semantic_cache_threshold`.
+
+The index only stores vectors and the exact-cache key of each answer; the
+answers themselves live in the ResponseCache, so they expire and are evicted
+exactly like exact-match entries. Each combination of provider, endpoint,
+model, sampling settings, prompt template and embedding gets its own index,
+so an answer is never reused under different settings.
+
+Similar questions are only matched with `embedding_model` set to an
+embeddings model served at the configured endpoint; its dimensions are
+learned from the first question embedded. Without one, the
+built-in local embedding (hashed words, word pairs and character
+trigrams) is used, but it cannot tell "convert celsius to fahrenheit"
+from "convert fahrenheit to celsius", so it only matches questions with
+the same words in the same order, ignoring case, punctuation and filler
+words such as "the" or "please".
+"""
+
+import hashlib
+import json
+import os
+import re
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+from gpt4shell.cache import get_cache_dir
+from gpt4shell.settings import DEFAULT_CONFIG
+
+
+# Dimensions of the built-in embedding; 128 float32s keep a 100k-entry index at ~50MB
+LOCAL_DIMENSIONS = 128
+
+# Similarity the local embedding needs: identical words in identical order
+LEXICAL_THRESHOLD = 0.999
+
+# Beyond this many entries the index is compacted to the newest live half
+MAX_ENTRIES = 100_000
+
+_STOPWORDS = frozenset(
+    "a an and are can do does for how i in is it me my of on or please should the to what "
+    "with you".split()
+)
+
+
+def get_semantic_dir() -> Path:
+    """Get the directory holding the semantic indexes."""
+    return get_cache_dir() / "semantic"
+
+
+def _feature(name: str, weight: float, indices: list, weights: list, dimensions: int) -> None:
+    digest = zlib.crc32(name.encode("utf-8"))
+    indices.append(digest % dimensions)
+    # A hash-derived sign keeps collisions from always adding up
+    weights.append(weight if digest & 0x10000 else -weight)
+
+
+def local_embedding(text: str, dimensions: int = LOCAL_DIMENSIONS) -> np.ndarray:
+    """Embed text with hashed words, word pairs and character trigrams."""
+    words = [word for word in re.findall(r"[a-z0-9]+", text.lower()) if word not in _STOPWORDS]
+    indices, weights = [], []
+    for word in words:
+        _feature("w:" + word, 1.0, indices, weights, dimensions)
+        padded = f"#{word}#"
+        for start in range(len(padded) - 2):
+            _feature("t:" + padded[start:start + 3], 0.3, indices, weights, dimensions)
+    for first, second in zip(words, words[1:]):
+        _feature(f"b:{first} {second}", 0.5, indices, weights, dimensions)
+
+    vector = np.zeros(dimensions, dtype=np.float32)
+    np.add.at(vector, np.array(indices, dtype=np.intp), np.array(weights, dtype=np.float32))
+    return vector
+
+
+def _remote_embedder(config: Dict[str, Any]) -> Callable[[str], np.ndarray]:
+    from langchain_openai import OpenAIEmbeddings
+
+    from gpt4shell.transport import get_http_client
+
+    # Questions are short, so send them as text: tokenizing them first would need
+    # tiktoken's encoding files and is not understood by every compatible server
+    kwargs = {"model": config["embedding_model"], "http_client": get_http_client(config),
+              "check_embedding_ctx_length": False}
+    if config.get("api_base"):
+        kwargs["openai_api_base"] = config["api_base"]
+    if config.get("max_retries") is not None:
+        kwargs["max_retries"] = config["max_retries"]
+    embeddings = OpenAIEmbeddings(**kwargs)
+    return lambda text: np.asarray(embeddings.embed_query(text), dtype=np.float32)
+
+
+class SemanticIndex:
+    """
+    Append-only, memory-mapped index of unit vectors and cache keys.
+
+    Vectors are stored row by row in `vectors.f32` and the 32-byte digests
+    of their cache keys in `keys.bin`. Appends take an exclusive lock so rows
+    of the two files stay aligned across concurrent processes; searches take
+    a shared lock and only use rows present in both files. `dimensions` is
+    None until the size of the embedding is known; the index is empty then.
+    """
+
+    def __init__(self, directory: Path, dimensions: Optional[int]):
+        self.directory = Path(directory)
+        self.dimensions = dimensions
+        self._vectors_path = self.directory / "vectors.f32"
+        self._keys_path = self.directory / "keys.bin"
+        self._lock_path = self.directory / "index.lock"
+
+    def __len__(self) -> int:
+        if self.dimensions is None:
+            return 0
+        try:
+            vectors = self._vectors_path.stat().st_size // (4 * self.dimensions)
+            keys = self._keys_path.stat().st_size // 32
+        except FileNotFoundError:
+            return 0
+        return min(vectors, keys)
+
+    def search(self, vector: np.ndarray):
+        """Return (similarity, key) of the nearest entry, or None if the index is empty."""
+        if len(self) == 0:
+            return None
+        with self._locked(shared=True):
+            count = len(self)
+            if count == 0:
+                return None
+            vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(count, self.dimensions))
+            scores = vectors @ vector
+            best = int(np.argmax(scores))
+            with open(self._keys_path, "rb") as f:
+                f.seek(best * 32)
+                key = f.read(32).hex()
+        return float(scores[best]), key
+
+    def _locked(self, shared: bool = False):
+        import fcntl
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        lock = open(self._lock_path, "a")
+        fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        return lock
+
+    def add(self, vector: np.ndarray, key: str) -> None:
+        """Append a vector with the cache key of its answer."""
+        with self._locked():
+            count = len(self)
+            # Drop any half-written row left by a crashed writer before appending
+            for path, row_size in ((self._vectors_path, 4 * self.dimensions), (self._keys_path, 32)):
+                if path.exists() and path.stat().st_size != count * row_size:
+                    os.truncate(path, count * row_size)
+            with open(self._vectors_path, "ab") as f:
+                f.write(np.ascontiguousarray(vector, dtype=np.float32).tobytes())
+            with open(self._keys_path, "ab") as f:
+                f.write(bytes.fromhex(key))
+
+    def compact(self, keep: Callable[[str], bool], limit: int) -> int:
+        """Rewrite the index with at most `limit` of the newest entries that `keep` accepts."""
+        with self._locked():
+            count = len(self)
+            vectors = np.fromfile(self._vectors_path, dtype=np.float32, count=count * self.dimensions)
+            vectors = vectors.reshape(count, self.dimensions)
+            with open(self._keys_path, "rb") as f:
+                keys = [f.read(32) for _ in range(count)]
+
+            rows = [row for row in range(count - 1, -1, -1) if keep(keys[row].hex())][:limit][::-1]
+            for path, data in ((self._vectors_path, vectors[rows].tobytes()),
+                               (self._keys_path, b"".join(keys[row] for row in rows))):
+                temp_path = path.with_suffix(".tmp")
+                temp_path.write_bytes(data)
+                os.replace(temp_path, path)
+            return count - len(rows)
+
+
+class SemanticCache:
+    """Finds cached answers to similar questions through a SemanticIndex."""
+
+    def __init__(self, index: SemanticIndex, embed: Callable[[str], np.ndarray], threshold: float):
+        self.index = index
+        self.embed_text = embed
+        self.threshold = threshold
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], prompt_template: str) -> "SemanticCache":
+        scope = {
+            "provider": config.get("provider", "openai").lower(),
+            "api_base": config.get("api_base"),
+            "routes": config.get("routes"),
+            "model": config.get("model", "gpt-3.5-turbo"),
+            "temperature": config.get("temperature", 1.0),
+            "max_tokens": config.get("max_tokens"),
+            "prompt_template": prompt_template,
+            "embedding_model": config.get("embedding_model"),
+        }
+        digest = hashlib.sha256(json.dumps(scope, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        directory = get_semantic_dir() / digest
+
+        if config.get("embedding_model"):
+            embed = _remote_embedder(config)
+            try:
+                dimensions = json.loads((directory / "meta.json").read_text())["dimensions"]
+            except (OSError, ValueError, KeyError):
+                # Learned from the first embedding, so nothing is sent before a question is
+                dimensions = None
+        else:
+            embed, dimensions = local_embedding, LOCAL_DIMENSIONS
+
+        threshold = config.get("semantic_cache_threshold")
+        if threshold is None:
+            threshold = DEFAULT_CONFIG["semantic_cache_threshold"]
+        if not config.get("embedding_model"):
+            # Word overlap is no evidence of equal meaning; see the module docstring
+            threshold = max(threshold, LEXICAL_THRESHOLD)
+        return cls(SemanticIndex(directory, dimensions), embed, threshold)
+
+    def embed(self, question: str) -> np.ndarray:
+        """Embed a question as a unit vector."""
+        vector = np.asarray(self.embed_text(question), dtype=np.float32)
+        if self.index.dimensions is None:
+            # Remember the embedding size next to the index
+            self.index.dimensions = len(vector)
+            self.index.directory.mkdir(parents=True, exist_ok=True)
+            (self.index.directory / "meta.json").write_text(json.dumps({"dimensions": len(vector)}))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, vector: np.ndarray) -> Optional[str]:
+        """Return the cache key of the most similar question above the threshold."""
+        if not vector.any():
+            return None
+        match = self.index.search(vector)
+        if match is None or match[0] < self.threshold:
+            return None
+        return match[1]
+
+    def add(self, vector: np.ndarray, key: str, cache=None) -> None:
+        """
+        Index a question's vector under its answer's cache key.
+
+        When the index outgrows MAX_ENTRIES it is compacted, dropping entries
+        whose answers have left `cache` and then the oldest ones.
+        """
+        if not vector.any():
+            return
+        self.index.add(vector, key)
+        if len(self.index) > MAX_ENTRIES:
+            self.index.compact(lambda key: cache is None or cache.contains(key), MAX_ENTRIES // 2)
@@ -0,0 +1,302 @@
+"""
+Named conversations that persist across invocations (`gpt --session NAME`).
+
+Each session lives in ~/.gpt4shell/sessions/NAME/ as append-only JSON Lines
+segments (`00000001.jsonl`, `00000002.jsonl`, ...) plus `index.bin`, which
+holds one fixed-size record per turn: the segment number, byte offset and
+length of its line. Resuming a session walks the index backwards and reads
+only the turns that fit `history_max_tokens`, so a 10,000-turn session is
+as quick to resume as a 10-turn one and no segment is ever parsed whole.
+
+Appends hold an exclusive flock on `session.lock`, so several shells can add
+to the same session at once; reads take a shared lock. A writer that died
+between writing a turn and indexing it leaves bytes past the last indexed
+turn, which the next append truncates away. `gpt sessions prune` deletes
+idle sessions or compacts long ones down to their newest turns.
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import struct
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from gpt4shell.settings import get_config_path
+
+
+# Index record per turn: segment number, byte offset and length of its line
+INDEX_RECORD = struct.Struct("<IQI")
+
+# A new segment is started once the current one reaches this size
+SEGMENT_BYTES = 4 * 1024 * 1024
+
+# Index records read per step when walking a session backwards
+TAIL_BLOCK = 64
+
+_NAME = re.compile(r"[A-Za-z0-9_][A-Za-z0-9._-]{0,99}")
+
+
+def get_sessions_dir() -> Path:
+    """Get the directory holding named sessions."""
+    return get_config_path().parent / "sessions"
+
+
+class SessionError(ValueError):
+    """Raised for an invalid session name."""
+
+
+class Session:
+    """One named conversation on disk."""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.name = self.directory.name
+        self._index_path = self.directory / "index.bin"
+        self._lock_path = self.directory / "session.lock"
+
+    @classmethod
+    def open(cls, name: str) -> "Session":
+        """Return the session with this name; it is created on the first append."""
+        if not _NAME.fullmatch(name):
+            raise SessionError(f"Invalid session name: {name!r}. Use letters, digits, '.', '_' and '-'")
+        return cls(get_sessions_dir() / name)
+
+    def _segment_path(self, number: int) -> Path:
+        return self.directory / f"{number:08d}.jsonl"
+
+    def _segments(self) -> List[Path]:
+        return sorted(self.directory.glob("*.jsonl"))
+
+    @contextmanager
+    def _locked(self, shared: bool = False):
+        import fcntl
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield
+
+    def __len__(self) -> int:
+        try:
+            return self._index_path.stat().st_size // INDEX_RECORD.size
+        except FileNotFoundError:
+            return 0
+
+    def exists(self) -> bool:
+        return self._index_path.exists()
+
+    def _read_index(self, index_file, start: int, stop: int) -> List[Tuple[int, int, int]]:
+        index_file.seek(start * INDEX_RECORD.size)
+        data = index_file.read((stop - start) * INDEX_RECORD.size)
+        return list(INDEX_RECORD.iter_unpack(data))
+
+    def append(self, question: str, answer: str, **fields: Any) -> None:
+        """Add a completed exchange to the end of the session."""
+        record = {"time": time.time(), "question": question, "answer": answer, **fields}
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._locked():
+            count = len(self)
+            # Drop a half-written index record left by a crashed writer
+            if self._index_path.exists() and self._index_path.stat().st_size != count * INDEX_RECORD.size:
+                os.truncate(self._index_path, count * INDEX_RECORD.size)
+            segment, end = 1, 0
+            if count:
+                with open(self._index_path, "rb") as f:
+                    last_segment, offset, length = self._read_index(f, count - 1, count)[0]
+                segment, end = last_segment, offset + length
+            if end >= SEGMENT_BYTES:
+                segment, end = segment + 1, 0
+            path = self._segment_path(segment)
+            # Bytes past the last indexed turn were never committed
+            if path.exists() and path.stat().st_size > end:
+                os.truncate(path, end)
+            with open(path, "ab") as f:
+                f.write(line)
+            with open(self._index_path, "ab") as f:
+                f.write(INDEX_RECORD.pack(segment, end, len(line)))
+
+    def tail(self, limit: Optional[int] = None, max_tokens: Optional[int] = None,
+             count_tokens: Optional[Callable[[str], int]] = None) -> List[Dict[str, Any]]:
+        """
+        Return the newest turns, oldest first.
+
+        Stops at `limit` turns, or before the turn that would take the
+        question and answer tokens past `max_tokens`; the newest turn is
+        always included.
+        """
+        if not self.exists():
+            return []
+        turns = []
+        total = 0
+        with self._locked(shared=True), open(self._index_path, "rb") as index_file, \
+                _SegmentReader(self) as reader:
+            stop = len(self)
+            while stop > 0 and (limit is None or len(turns) < limit):
+                start = max(0, stop - TAIL_BLOCK)
+                for entry in reversed(self._read_index(index_file, start, stop)):
+                    if limit is not None and len(turns) >= limit:
+                        break
+                    turn = json.loads(reader.read(*entry))
+                    if max_tokens is not None:
+                        tokens = count_tokens(turn["question"]) + count_tokens(turn["answer"])
+                        if turns and total + tokens > max_tokens:
+                            return turns[::-1]
+                        total += tokens
+                    turns.append(turn)
+                stop = start
+        return turns[::-1]
+
+    def compact(self, keep: int) -> int:
+        """Rewrite the session with only its newest `keep` turns; return how many were dropped."""
+        if not self.exists():
+            return 0
+        with self._locked():
+            count = len(self)
+            if count <= keep:
+                return 0
+            with open(self._index_path, "rb") as index_file:
+                entries = self._read_index(index_file, count - keep, count) if keep else []
+            with _SegmentReader(self) as reader:
+                lines = [reader.read(*entry) for entry in entries]
+
+            old_segments = self._segments()
+            # New segments are numbered after the old ones so nothing is overwritten before the swap
+            segment = max((int(path.stem) for path in old_segments), default=0) + 1
+            end = 0
+            index = []
+            segment_file = None
+            try:
+                for line in lines:
+                    if segment_file is None or end >= SEGMENT_BYTES:
+                        if segment_file is not None:
+                            segment_file.close()
+                            segment, end = segment + 1, 0
+                        segment_file = open(self._segment_path(segment), "wb")
+                    segment_file.write(line)
+                    index.append(INDEX_RECORD.pack(segment, end, len(line)))
+                    end += len(line)
+            finally:
+                if segment_file is not None:
+                    segment_file.close()
+            temp_path = self._index_path.with_suffix(".tmp")
+            temp_path.write_bytes(b"".join(index))
+            os.replace(temp_path, self._index_path)
+            for path in old_segments:
+                path.unlink()
+            return count - keep
+
+    def delete(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def info(self) -> Dict[str, Any]:
+        """Return the name, number of turns, size in bytes and last update time."""
+        segments = self._segments()
+        try:
+            updated = self._index_path.stat().st_mtime
+        except FileNotFoundError:
+            updated = None
+        return {"name": self.name, "turns": len(self),
+                "bytes": sum(path.stat().st_size for path in segments), "updated": updated}
+
+
+class _SegmentReader:
+    """Reads indexed lines, keeping each segment file open while in use."""
+
+    def __init__(self, session: Session):
+        self.session = session
+        self._files = {}
+
+    def read(self, segment: int, offset: int, length: int) -> bytes:
+        f = self._files.get(segment)
+        if f is None:
+            f = self._files[segment] = open(self.session._segment_path(segment), "rb")
+        f.seek(offset)
+        return f.read(length)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        for f in self._files.values():
+            f.close()
+
+
+def list_sessions() -> List[Session]:
+    """Return every stored session, most recently used first."""
+    directory = get_sessions_dir()
+    if not directory.is_dir():
+        return []
+    sessions = [Session(path) for path in directory.iterdir() if path.is_dir()]
+    return sorted(sessions, key=lambda session: session.info()["updated"] or 0, reverse=True)
+
+
+def _ago(timestamp: Optional[float]) -> str:
+    if timestamp is None:
+        return "never"
+    seconds = max(0, time.time() - timestamp)
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= size:
+            return f"{int(seconds // size)}{unit} ago"
+    return "just now"
+
+
+def sessions_command(argv) -> int:
+    """Entry point for `gpt sessions list|show|prune`."""
+    parser = argparse.ArgumentParser(prog="gpt sessions", description="Manage named conversations")
+    actions = parser.add_subparsers(dest="action", required=True)
+    actions.add_parser("list", help="List sessions, most recently used first")
+    show = actions.add_parser("show", help="Print the newest turns of a session")
+    show.add_argument("name")
+    show.add_argument("--last", type=int, default=10, metavar="N",
+                      help="Number of turns to print (0 for all; default 10)")
+    prune = actions.add_parser("prune", help="Delete idle sessions or compact long ones")
+    prune.add_argument("names", nargs="*", metavar="NAME", help="Sessions to prune (default: all)")
+    prune.add_argument("--older-than", type=float, metavar="DAYS",
+                       help="Delete sessions not used for this many days")
+    prune.add_argument("--keep", type=int, metavar="N", help="Keep only the newest N turns of each session")
+    args = parser.parse_args(argv)
+
+    if args.action == "list":
+        sessions = list_sessions()
+        if not sessions:
+            print("No sessions")
+        for session in sessions:
+            info = session.info()
+            print(f"{info['name']}  {info['turns']} turns  {info['bytes']} bytes  {_ago(info['updated'])}")
+        return 0
+
+    names = [args.name] if args.action == "show" else args.names
+    try:
+        selected = [Session.open(name) for name in names] if names else list_sessions()
+    except SessionError as e:
+        print(f"Error: {e}")
+        return 1
+
+    if args.action == "show":
+        session = selected[0]
+        if not session.exists():
+            print(f"Error: No session named {session.name!r}")
+            return 1
+        turns = session.tail(limit=args.last or None)
+        for turn in turns:
+            print(f"> {turn['question']}\n{turn['answer']}\n")
+        return 0
+
+    if args.older_than is None and args.keep is None:
+        parser.error("prune needs --older-than DAYS and/or --keep N")
+    deleted = compacted = 0
+    cutoff = time.time() - (args.older_than or 0) * 86400
+    for session in selected:
+        updated = session.info()["updated"]
+        if args.older_than is not None and (updated is None or updated < cutoff):
+            session.delete()
+            deleted += 1
+        elif args.keep is not None:
+            compacted += session.compact(max(0, args.keep))
+    print(f"Deleted {deleted} sessions, dropped {compacted} old turns")
+    return 0
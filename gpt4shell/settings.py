@@ -1,18 +1,39 @@
 """
 Configuration management for gpt4shell.
 
-This module handles loading configuration from ~/.gpt4shell/config.json
-and provides default values when the configuration file doesn't exist.
+Configuration is layered, later layers overriding earlier ones key by key:
+
+1. DEFAULT_CONFIG below
+2. the user file, ~/.gpt4shell/config.json
+3. a project file, .gpt4shell.json in the working directory or the nearest
+   parent below the home directory; it may only set PROJECT_KEYS, so a
+   checkout cannot send the user's key or prompts to a server of its choosing
+4. environment variables named GPT4SHELL_<KEY>, e.g. GPT4SHELL_MODEL=gpt-4
+   (values are parsed as JSON when they can be, so GPT4SHELL_TEMPERATURE=0
+   is a number)
+
+The merged, validated result is stored as a marshal snapshot next to the
+user file, keyed by the path, mtime and size of every layer file and the
+GPT4SHELL_ variables. Later launches only stat the layer files and load the
+snapshot instead of parsing and validating JSON again. Within a process,
+`get_config()` returns the loaded configuration without touching the disk.
 """
 
 import json
+import marshal
 import os
+import sys
+import tempfile
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
+
+from gpt4shell.prompts import check_template
+from gpt4shell.providers import BUILTIN_PROVIDERS
+from gpt4shell.timings import span
 
 
-# Supported providers
-SUPPORTED_PROVIDERS = ["openai"]
+# Built-in providers; more can be installed through entry points
+SUPPORTED_PROVIDERS = list(BUILTIN_PROVIDERS)
 
 # Default configuration values
 DEFAULT_CONFIG = {
@@ -22,39 +43,272 @@ DEFAULT_CONFIG = {
     "prompt_template": "Answer the question from the user in simple terms:\n{question}",
     "max_tokens": None,  # Use provider default
     "api_base": None,    # Use provider default
+    "stream": False,     # Print the whole answer at once
+    "output": "auto",    # "rich" Markdown on a terminal and "raw" text when piped, or force either
+    "cache": "auto",     # Cache answers of deterministic (temperature 0) calls
+    "cache_ttl": 7 * 24 * 60 * 60,  # Seconds before a cached answer expires
+    "cache_max_bytes": 50 * 1024 * 1024,  # Evict least recently used answers above this size
+    "concurrency": 4,    # Requests in flight in batch mode
+    "max_retries": None,  # Retries of rate-limited and failed requests; None for 2
+    "retry_budget": 0.2,  # Retries each request adds to an endpoint's budget; None for no cap
+    "request_deadline": None,  # Seconds a whole request may take, retries included; None for no limit
+    "circuit_failure_threshold": 5,  # Consecutive failures that make an endpoint fail fast; 0 to disable
+    "circuit_reset_timeout": 30.0,   # Seconds an endpoint fails fast before a request probes it again
+    "usage_ledger": True,  # Record tokens, latency and cost of every call in ~/.gpt4shell/usage.db
+    "daily_budget": None,  # USD per day after which requests are refused; None for no cap
+    "daily_token_budget": None,  # Tokens per day after which requests are refused; None for no cap
+    "requests_per_minute": None,  # No client-side request quota
+    "tokens_per_minute": None,    # No client-side token quota
+    "daemon": True,      # Forward questions to `gpt serve` when it is running
+    "single_flight": True,  # Identical requests in flight across processes share one call
+    "single_flight_timeout": 120.0,  # Seconds to wait for another process's identical call
+    "http_max_connections": 20,  # Connection pool size shared by all models
+    "http_max_keepalive": 10,    # Idle connections kept open for reuse
+    "http_keepalive_expiry": 30.0,  # Seconds an idle connection stays open
+    "http2": True,       # Use HTTP/2 when the optional h2 package is installed
+    "connect_timeout": 5.0,   # Seconds to establish a connection
+    "read_timeout": 600.0,    # Seconds to wait for response data
+    "history_max_tokens": 3000,  # Conversation history budget in interactive mode
+    "context_window": None,      # Use the known window for the model
+    "prompt_overflow": "reject",  # "reject" or "truncate" prompts that do not fit
+    "chunk_tokens": 3000,        # Piped input larger than this is map-reduced in chunks
+    "semantic_cache": False,     # Reuse answers to similar questions
+    "semantic_cache_threshold": 0.8,  # Cosine similarity needed to reuse an answer with embedding_model
+    "embedding_model": None,     # Embeddings model at the endpoint; None for the built-in local embedding
+    "routes": None,      # Ordered models/endpoints to route between, e.g. ["gpt-4o-mini", "gpt-3.5-turbo"]
+    "hedge_after": None,  # Seconds (or "auto" for the route's p95) before sending a backup request
+    "cmd_prompt_template": (
+        "Reply with a single {shell} command for {os} that does the following. "
+        "Reply with the command only: no explanation and no Markdown.\n{question}"
+    ),                   # Template for `gpt --cmd`; {shell} and {os} are filled in
+    "prompts": None,     # Named templates for --prompt, e.g. {"shell": "Reply with one command:\n{question}"}
+    "metrics_file": None,  # Append per-run timings to this JSON Lines file
+    "otel_endpoint": None,  # OTLP/HTTP traces endpoint to send per-run timings to
 }
 
 
+# Name of the per-project configuration file
+PROJECT_CONFIG_NAME = ".gpt4shell.json"
+
+# Keys a project file may set: how questions are asked and answered, never where
+# they are sent, what is written where, or how much may be spent
+PROJECT_KEYS = frozenset({
+    "model", "temperature", "max_tokens", "prompt_template", "cmd_prompt_template", "prompts",
+    "stream", "output", "context_window", "prompt_overflow", "chunk_tokens", "history_max_tokens",
+})
+
+# Prefix of environment variables overriding configuration keys
+ENV_PREFIX = "GPT4SHELL_"
+
+# Bump when the compiled format changes so old snapshots are ignored
+SNAPSHOT_VERSION = 2
+
+
 def get_config_path() -> Path:
     """Get the path to the configuration file."""
     home = Path.home()
     return home / ".gpt4shell" / "config.json"
 
 
-def load_config() -> Dict[str, Any]:
+def get_snapshot_path() -> Path:
+    """Get the path of the compiled configuration snapshot."""
+    return get_config_path().parent / "config.snapshot"
+
+
+def find_project_config(start: Optional[Path] = None) -> Optional[Path]:
+    """Find .gpt4shell.json in the working directory or its nearest parent below home."""
+    try:
+        directory = (start or Path.cwd()).resolve()
+    except OSError:
+        return None
+    home = Path.home()
+    for candidate in (directory, *directory.parents):
+        if candidate == home:
+            break
+        path = candidate / PROJECT_CONFIG_NAME
+        if path.is_file():
+            return path
+    return None
+
+
+def _env_overrides() -> Dict[str, Any]:
+    overrides = {}
+    for key in DEFAULT_CONFIG:
+        value = os.environ.get(ENV_PREFIX + key.upper())
+        if value is None:
+            continue
+        try:
+            overrides[key] = json.loads(value)
+        except json.JSONDecodeError:
+            overrides[key] = value
+    return overrides
+
+
+def _stamp(path: Optional[Path]) -> Optional[Tuple[str, int, int]]:
+    if path is None:
+        return None
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return (str(path), stat.st_mtime_ns, stat.st_size)
+
+
+def _is_valid_type(value: Any, default: Any) -> bool:
+    if value is None or default is None:
+        return True
+    if isinstance(default, bool):
+        return isinstance(value, bool)
+    if isinstance(default, (int, float)):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    return isinstance(value, type(default))
+
+
+def validate_config(config: Dict[str, Any], source: str) -> List[str]:
     """
-    Load configuration from ~/.gpt4shell/config.json.
-    
-    Returns default configuration if file doesn't exist or is invalid.
-    Merges user config with defaults to ensure all required keys are present.
+    Check known keys against the types of their defaults.
+
+    Invalid values, including prompt templates that cannot be used, are
+    replaced by the default in place and named prompts whose templates
+    cannot be used are dropped, as are routes that are not a list of
+    model names and setting objects. Returns warnings describing
+    what was replaced; unknown keys are left alone.
     """
+    warnings = []
+    for key, value in config.items():
+        # "cache" accepts true, false or "auto"
+        if key in DEFAULT_CONFIG and key != "cache" and not _is_valid_type(value, DEFAULT_CONFIG[key]):
+            warnings.append(f"Warning: Ignoring {key}={value!r} from {source}: "
+                            f"expected {type(DEFAULT_CONFIG[key]).__name__}")
+            config[key] = DEFAULT_CONFIG[key]
+    for key, allowed in (("prompt_template", ("question",)), ("cmd_prompt_template", ("question", "shell", "os"))):
+        template = config.get(key)
+        problem = check_template(template, allowed) if isinstance(template, str) else None
+        if problem:
+            warnings.append(f"Warning: Ignoring {key} from {source}: template {problem}; using the default")
+            config[key] = DEFAULT_CONFIG[key]
+    prompts = config.get("prompts")
+    if isinstance(prompts, dict):
+        for name, template in list(prompts.items()):
+            problem = check_template(template)
+            if problem:
+                warnings.append(f"Warning: Ignoring prompt {name!r} from {source}: template {problem}")
+                del prompts[name]
+    elif prompts is not None:
+        warnings.append(f"Warning: Ignoring prompts from {source}: expected an object of name: template")
+        config["prompts"] = None
+    routes = config.get("routes")
+    if routes is not None and not (isinstance(routes, list)
+                                   and all(isinstance(entry, (str, dict)) for entry in routes)):
+        warnings.append(f"Warning: Ignoring routes from {source}: "
+                        f"expected a list of model names or objects of settings")
+        config["routes"] = None
+    return warnings
+
+
+def _read_layer(path: Path) -> Tuple[Dict[str, Any], List[str]]:
+    try:
+        with open(path, 'r') as f:
+            layer = json.load(f)
+        if not isinstance(layer, dict):
+            raise ValueError("expected a JSON object")
+    except (json.JSONDecodeError, IOError, ValueError) as e:
+        # Report the error but continue with the other layers
+        return {}, [f"Warning: Could not load config from {path}: {e}", "Using default configuration."]
+    warnings = []
+    if path.name == PROJECT_CONFIG_NAME:
+        ignored = sorted(key for key in layer if key not in PROJECT_KEYS)
+        if ignored:
+            warnings.append(f"Warning: Ignoring {', '.join(ignored)} from {path}: "
+                            f"set them in {get_config_path()} instead")
+            layer = {key: value for key, value in layer.items() if key in PROJECT_KEYS}
+    return layer, warnings + validate_config(layer, str(path))
+
+
+def compile_config(paths: List[Path], env: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """Merge the layer files and environment overrides over the defaults."""
     config = DEFAULT_CONFIG.copy()
-    config_path = get_config_path()
-    
-    if config_path.exists():
+    warnings = []
+    for path in paths:
+        layer, layer_warnings = _read_layer(path)
+        _merge_layer(config, layer)
+        warnings.extend(layer_warnings)
+    if env:
+        warnings.extend(validate_config(env, "the environment"))
+        _merge_layer(config, env)
+    return config, warnings
+
+
+def _merge_layer(config: Dict[str, Any], layer: Dict[str, Any]) -> None:
+    # Named prompts add up across layers; a project can add one without hiding the user's
+    prompts = config.get("prompts")
+    config.update(layer)
+    if isinstance(prompts, dict) and isinstance(layer.get("prompts"), dict):
+        config["prompts"] = {**prompts, **layer["prompts"]}
+
+
+def _read_snapshot(path: Path, key: Tuple) -> Optional[Tuple[Dict[str, Any], List[str]]]:
+    try:
+        with open(path, 'rb') as f:
+            stored_key, config, warnings = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if stored_key != key:
+        return None
+    return config, warnings
+
+
+def _write_snapshot(path: Path, key: Tuple, config: Dict[str, Any], warnings: List[str]) -> None:
+    try:
+        data = marshal.dumps((key, config, warnings))
+        # Write atomically so a concurrent launch never reads half a snapshot
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=".config-")
         try:
-            with open(config_path, 'r') as f:
-                user_config = json.load(f)
-                # Merge user config with defaults, keeping user values where provided
-                config.update(user_config)
-        except (json.JSONDecodeError, IOError) as e:
-            # Log error but continue with defaults
-            print(f"Warning: Could not load config from {config_path}: {e}")
-            print("Using default configuration.")
-    
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    except (OSError, ValueError):
+        # Values marshal cannot store, or a read-only home: just skip caching
+        pass
+
+
+def load_config() -> Dict[str, Any]:
+    """
+    Load the layered configuration, from the compiled snapshot when it is current.
+
+    Returns default configuration if no file exists or a file is invalid.
+    Merges every layer with defaults to ensure all required keys are present.
+    """
+    with span("load_config"):
+        config, warnings = _load_layers()
+    for warning in warnings:
+        # Never mixed into answers written to stdout
+        print(warning, file=sys.stderr)
     return config
 
 
+def _load_layers() -> Tuple[Dict[str, Any], List[str]]:
+    config_path = get_config_path()
+    paths = [path for path in (config_path, find_project_config()) if path is not None and path.exists()]
+    env = _env_overrides()
+    if not paths:
+        config, warnings = compile_config(paths, env)
+    else:
+        key = (SNAPSHOT_VERSION, tuple(_stamp(path) for path in paths), tuple(sorted(env.items())),
+               tuple(DEFAULT_CONFIG.items()))
+        snapshot_path = get_snapshot_path()
+        snapshot = _read_snapshot(snapshot_path, key)
+        if snapshot is None:
+            config, warnings = compile_config(paths, env)
+            _write_snapshot(snapshot_path, key, config, warnings)
+        else:
+            config, warnings = snapshot
+    return config, warnings
+
+
 def create_example_config() -> None:
     """Create an example configuration file at ~/.gpt4shell/config.json"""
     config_path = get_config_path()
@@ -69,7 +323,8 @@ def create_example_config() -> None:
         "temperature": 0.7,  # Controls randomness: 0.0 (deterministic) to 2.0 (very random)
         "prompt_template": "You are a helpful assistant. Answer the question concisely and accurately:\n{question}",
         "max_tokens": 1000,  # Maximum tokens in response (null for provider default)
-        "api_base": None  # Custom API base URL (null for provider default)
+        "api_base": None,  # Custom API base URL (null for provider default)
+        "stream": True  # Print tokens as they are generated instead of waiting for the full answer
     }
     
     with open(config_path, 'w') as f:
@@ -0,0 +1,244 @@
+"""
+Cross-process request coalescing ("single flight") for gpt4shell.
+
+When many processes ask the same question at the same moment, as the jobs
+of a CI matrix do, only the first one calls the model. It holds an
+exclusive flock on ~/.gpt4shell/inflight/<key>.lock, where the key is the
+response cache key of the request, and writes the answer next to it once
+it is done; identical requests arriving meanwhile wait for that answer
+instead of making their own call. An answer is only handed to requests
+that started before it was written, so a request made after the call
+finished is sent afresh: coalescing never turns into caching. Waiting
+requests hold a shared flock on <key>.wait.lock, and whoever finds no one
+left waiting deletes the answer, so it does not stay on disk (which
+matters with `--no-cache` or caching turned off). Lock files are deleted
+too, by whoever holds them exclusively, and a request that finds it locked
+a file that was deleted meanwhile locks the new one instead.
+
+Only the local filesystem is involved. A leader that crashes loses its
+flock with its process, so a waiting request takes over the call. A leader
+that hangs is waited for at most `single_flight_timeout` seconds, after
+which the waiter makes its own call. A leader that fails writes nothing,
+so the next waiter calls the model itself.
+"""
+
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from gpt4shell.settings import DEFAULT_CONFIG, get_config_path
+
+
+# Seconds between checks for the leader's answer
+POLL_INTERVAL = 0.05
+
+# Answers and idle lock files older than these are swept away
+RESULT_MAX_AGE = 60
+LOCK_MAX_AGE = 60 * 60
+
+
+def get_inflight_dir() -> Path:
+    """Get the directory holding in-flight locks and their answers."""
+    return get_config_path().parent / "inflight"
+
+
+class Lease:
+    """
+    The right to make a call on behalf of every identical request.
+
+    A lease without a lock (after waiting for a hung leader timed out, or
+    with coalescing disabled) still publishes its answer but excludes no one.
+    """
+
+    def __init__(self, flight: Optional["SingleFlight"], key: Optional[str], lock=None):
+        self.flight = flight
+        self.key = key
+        self._lock = lock
+
+    def finish(self, answer: str) -> None:
+        """Publish the answer to the requests waiting for it."""
+        if self.flight is not None:
+            self.flight._publish(self.key, answer)
+
+    def release(self) -> None:
+        if self._lock is not None:
+            # No one else can hold the file while we do, so it need not outlive the call
+            try:
+                os.unlink(self._lock.name)
+            except FileNotFoundError:
+                pass
+            self._lock.close()
+            self._lock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class SingleFlight:
+    """Coalesces identical requests across processes through lock files."""
+
+    def __init__(self, directory: Path, timeout: float = DEFAULT_CONFIG["single_flight_timeout"]):
+        self.directory = Path(directory)
+        self.timeout = timeout
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> Optional["SingleFlight"]:
+        """Return a SingleFlight for the configuration, or None when coalescing is off."""
+        if not config.get("single_flight", DEFAULT_CONFIG["single_flight"]):
+            return None
+        timeout = config.get("single_flight_timeout")
+        return cls(get_inflight_dir(), DEFAULT_CONFIG["single_flight_timeout"] if timeout is None else timeout)
+
+    def _result(self, key: str, since: float) -> Optional[str]:
+        try:
+            with open(self.directory / f"{key}.json", "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("created", 0) < since:
+            return None
+        return entry.get("answer")
+
+    def _open_lock(self, name: str, operation: int):
+        """Return the lock file name, flocked with operation, or None if that would block."""
+        import fcntl
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / name
+        while True:
+            lock = open(path, "a")
+            try:
+                fcntl.flock(lock, operation)
+            except BlockingIOError:
+                lock.close()
+                return None
+            # The holder before us may have deleted the file after we opened it
+            try:
+                if os.path.samestat(os.fstat(lock.fileno()), os.stat(path)):
+                    return lock
+            except FileNotFoundError:
+                pass
+            lock.close()
+
+    @contextmanager
+    def _waiting(self, key: str):
+        """Register as a request that may still read the answer for key."""
+        import fcntl
+
+        with self._open_lock(f"{key}.wait.lock", fcntl.LOCK_SH):
+            yield
+
+    def _discard(self, key: str) -> None:
+        """Delete the answer for key unless a registered request may still read it."""
+        import fcntl
+
+        registration = self._open_lock(f"{key}.wait.lock", fcntl.LOCK_EX | fcntl.LOCK_NB)
+        if registration is None:
+            return
+        with registration:
+            for name in (f"{key}.json", f"{key}.wait.lock"):
+                try:
+                    (self.directory / name).unlink()
+                except FileNotFoundError:
+                    pass
+
+    def _attempt(self, key: str, since: float) -> Tuple[Optional[str], Optional[Lease]]:
+        """Return (answer, None), (None, lease), or (None, None) while another process leads."""
+        import fcntl
+
+        answer = self._result(key, since)
+        if answer is not None:
+            return answer, None
+        lock = self._open_lock(f"{key}.lock", fcntl.LOCK_EX | fcntl.LOCK_NB)
+        if lock is None:
+            return None, None
+        # The previous leader may have finished between the check and the lock
+        answer = self._result(key, since)
+        lease = Lease(self, key, lock)
+        if answer is not None:
+            lease.release()
+            return answer, None
+        return None, lease
+
+    def join(self, key: str) -> Tuple[Optional[str], Optional[Lease]]:
+        """
+        Wait for another process's answer or become the one to call the model.
+
+        Returns (answer, None) when an identical request answered, otherwise
+        (None, lease): make the call, pass the answer to `lease.finish` and
+        release the lease.
+        """
+        since = time.time()
+        deadline = time.monotonic() + self.timeout
+        with self._waiting(key):
+            while True:
+                answer, lease = self._attempt(key, since)
+                if answer is not None or lease is not None:
+                    break
+                if time.monotonic() >= deadline:
+                    return None, Lease(self, key)
+                time.sleep(POLL_INTERVAL)
+        if answer is not None:
+            self._discard(key)
+        return answer, lease
+
+    async def ajoin(self, key: str) -> Tuple[Optional[str], Optional[Lease]]:
+        """Like join, without blocking the event loop while waiting."""
+        import asyncio
+
+        since = time.time()
+        deadline = time.monotonic() + self.timeout
+        with self._waiting(key):
+            while True:
+                answer, lease = self._attempt(key, since)
+                if answer is not None or lease is not None:
+                    break
+                if time.monotonic() >= deadline:
+                    return None, Lease(self, key)
+                await asyncio.sleep(POLL_INTERVAL)
+        if answer is not None:
+            self._discard(key)
+        return answer, lease
+
+    def _publish(self, key: str, answer: str) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump({"created": time.time(), "answer": answer}, f)
+            os.replace(temp_path, self.directory / f"{key}.json")
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        # Requests already waiting keep it until they have read it
+        self._discard(key)
+        self.sweep()
+
+    def sweep(self) -> int:
+        """Remove old answers and idle lock files; return how many were removed."""
+        import fcntl
+
+        now = time.time()
+        removed = 0
+        for path in self.directory.iterdir():
+            try:
+                age = now - path.stat().st_mtime
+                if path.suffix == ".json" and age > RESULT_MAX_AGE:
+                    path.unlink()
+                    removed += 1
+                elif path.suffix == ".lock" and age > LOCK_MAX_AGE:
+                    with open(path, "a") as lock:
+                        # A lock someone holds is in use, however old the file
+                        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        path.unlink()
+                    removed += 1
+            except (FileNotFoundError, BlockingIOError):
+                continue
+        return removed
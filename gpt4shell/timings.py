@@ -0,0 +1,227 @@
+"""
+Lightweight timing instrumentation for gpt4shell.
+
+Code marks the stages worth measuring with `span("name")`. Until recording
+is enabled, `span` returns one shared no-op context manager, so
+instrumented code pays a function call and a global lookup and nothing
+else. `gpt --timings` enables recording and prints the spans to stderr when
+the command finishes; `metrics_file` appends every run to a JSON Lines file
+and `otel_endpoint` posts it as an OTLP/HTTP JSON trace to an OpenTelemetry
+collector (e.g. http://localhost:4318/v1/traces).
+
+Times are perf_counter readings relative to when gpt4shell started being
+imported; where the platform exposes it, interpreter startup before that is
+reported as a separate span.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, List, Optional
+
+# Taken as early as possible: gpt4shell/__init__ imports this module first
+IMPORT_STARTED = time.perf_counter()
+IMPORT_FINISHED = None
+
+_NULL_SPAN = nullcontext()
+_recorder = None
+
+
+def _process_age() -> Optional[float]:
+    """Seconds since this process started, where /proc makes that cheap to find out."""
+    try:
+        with open("/proc/self/stat", "rb") as f:
+            fields = f.read().rsplit(b")", 1)[1].split()
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - started
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class Recorder:
+    """Collects timed spans; nesting is tracked per thread."""
+
+    def __init__(self, origin: float = IMPORT_STARTED):
+        self.origin = origin
+        self.spans: List[Dict[str, Any]] = []
+        self.show = False
+        self.metrics_file = None
+        self.otel_endpoint = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _depth(self) -> int:
+        return getattr(self._local, "depth", 0)
+
+    def record(self, name: str, start: float, end: float, depth: Optional[int] = None, **attributes) -> None:
+        """Record a span from two perf_counter readings."""
+        span = {
+            "name": name,
+            "start_ms": round((start - self.origin) * 1000, 3),
+            "duration_ms": round((end - start) * 1000, 3),
+            "depth": self._depth() if depth is None else depth,
+        }
+        if attributes:
+            span["attributes"] = attributes
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        depth = self._depth()
+        self._local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self._local.depth = depth
+            self.record(name, start, end, depth, **attributes)
+
+    def report(self) -> str:
+        """Format the spans as an indented table, in start order."""
+        lines = [f"{'span':<40} {'start':>10} {'duration':>10}"]
+        for span in sorted(self.spans, key=lambda span: span["start_ms"]):
+            name = "  " * span["depth"] + span["name"]
+            lines.append(f"{name:<40} {span['start_ms']:>8.1f}ms {span['duration_ms']:>8.1f}ms")
+        lines.append(f"{'total':<40} {'':>10} {(time.perf_counter() - self.origin) * 1000:>8.1f}ms")
+        return "\n".join(lines)
+
+    def to_record(self) -> Dict[str, Any]:
+        return {
+            "timestamp": time.time(),
+            "pid": os.getpid(),
+            "total_ms": round((time.perf_counter() - self.origin) * 1000, 3),
+            "spans": sorted(self.spans, key=lambda span: span["start_ms"]),
+        }
+
+
+def enable() -> Recorder:
+    """Start recording spans for the rest of the process (idempotent)."""
+    global _recorder
+    if _recorder is None:
+        _recorder = Recorder()
+        age = _process_age()
+        if age is not None:
+            # Interpreter startup, up to the moment gpt4shell started importing
+            startup = age - (time.perf_counter() - IMPORT_STARTED)
+            if startup > 0:
+                _recorder.record("interpreter startup", IMPORT_STARTED - startup, IMPORT_STARTED, depth=0)
+        if IMPORT_FINISHED is not None:
+            _recorder.record("import gpt4shell", IMPORT_STARTED, IMPORT_FINISHED, depth=0)
+    return _recorder
+
+
+def mark_imported() -> None:
+    """Note that the gpt4shell package finished importing."""
+    global IMPORT_FINISHED
+    IMPORT_FINISHED = time.perf_counter()
+
+
+def disable() -> None:
+    """Stop recording and drop anything recorded so far."""
+    global _recorder
+    _recorder = None
+
+
+def enabled() -> bool:
+    return _recorder is not None
+
+
+def get_recorder() -> Optional[Recorder]:
+    return _recorder
+
+
+def span(name: str, **attributes):
+    """Time a block as a named span; a shared no-op unless recording is enabled."""
+    if _recorder is None:
+        return _NULL_SPAN
+    return _recorder.span(name, **attributes)
+
+
+def record(name: str, start: float, end: float, **attributes) -> None:
+    """Record a span measured by the caller, e.g. time to first token."""
+    if _recorder is not None:
+        _recorder.record(name, start, end, **attributes)
+
+
+def configure(config: Dict[str, Any]) -> None:
+    """Enable recording if the configuration asks for metrics to be exported."""
+    if config.get("metrics_file") or config.get("otel_endpoint"):
+        recorder = enable()
+        recorder.metrics_file = config.get("metrics_file")
+        recorder.otel_endpoint = config.get("otel_endpoint")
+
+
+def write_jsonl(path: str, recorder: Recorder) -> None:
+    """Append this run's spans to a JSON Lines file."""
+    path = os.path.expanduser(path)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(recorder.to_record()) + "\n")
+
+
+def otlp_payload(recorder: Recorder) -> Dict[str, Any]:
+    """Build an OTLP/HTTP JSON trace with one span per recorded span under a root span."""
+    trace_id = os.urandom(16).hex()
+    root_id = os.urandom(8).hex()
+    # Anchor perf_counter offsets to the wall clock
+    epoch_ns = time.time_ns() - int((time.perf_counter() - recorder.origin) * 1e9)
+    record = recorder.to_record()
+
+    def otlp_span(span_id, parent_id, name, start_ms, duration_ms, attributes=None):
+        start = epoch_ns + int(start_ms * 1e6)
+        span = {
+            "traceId": trace_id,
+            "spanId": span_id,
+            "name": name,
+            "kind": 1,
+            "startTimeUnixNano": str(start),
+            "endTimeUnixNano": str(start + int(duration_ms * 1e6)),
+            "attributes": [{"key": key, "value": {"stringValue": str(value)}}
+                           for key, value in (attributes or {}).items()],
+        }
+        if parent_id:
+            span["parentSpanId"] = parent_id
+        return span
+
+    spans = [otlp_span(root_id, None, "gpt", 0.0, record["total_ms"])]
+    spans.extend(otlp_span(os.urandom(8).hex(), root_id, span["name"], span["start_ms"], span["duration_ms"],
+                           span.get("attributes")) for span in record["spans"])
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "gpt4shell"}}]},
+            "scopeSpans": [{"scope": {"name": "gpt4shell.timings"}, "spans": spans}],
+        }]
+    }
+
+
+def export_otlp(endpoint: str, recorder: Recorder, timeout: float = 2.0) -> None:
+    """Post this run's spans to an OTLP/HTTP endpoint."""
+    import httpx
+
+    response = httpx.post(endpoint, json=otlp_payload(recorder), timeout=timeout)
+    response.raise_for_status()
+
+
+def finish() -> None:
+    """Print and export what was recorded, then stop recording; a no-op when off."""
+    recorder = _recorder
+    if recorder is None:
+        return
+    disable()
+    if recorder.show:
+        print(recorder.report(), file=sys.stderr)
+    try:
+        if recorder.metrics_file:
+            write_jsonl(recorder.metrics_file, recorder)
+        if recorder.otel_endpoint:
+            export_otlp(recorder.otel_endpoint, recorder)
+    except Exception as e:
+        # Metrics must never break the command itself
+        print(f"Warning: Could not export timings: {e}", file=sys.stderr)
@@ -0,0 +1,191 @@
+"""
+Token counting and prompt-size guardrails for gpt4shell.
+
+Counts the tokens of the rendered prompt before a request is sent and
+checks them against the model's context window, so oversized input is
+rejected (or truncated, depending on `prompt_overflow`) without a slow
+round trip. Also estimates request cost for `--dry-run`.
+
+Counting uses tiktoken when its encoding files are available and falls
+back to an estimate of four UTF-8 bytes per token otherwise, for example
+when the files cannot be downloaded. Encodings are loaded lazily on first
+use and cached for the life of the process. Most prompts never touch the
+tokenizer at all: a prompt whose UTF-8 size fits the budget cannot have
+more tokens than bytes, so only prompts near the limit are counted exactly.
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+
+# Context windows in tokens, matched by longest model name prefix
+CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4-1106-preview": 128000,
+    "gpt-4-0125-preview": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+}
+
+# List prices in USD per million (prompt, completion) tokens, matched by longest prefix
+PRICES = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4": (30.00, 60.00),
+    "gpt-4-32k": (60.00, 120.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4-1106-preview": (10.00, 30.00),
+    "gpt-4-0125-preview": (10.00, 30.00),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+# Tokens the chat format adds around a single user message and the reply
+MESSAGE_OVERHEAD = 7
+
+
+class PromptTooLargeError(ValueError):
+    """Raised when a rendered prompt does not fit the model's context window."""
+
+
+def _lookup(table: Dict[str, Any], model: str):
+    matches = [name for name in table if model.startswith(name)]
+    return table[max(matches, key=len)] if matches else None
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """Return the tiktoken encoding for a model, or None if unavailable."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # Encoding files are downloaded on first use; offline, fall back to estimates
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the tokens in text from its UTF-8 size."""
+    return max(1, len(text.encode("utf-8")) // 4) if text else 0
+
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """Count the tokens in text for a model (estimated if no tokenizer is available)."""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def context_window(config: Dict[str, Any]) -> Optional[int]:
+    """Return the context window for the configured model, or None if unknown."""
+    return config.get("context_window") or _lookup(CONTEXT_WINDOWS, config.get("model", "gpt-3.5-turbo"))
+
+
+def model_price(model: str) -> Optional[Tuple[float, float]]:
+    """Return (prompt, completion) USD prices per million tokens, or None if unknown."""
+    return _lookup(PRICES, model)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """Estimate the USD cost of a request, or None if the model has no known price."""
+    price = model_price(model)
+    if price is None:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+
+def _truncate(text: str, max_tokens: int, model: str) -> str:
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding(model)
+    if encoding is None:
+        # Cut on UTF-8 bytes, which the estimate counts, dropping any split character
+        return text.encode("utf-8")[:max_tokens * 4].decode("utf-8", errors="ignore")
+    tokens = encoding.encode(text, disallowed_special=())
+    return encoding.decode(tokens[:max_tokens])
+
+
+def check_prompt(config: Dict[str, Any], prompt_template: str, question: str,
+                 history_tokens: int = 0) -> Dict[str, Any]:
+    """
+    Check that the rendered prompt fits the model's context window.
+
+    `history_tokens` are the tokens of earlier turns sent along with the
+    prompt in a chat or session; they count against the window too, but
+    only the question is ever truncated. Returns a report with the (possibly
+    truncated) question, token counts and estimated cost. Raises
+    PromptTooLargeError when the prompt does not fit and the
+    `prompt_overflow` policy is "reject".
+    """
+    model = config.get("model", "gpt-3.5-turbo")
+    completion_budget = config.get("max_tokens") or 0
+    window = context_window(config)
+    prompt = prompt_template.format(question=question)
+
+    report = {
+        "model": model,
+        "prompt": prompt,
+        "question": question,
+        "context_window": window,
+        "completion_budget": completion_budget,
+        "prompt_tokens": None,
+        "history_tokens": history_tokens,
+        "truncated": False,
+    }
+
+    available = None if window is None else window - completion_budget - MESSAGE_OVERHEAD
+    if available is not None and len(prompt.encode("utf-8")) + history_tokens > available:
+        prompt_tokens = count_tokens(prompt, model) + history_tokens
+        if prompt_tokens > available:
+            keep = count_tokens(question, model) - (prompt_tokens - available)
+            if config.get("prompt_overflow", "reject") != "truncate" or keep <= 0:
+                history = f", {history_tokens} of them earlier turns," if history_tokens else ""
+                raise PromptTooLargeError(
+                    f"Prompt is {prompt_tokens} tokens{history} but {model} allows {available} "
+                    f"({window} context window minus {completion_budget} completion tokens "
+                    f"and {MESSAGE_OVERHEAD} tokens of message overhead)"
+                )
+            report["question"] = _truncate(question, keep, model)
+            report["prompt"] = prompt_template.format(question=report["question"])
+            report["truncated"] = True
+            prompt_tokens = count_tokens(report["prompt"], model) + history_tokens
+        report["prompt_tokens"] = prompt_tokens + MESSAGE_OVERHEAD
+
+    return report
+
+
+def dry_run_report(report: Dict[str, Any]) -> str:
+    """Describe what a checked request would send and cost, for `--dry-run`."""
+    model = report["model"]
+    prompt_tokens = report["prompt_tokens"]
+    if prompt_tokens is None:
+        prompt_tokens = count_tokens(report["prompt"], model) + MESSAGE_OVERHEAD
+
+    window = report["context_window"]
+    lines = [
+        f"Model:            {model}",
+        f"Prompt tokens:    {prompt_tokens}{' (estimated)' if get_encoding(model) is None else ''}",
+        f"Context window:   {window if window is not None else 'unknown'}",
+        f"Max completion:   {report['completion_budget'] or 'provider default'}",
+    ]
+    if report["truncated"]:
+        lines.append("Question:         truncated to fit the context window")
+
+    prompt_cost = estimate_cost(model, prompt_tokens, 0)
+    if prompt_cost is None:
+        lines.append("Estimated cost:   unknown (no price for this model)")
+    elif report["completion_budget"]:
+        total = estimate_cost(model, prompt_tokens, report["completion_budget"])
+        lines.append(f"Estimated cost:   ${prompt_cost:.6f} prompt, up to ${total:.6f} with a full completion")
+    else:
+        lines.append(f"Estimated cost:   ${prompt_cost:.6f} prompt plus completion")
+    return "\n".join(lines)
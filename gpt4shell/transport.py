@@ -0,0 +1,150 @@
+"""
+Shared HTTP client layer for model providers.
+
+Every model built by `create_model` is given HTTP clients from here instead
+of constructing its own, so connections (DNS, TCP and TLS setup) are reused
+across requests, chains and models in the same process. Pool size,
+keep-alive, HTTP/2 and timeouts come from the configuration; HTTP/2 is only
+enabled when the optional `h2` package is installed.
+
+Async connection pools are bound to the event loop that first uses them, so
+async clients are shared per loop instead, and closed by `run_async` before
+its loop ends. The process-wide clients are closed at exit.
+
+httpx is imported lazily so that nothing here costs anything until a model
+is actually created.
+"""
+
+import asyncio
+import atexit
+import threading
+import weakref
+from functools import lru_cache
+from typing import Any, Awaitable, Dict, Tuple, TypeVar
+
+from gpt4shell.settings import DEFAULT_CONFIG
+
+
+T = TypeVar("T")
+
+_clients = {}
+# Event loop -> {transport settings: httpx.AsyncClient}
+_async_clients = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def _setting(config: Dict[str, Any], key: str):
+    value = config.get(key)
+    return DEFAULT_CONFIG[key] if value is None else value
+
+
+def transport_settings(config: Dict[str, Any]) -> Tuple:
+    """Return the hashable subset of the config that shapes an HTTP client."""
+    return (
+        _setting(config, "http_max_connections"),
+        _setting(config, "http_max_keepalive"),
+        _setting(config, "http_keepalive_expiry"),
+        bool(_setting(config, "http2")) and http2_available(),
+        _setting(config, "connect_timeout"),
+        _setting(config, "read_timeout"),
+    )
+
+
+@lru_cache(maxsize=None)
+def http2_available() -> bool:
+    """Check whether httpx can speak HTTP/2 (needs the optional h2 package)."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _client_kwargs(settings: Tuple) -> Dict[str, Any]:
+    import httpx
+
+    max_connections, max_keepalive, keepalive_expiry, http2, connect_timeout, read_timeout = settings
+    return {
+        "limits": httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        "timeout": httpx.Timeout(read_timeout, connect=connect_timeout),
+        "http2": http2,
+        # Match the OpenAI SDK's own default client
+        "follow_redirects": True,
+    }
+
+
+def request_timeout(config: Dict[str, Any]):
+    """
+    Return the per-request httpx.Timeout for these settings.
+
+    The OpenAI SDK passes its own timeout with every request, overriding the
+    client's, so models need this as well as the shared client.
+    """
+    import httpx
+
+    return httpx.Timeout(_setting(config, "read_timeout"), connect=_setting(config, "connect_timeout"))
+
+
+def get_http_client(config: Dict[str, Any]):
+    """Return the process-wide httpx.Client for these transport settings."""
+    settings = transport_settings(config)
+    with _lock:
+        client = _clients.get(settings)
+        if client is None or client.is_closed:
+            import httpx
+            client = _clients[settings] = httpx.Client(**_client_kwargs(settings))
+        return client
+
+
+def get_async_http_client(config: Dict[str, Any]):
+    """
+    Return the httpx.AsyncClient for these transport settings on the running event loop.
+
+    Outside a running loop a new client is returned; it opens no connections
+    until used and is bound to whichever loop uses it first.
+    """
+    import httpx
+
+    settings = transport_settings(config)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return httpx.AsyncClient(**_client_kwargs(settings))
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(settings)
+        if client is None or client.is_closed:
+            client = clients[settings] = httpx.AsyncClient(**_client_kwargs(settings))
+        return client
+
+
+async def aclose_http_clients() -> None:
+    """Close the async clients of the running event loop."""
+    with _lock:
+        clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
+
+
+def run_async(coroutine: Awaitable[T]) -> T:
+    """Run a coroutine on a new event loop, closing the loop's HTTP clients before it ends."""
+    async def run():
+        try:
+            return await coroutine
+        finally:
+            await aclose_http_clients()
+
+    return asyncio.run(run())
+
+
+@atexit.register
+def close_http_clients() -> None:
+    """Close every shared client, e.g. before a daemon exits."""
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
@@ -0,0 +1,347 @@
+"""
+Token and cost accounting for gpt4shell (`gpt usage`).
+
+Every model call made through `create_model` is recorded in a SQLite
+ledger at ~/.gpt4shell/usage.db: time, model, prompt and completion tokens
+(as reported by the provider, estimated otherwise), latency and estimated
+cost. Answers served from the response cache are recorded too, as cache
+hits without tokens.
+
+The database runs in WAL mode so concurrent `gpt` processes append without
+blocking readers. Each call goes into the `calls` table, indexed on time
+and on (model, time), and is added to a per-day rollup in the same
+transaction. Reports read whole days from the rollup and only scan raw
+calls for the partial first day of `--since`, so they stay fast however
+many calls the ledger holds:
+
+    gpt usage --since 7d --by model
+
+With `daily_budget` (USD) or `daily_token_budget` set, requests are
+refused once today's calls have reached the cap. Models without a known
+price count towards the token budget only.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from gpt4shell.settings import DEFAULT_CONFIG, get_config_path
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    day TEXT NOT NULL,
+    model TEXT NOT NULL,
+    cached INTEGER NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    latency_ms REAL,
+    cost REAL
+);
+CREATE INDEX IF NOT EXISTS calls_ts ON calls (ts);
+CREATE INDEX IF NOT EXISTS calls_model_ts ON calls (model, ts);
+CREATE TABLE IF NOT EXISTS daily (
+    day TEXT NOT NULL,
+    model TEXT NOT NULL,
+    cached INTEGER NOT NULL,
+    calls INTEGER NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    latency_ms REAL NOT NULL,
+    cost REAL NOT NULL,
+    PRIMARY KEY (day, model, cached)
+) WITHOUT ROWID;
+"""
+
+GROUPS = ("model", "day", "total")
+
+_SINCE = re.compile(r"(\d+(?:\.\d+)?)([mhdw])")
+_UNITS = {"m": 60, "h": 60 * 60, "d": 24 * 60 * 60, "w": 7 * 24 * 60 * 60}
+
+
+def get_usage_path() -> Path:
+    """Get the path of the usage ledger database."""
+    return get_config_path().parent / "usage.db"
+
+
+class BudgetExceededError(Exception):
+    """Raised instead of sending a request once a daily budget is used up."""
+
+
+def day_of(ts: float) -> str:
+    """Return the local calendar day of a timestamp, e.g. "2024-05-31"."""
+    return time.strftime("%Y-%m-%d", time.localtime(ts))
+
+
+def _next_midnight(ts: float) -> float:
+    tomorrow = datetime.date.fromtimestamp(ts) + datetime.timedelta(days=1)
+    return datetime.datetime.combine(tomorrow, datetime.time()).timestamp()
+
+
+def parse_since(text: str, now: Optional[float] = None) -> float:
+    """Turn "30m", "12h", "7d", "2w" or a date like "2024-05-01" into a timestamp."""
+    now = time.time() if now is None else now
+    match = _SINCE.fullmatch(text.strip())
+    if match:
+        return now - float(match.group(1)) * _UNITS[match.group(2)]
+    try:
+        return time.mktime(time.strptime(text.strip(), "%Y-%m-%d"))
+    except ValueError:
+        raise ValueError(f"Cannot read {text!r} as a time; use e.g. 7d, 12h or 2024-05-01") from None
+
+
+class UsageLedger:
+    """
+    The SQLite ledger of model calls.
+
+    One connection is opened per process on first use and shared between
+    threads under a lock.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._connection = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        import sqlite3
+
+        # A connection inherited across fork must not be used by the child
+        if self._connection is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+    def record(self, model: str, prompt_tokens: int = 0, completion_tokens: int = 0,
+               latency_ms: Optional[float] = None, cached: bool = False, cost: Optional[float] = None,
+               ts: Optional[float] = None) -> None:
+        """Add one call to the ledger and to its day's rollup."""
+        ts = time.time() if ts is None else ts
+        self.record_many([(ts, model, cached, prompt_tokens, completion_tokens, latency_ms, cost)])
+
+    def record_many(self, calls: Iterable[tuple]) -> None:
+        """Add (ts, model, cached, prompt_tokens, completion_tokens, latency_ms, cost) calls in one transaction."""
+        rows = [(ts, day_of(ts), model, int(bool(cached)), prompt, completion, latency, cost)
+                for ts, model, cached, prompt, completion, latency, cost in calls]
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    "INSERT INTO calls (ts, day, model, cached, prompt_tokens, completion_tokens, latency_ms, cost) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                connection.executemany(
+                    "INSERT INTO daily VALUES (?, ?, ?, 1, ?, ?, COALESCE(?, 0), COALESCE(?, 0)) "
+                    "ON CONFLICT (day, model, cached) DO UPDATE SET "
+                    "calls = calls + 1, prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+                    "completion_tokens = completion_tokens + excluded.completion_tokens, "
+                    "latency_ms = latency_ms + excluded.latency_ms, cost = cost + excluded.cost",
+                    [row[1:] for row in rows])
+
+    def spent(self, day: Optional[str] = None) -> Dict[str, float]:
+        """Return the cost and tokens of a day's calls to models (today by default)."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT COALESCE(SUM(cost), 0), COALESCE(SUM(prompt_tokens + completion_tokens), 0) "
+                "FROM daily WHERE day = ? AND cached = 0", (day or day_of(time.time()),)).fetchone()
+        return {"cost": row[0], "tokens": row[1]}
+
+    def report(self, since: Optional[float] = None, by: str = "model") -> List[Dict[str, Any]]:
+        """
+        Aggregate calls made since a timestamp, grouped by model, day or not at all.
+
+        Rows have calls, cache_hits, prompt_tokens, completion_tokens,
+        avg_latency_ms (over calls to models) and cost.
+        """
+        if by not in GROUPS:
+            raise ValueError(f"Cannot group by {by!r}; use one of {', '.join(GROUPS)}")
+        group = "'total'" if by == "total" else by
+        if since is None:
+            source, params = "SELECT * FROM daily", ()
+        else:
+            # Whole days come from the rollup, the rest of the first day from the indexed calls
+            source = ("SELECT day, model, cached, calls, prompt_tokens, completion_tokens, latency_ms, cost "
+                      "FROM daily WHERE day > ? "
+                      "UNION ALL SELECT day, model, cached, 1, prompt_tokens, completion_tokens, "
+                      "COALESCE(latency_ms, 0), COALESCE(cost, 0) FROM calls WHERE ts >= ? AND ts < ?")
+            params = (day_of(since), since, _next_midnight(since))
+        query = (f"SELECT {group}, SUM(calls), SUM(cached * calls), SUM(prompt_tokens), SUM(completion_tokens), "
+                 f"SUM(latency_ms), SUM((1 - cached) * calls), SUM(cost) FROM ({source}) "
+                 f"GROUP BY 1 ORDER BY {'1' if by == 'day' else '8 DESC, 2 DESC'}")
+        with self._lock:
+            rows = self._connect().execute(query, params).fetchall()
+        return [{by: key, "calls": calls, "cache_hits": hits, "prompt_tokens": prompt,
+                 "completion_tokens": completion, "avg_latency_ms": latency / misses if misses else None,
+                 "cost": cost}
+                for key, calls, hits, prompt, completion, latency, misses, cost in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+
+_ledgers: Dict[Path, UsageLedger] = {}
+_ledgers_lock = threading.Lock()
+
+
+def get_usage_ledger(config: Dict[str, Any]) -> Optional[UsageLedger]:
+    """Return the process-wide ledger, or None when `usage_ledger` is off."""
+    if not config.get("usage_ledger", DEFAULT_CONFIG["usage_ledger"]):
+        return None
+    path = get_usage_path()
+    with _ledgers_lock:
+        ledger = _ledgers.get(path)
+        if ledger is None:
+            ledger = _ledgers[path] = UsageLedger(path)
+        return ledger
+
+
+def _prompt_text(input) -> str:
+    if isinstance(input, str):
+        return input
+    messages = input.to_messages() if hasattr(input, "to_messages") else input
+    return "\n".join(str(getattr(message, "content", message)) for message in messages)
+
+
+def _reported_usage(output) -> Optional[Tuple[int, int]]:
+    """Return the (prompt, completion) tokens a provider reported for a message, if any."""
+    usage = getattr(output, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    # Older LangChain versions only pass the provider's own usage through
+    usage = (getattr(output, "response_metadata", None) or {}).get("token_usage")
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    return None
+
+
+class UsageMeter:
+    """Records one model's calls in the ledger and enforces the daily budgets."""
+
+    def __init__(self, ledger: UsageLedger, model: str, daily_budget: Optional[float] = None,
+                 daily_token_budget: Optional[int] = None):
+        self.ledger = ledger
+        self.model = model
+        self.daily_budget = daily_budget
+        self.daily_token_budget = daily_token_budget
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> Optional["UsageMeter"]:
+        """Return a meter for the configured model, or None when the ledger is off."""
+        ledger = get_usage_ledger(config)
+        if ledger is None:
+            return None
+        return cls(ledger, config.get("model", "gpt-3.5-turbo"),
+                   config.get("daily_budget"), config.get("daily_token_budget"))
+
+    def check(self) -> None:
+        """Raise BudgetExceededError if today's calls have used up a budget."""
+        if self.daily_budget is None and self.daily_token_budget is None:
+            return
+        spent = self.ledger.spent()
+        if self.daily_budget is not None and spent["cost"] >= self.daily_budget:
+            raise BudgetExceededError(f"Daily budget of ${self.daily_budget:.2f} reached "
+                                      f"(${spent['cost']:.4f} spent today); raise daily_budget or wait until tomorrow")
+        if self.daily_token_budget is not None and spent["tokens"] >= self.daily_token_budget:
+            raise BudgetExceededError(f"Daily token budget of {self.daily_token_budget} reached "
+                                      f"({spent['tokens']} tokens used today); "
+                                      f"raise daily_token_budget or wait until tomorrow")
+
+    def record(self, input, outputs: List[Any], latency_ms: float) -> None:
+        """Record a finished call from its input and the messages or chunks it produced."""
+        import sqlite3
+
+        from gpt4shell.tokens import MESSAGE_OVERHEAD, count_tokens, estimate_cost
+
+        reported = [usage for usage in map(_reported_usage, outputs) if usage is not None]
+        if reported:
+            prompt_tokens = sum(usage[0] for usage in reported)
+            completion_tokens = sum(usage[1] for usage in reported)
+        else:
+            prompt_tokens = count_tokens(_prompt_text(input), self.model) + MESSAGE_OVERHEAD
+            completion_tokens = count_tokens("".join(str(getattr(output, "content", output)) for output in outputs),
+                                             self.model)
+        try:
+            self.ledger.record(self.model, prompt_tokens, completion_tokens, latency_ms,
+                               cost=estimate_cost(self.model, prompt_tokens, completion_tokens))
+        except sqlite3.Error:
+            # Losing one ledger entry is better than losing an answer already paid for
+            pass
+
+
+def record_cache_hit(config: Dict[str, Any]) -> None:
+    """Record an answer served without calling the model."""
+    import sqlite3
+
+    ledger = get_usage_ledger(config)
+    if ledger is None:
+        return
+    try:
+        ledger.record(config.get("model", "gpt-3.5-turbo"), cached=True)
+    except sqlite3.Error:
+        pass
+
+
+def _format_row(row: Dict[str, Any], by: str) -> List[str]:
+    latency = "-" if row["avg_latency_ms"] is None else f"{row['avg_latency_ms']:.0f}ms"
+    return [str(row[by]), str(row["calls"]), str(row["cache_hits"]), str(row["prompt_tokens"]),
+            str(row["completion_tokens"]), latency, f"${row['cost']:.6f}"]
+
+
+def usage_command(argv) -> int:
+    """Entry point for `gpt usage`: report tokens, latency and cost from the ledger."""
+    from gpt4shell.settings import get_config
+
+    def since(text):
+        try:
+            return parse_since(text)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e))
+
+    parser = argparse.ArgumentParser(prog="gpt usage", description="Report token usage and estimated cost")
+    parser.add_argument("--since", type=since, metavar="WHEN",
+                        help='Only count calls since then: "12h", "7d", "2w" or a date like 2024-05-01')
+    parser.add_argument("--by", choices=GROUPS, default="model", help="Group calls by model or day, or not at all")
+    parser.add_argument("--json", dest="json_output", action="store_true", help="Write the rows as JSON")
+    args = parser.parse_args(argv)
+
+    config = get_config()
+    ledger = get_usage_ledger(config)
+    if ledger is None:
+        print("Usage is not recorded; set \"usage_ledger\" to true in ~/.gpt4shell/config.json")
+        return 1
+    rows = ledger.report(args.since, args.by)
+    if args.json_output:
+        print(json.dumps(rows))
+        return 0
+    if not rows:
+        print("No calls recorded")
+        return 0
+
+    table = [[args.by, "calls", "cached", "prompt", "completion", "latency", "cost"]]
+    table += [_format_row(row, args.by) for row in rows]
+    widths = [max(len(line[column]) for line in table) for column in range(len(table[0]))]
+    for line in table:
+        print("  ".join(cell.ljust(width) if column == 0 else cell.rjust(width)
+                        for column, (cell, width) in enumerate(zip(line, widths))))
+
+    spent = ledger.spent()
+    if config.get("daily_budget") is not None:
+        print(f"Today: ${spent['cost']:.6f} of the ${config['daily_budget']:.2f} daily budget")
+    if config.get("daily_token_budget") is not None:
+        print(f"Today: {spent['tokens']} of the {config['daily_token_budget']} daily token budget")
+    return 0
@@ -0,0 +1,23 @@
+"""
+Shared test setup.
+
+Every test runs with HOME pointed at its own temporary directory, so the
+usage ledger, the in-flight locks, caches, sessions and route statistics
+that requests write under ~/.gpt4shell never touch the developer's own.
+"""
+
+import pytest
+
+from gpt4shell import usage
+
+
+@pytest.fixture(autouse=True)
+def isolated_home(tmp_path, monkeypatch):
+    """Point HOME, and with it get_config_path(), at a temporary directory."""
+    home = tmp_path / "home"
+    home.mkdir()
+    monkeypatch.setenv("HOME", str(home))
+    yield home
+    with usage._ledgers_lock:
+        for path in [path for path in usage._ledgers if home in path.parents]:
+            usage._ledgers.pop(path).close()
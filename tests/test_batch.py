@@ -0,0 +1,145 @@
+"""
+Unit tests for gpt4shell.batch module.
+
+Tests batch input parsing, bounded concurrency, ordering, per-item failure
+handling and the --batch command line against the local stand-in server.
+"""
+
+import asyncio
+import io
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from benchmarks.mock_server import MockOpenAIServer
+from gpt4shell import main
+from gpt4shell.batch import arun_batch, awrite_results, read_questions
+
+
+class TestReadQuestions(unittest.TestCase):
+    """Test parsing of plain text and JSONL batch input."""
+
+    def test_plain_lines_become_questions(self):
+        """Test that each non-empty line is a question."""
+        items = list(read_questions(io.StringIO("first\n\n  second  \n")))
+        self.assertEqual(items, [{"question": "first"}, {"question": "second"}])
+
+    def test_jsonl_lines_are_parsed(self):
+        """Test that JSON objects keep their id and question."""
+        items = list(read_questions(io.StringIO('{"id": "a", "question": "q1"}\n')))
+        self.assertEqual(items, [{"id": "a", "question": "q1"}])
+
+    def test_invalid_json_is_reported_not_raised(self):
+        """Test that malformed JSON becomes an item carrying the error."""
+        items = list(read_questions(io.StringIO('{"question": \n')))
+        self.assertIn("Invalid JSON", items[0]["error"])
+
+
+def run(aask, items, concurrency, ordered=True):
+    async def collect():
+        return [record async for record in arun_batch(aask, items, concurrency, ordered)]
+
+    return asyncio.run(collect())
+
+
+class TestRunBatch(unittest.TestCase):
+    """Test concurrent execution of batch items."""
+
+    def test_results_are_in_input_order(self):
+        """Test that ordered mode preserves input order even when later items finish first."""
+        async def aask(question):
+            await asyncio.sleep(0.05 if question == "slow" else 0)
+            return question.upper()
+
+        items = [{"question": q} for q in ["slow", "a", "b"]]
+        records = run(aask, items, concurrency=3)
+
+        self.assertEqual([r["answer"] for r in records], ["SLOW", "A", "B"])
+        self.assertEqual([r["index"] for r in records], [0, 1, 2])
+
+    def test_unordered_yields_fast_items_first(self):
+        """Test that unordered mode yields results as they complete."""
+        async def aask(question):
+            await asyncio.sleep(0.1 if question == "slow" else 0)
+            return question
+
+        items = [{"question": q} for q in ["slow", "fast"]]
+        records = run(aask, items, concurrency=2, ordered=False)
+
+        self.assertEqual([r["question"] for r in records], ["fast", "slow"])
+
+    def test_concurrency_is_bounded(self):
+        """Test that no more than `concurrency` calls run at once."""
+        state = {"active": 0, "peak": 0}
+
+        async def aask(question):
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            await asyncio.sleep(0.01)
+            state["active"] -= 1
+            return question
+
+        run(aask, ({"question": str(i)} for i in range(20)), concurrency=3)
+        self.assertEqual(state["peak"], 3)
+
+    def test_failures_do_not_abort_the_run(self):
+        """Test that a failing item is recorded and the rest still complete."""
+        async def aask(question):
+            if question == "bad":
+                raise RuntimeError("boom")
+            return "ok"
+
+        items = [{"question": q} for q in ["good", "bad", "good"]]
+        records = run(aask, items, concurrency=2)
+
+        self.assertEqual([r["answer"] for r in records], ["ok", None, "ok"])
+        self.assertEqual(records[1]["error"], "RuntimeError: boom")
+        self.assertTrue(all("latency_ms" in r for r in records))
+
+        async def records_of():
+            for record in records:
+                yield record
+
+        output = io.StringIO()
+        self.assertEqual(asyncio.run(awrite_results(records_of(), output)), 1)
+        self.assertEqual(len(output.getvalue().splitlines()), 3)
+
+
+class TestBatchCommandLine(unittest.TestCase):
+    """Test `gpt --batch` end to end against the stand-in server."""
+
+    def test_batch_file_writes_jsonl_results(self):
+        """Test that every question in the file gets a JSONL result."""
+        with tempfile.TemporaryDirectory() as temp_dir, \
+             MockOpenAIServer(response_text="mock answer") as server:
+            questions = Path(temp_dir) / "questions.txt"
+            questions.write_text("one\ntwo\nthree\n")
+            config = {"api_base": server.url, "temperature": 1.0, "prompt_template": "{question}"}
+
+            with patch.dict(os.environ, {"OPENAI_API_KEY": "mock-key"}), \
+                 patch('gpt4shell.get_config', return_value=config), \
+                 patch('sys.stdout', new=io.StringIO()) as stdout:
+                result = main(['--batch', str(questions), '--concurrency', '2'])
+
+        records = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual(result, 0)
+        self.assertEqual([r["question"] for r in records], ["one", "two", "three"])
+        self.assertTrue(all(r["answer"] == "mock answer" for r in records))
+        self.assertEqual(len(server.requests), 3)
+
+    def test_unreadable_batch_file_is_reported(self):
+        """Test that a missing batch file is one error line and exit code 1."""
+        with tempfile.TemporaryDirectory() as temp_dir, \
+             patch('gpt4shell.get_config', return_value={"provider": "mock"}), \
+             patch('sys.stderr', new=io.StringIO()) as stderr:
+            missing = Path(temp_dir) / "missing.jsonl"
+            self.assertEqual(main(['--batch', str(missing)]), 1)
+
+        self.assertEqual(stderr.getvalue(), f"Error: cannot read {missing}: No such file or directory\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+"""
+Unit tests for gpt4shell.cache module.
+
+Tests cache keys, TTL expiry, LRU eviction, the `gpt cache` subcommand
+and how main() consults the cache.
+"""
+
+import io
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch, MagicMock
+
+from gpt4shell import main
+from gpt4shell.cache import ResponseCache, cache_command, cache_enabled, cache_key
+
+
+class TestCacheKey(unittest.TestCase):
+    """Test cache key derivation and the cache enable policy."""
+
+    def setUp(self):
+        self.config = {"provider": "openai", "model": "gpt-4", "temperature": 0, "max_tokens": None}
+
+    def test_same_request_gives_same_key(self):
+        """Test that identical requests hash to the same key."""
+        key1 = cache_key(self.config, "Q: {question}", {"question": "hi"})
+        key2 = cache_key(dict(self.config), "Q: {question}", {"question": "hi"})
+        self.assertEqual(key1, key2)
+
+    def test_key_depends_on_rendered_prompt_and_model(self):
+        """Test that the key changes with the prompt, question and model."""
+        base = cache_key(self.config, "Q: {question}", {"question": "hi"})
+        self.assertNotEqual(base, cache_key(self.config, "Q: {question}", {"question": "bye"}))
+        self.assertNotEqual(base, cache_key(self.config, "A: {question}", {"question": "hi"}))
+        self.assertNotEqual(base, cache_key(dict(self.config, model="gpt-3.5-turbo"),
+                                            "Q: {question}", {"question": "hi"}))
+
+    def test_key_depends_on_endpoint(self):
+        """Test that the same model served by another endpoint or routes never shares answers."""
+        base = cache_key(self.config, "Q: {question}", {"question": "hi"})
+        local_route = {"model": "gpt-4", "api_base": "http://localhost:8000/v1"}
+        local = cache_key(dict(self.config, api_base=local_route["api_base"]), "Q: {question}", {"question": "hi"})
+        routed = cache_key(dict(self.config, routes=["gpt-4", local_route]), "Q: {question}", {"question": "hi"})
+        self.assertEqual(len({base, local, routed}), 3)
+
+    def test_auto_mode_only_caches_deterministic_calls(self):
+        """Test that "auto" caches temperature 0 only."""
+        self.assertTrue(cache_enabled({"temperature": 0}))
+        self.assertFalse(cache_enabled({"temperature": 0.7}))
+        self.assertFalse(cache_enabled({}))
+
+    def test_explicit_mode_overrides_temperature(self):
+        """Test that true/false override the temperature rule."""
+        self.assertTrue(cache_enabled({"cache": True, "temperature": 1.0}))
+        self.assertFalse(cache_enabled({"cache": False, "temperature": 0}))
+
+
+class TestResponseCache(unittest.TestCase):
+    """Test on-disk cache storage, expiry and eviction."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.cache = ResponseCache(Path(self.temp_dir.name), ttl=60, max_bytes=10_000)
+
+    def test_get_returns_none_on_miss(self):
+        """Test that an unknown key is a miss."""
+        self.assertIsNone(self.cache.get("ab" * 32))
+
+    def test_set_then_get_round_trips(self):
+        """Test that a stored answer is returned."""
+        self.cache.set("ab" * 32, "cached answer")
+        self.assertEqual(self.cache.get("ab" * 32), "cached answer")
+
+    def test_expired_entry_is_a_miss(self):
+        """Test that entries older than the TTL are not served."""
+        self.cache.set("ab" * 32, "old answer")
+        with patch('gpt4shell.cache.time.time', return_value=time.time() + 120):
+            self.assertIsNone(self.cache.get("ab" * 32))
+
+    def test_eviction_removes_least_recently_used(self):
+        """Test that the least recently used entry goes first when over max_bytes."""
+        cache = ResponseCache(Path(self.temp_dir.name), ttl=60, max_bytes=250)
+        cache.set("aa" * 32, "x" * 100)
+        old = time.time() - 30
+        os.utime(cache._path("aa" * 32), (old, old))
+        cache.set("bb" * 32, "y" * 100)
+        cache.set("cc" * 32, "z" * 100)
+
+        self.assertIsNone(cache.get("aa" * 32))
+        self.assertEqual(cache.get("cc" * 32), "z" * 100)
+
+    def test_writes_under_the_bound_do_not_scan(self):
+        """Test that the directory is only scanned once the running total passes max_bytes."""
+        cache = ResponseCache(Path(self.temp_dir.name), ttl=60, max_bytes=400)
+        cache.set("aa" * 32, "x" * 100)
+        with patch.object(cache, 'evict', wraps=cache.evict) as mock_evict:
+            cache.set("bb" * 32, "y" * 100)
+            cache.set("bb" * 32, "y" * 100)
+            mock_evict.assert_not_called()
+            cache.set("cc" * 32, "z" * 100)
+            mock_evict.assert_called_once()
+
+        self.assertEqual(int(cache._size_path().read_text()), cache.stats()["bytes"])
+
+    def test_stats_and_clear(self):
+        """Test stats counts entries and clear removes them."""
+        self.cache.set("aa" * 32, "one")
+        self.cache.set("bb" * 32, "two")
+
+        self.assertEqual(self.cache.stats()["entries"], 2)
+        self.assertEqual(self.cache.clear(), 2)
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+
+class TestCacheInMain(unittest.TestCase):
+    """Test how main() and the `gpt cache` subcommand use the cache."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        config_path = Path(self.temp_dir.name) / ".gpt4shell" / "config.json"
+        patcher = patch('gpt4shell.cache.get_config_path', return_value=config_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.config = {"temperature": 0, "prompt_template": "Q: {question}"}
+
+    def _run(self, argv):
+        mock_chain = MagicMock()
+        mock_chain.invoke.return_value = "fresh answer"
+        mock_prompt = MagicMock()
+        temp_chain = MagicMock()
+        temp_chain.__or__ = MagicMock(return_value=mock_chain)
+        mock_prompt.__or__ = MagicMock(return_value=temp_chain)
+
+        with patch('gpt4shell.get_config', return_value=self.config), \
+             patch('gpt4shell.create_model') as mock_create_model, \
+             patch('gpt4shell.compile_prompt') as mock_compile_prompt, \
+             patch('gpt4shell.StrOutputParser'), \
+             patch('sys.stdout', new=io.StringIO()) as stdout:
+            mock_compile_prompt.return_value = mock_prompt
+            main(argv)
+        return mock_create_model, stdout.getvalue()
+
+    def test_second_deterministic_call_is_served_from_cache(self):
+        """Test that a repeated temperature 0 question skips the model."""
+        self._run(['What is 2+2?'])
+        mock_create_model, output = self._run(['What is 2+2?'])
+
+        mock_create_model.assert_not_called()
+        self.assertEqual(output, "fresh answer\n")
+
+    def test_no_cache_flag_bypasses_cache(self):
+        """Test that --no-cache always calls the model."""
+        self._run(['What is 2+2?'])
+        mock_create_model, _ = self._run(['--no-cache', 'What is 2+2?'])
+
+        mock_create_model.assert_called_once()
+
+    def test_cache_subcommand_stats_and_clear(self):
+        """Test `gpt cache stats` and `gpt cache clear`."""
+        self._run(['What is 2+2?'])
+
+        with patch('gpt4shell.cache.get_config', return_value=self.config), \
+             patch('builtins.print') as mock_print:
+            self.assertEqual(main(['cache', 'stats']), 0)
+            self.assertIn("Entries:   1", [c.args[0] for c in mock_print.call_args_list])
+            self.assertEqual(main(['cache', 'clear']), 0)
+            self.assertEqual(cache_command(['stats']), 0)
+            self.assertIn("Entries:   0", [c.args[0] for c in mock_print.call_args_list])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Unit tests for gpt4shell.client module.
+
+Tests answering through a reused chain with the mock provider: sync, async,
+streaming and batch calls, caching and sharing a Client between threads.
+"""
+
+import asyncio
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+
+import gpt4shell
+from gpt4shell import Client
+from gpt4shell.tokens import PromptTooLargeError
+
+
+def make_client(**config):
+    return Client({"provider": "mock", "cache": False, **config}, "{question}")
+
+
+class TestClient(unittest.TestCase):
+    """Test the Client methods."""
+
+    def test_chain_is_built_once(self):
+        """Test that repeated and concurrent calls reuse one chain."""
+        client = make_client()
+        with patch('gpt4shell._build_chain', wraps=gpt4shell._build_chain) as build_chain:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                answers = list(executor.map(client.ask, [f"question {i}" for i in range(16)]))
+
+        self.assertEqual(answers, [f"question {i}" for i in range(16)])
+        build_chain.assert_called_once()
+
+    def test_closed_client_rebuilds_its_chain(self):
+        """Test that close drops the chain and a later call builds a new one."""
+        client = make_client()
+        client.ask("first")
+        client.close()
+        with patch('gpt4shell._build_chain', wraps=gpt4shell._build_chain) as build_chain:
+            self.assertEqual(client.ask("second"), "second")
+
+        build_chain.assert_called_once()
+
+    def test_stream_yields_chunks(self):
+        """Test that streaming yields the answer piece by piece."""
+        chunks = list(make_client(mock_response="one two three").stream("count"))
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), "one two three")
+
+    def test_ask_async(self):
+        """Test answering from a coroutine."""
+        client = make_client()
+
+        async def ask_twice():
+            return await asyncio.gather(client.ask_async("first"), client.ask_async("second"))
+
+        self.assertEqual(asyncio.run(ask_twice()), ["first", "second"])
+        # A second event loop gets its own chain instead of reusing the first one's pool
+        self.assertEqual(asyncio.run(client.ask_async("third")), "third")
+
+    def test_batch_keeps_input_order(self):
+        """Test that batch answers come back in input order."""
+        questions = [f"question {i}" for i in range(10)]
+        self.assertEqual(make_client().batch(questions, concurrency=3), questions)
+
+    def test_batch_return_exceptions(self):
+        """Test that a failed question raises, or is returned in its place."""
+        client = make_client(context_window=20)
+        questions = ["short", "far too long " * 50]
+
+        with self.assertRaises(PromptTooLargeError):
+            client.batch(questions)
+        answers = client.batch(questions, return_exceptions=True)
+        self.assertEqual(answers[0], "short")
+        self.assertIsInstance(answers[1], PromptTooLargeError)
+
+    def test_cached_answer_skips_the_model(self):
+        """Test that a cached answer is returned without building the chain."""
+        with tempfile.TemporaryDirectory() as temp_dir, \
+             patch('gpt4shell.cache.get_config_path', return_value=Path(temp_dir) / "config.json"):
+            first = make_client(cache=True, mock_response="cached answer")
+            self.assertEqual(first.ask("question"), "cached answer")
+
+            second = make_client(cache=True, mock_response="cached answer")
+            with patch('gpt4shell._build_chain') as build_chain:
+                self.assertEqual(second.ask("question"), "cached answer")
+                self.assertEqual(list(second.stream("question")), ["cached answer"])
+        build_chain.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+"""
+Unit tests for gpt4shell.command module.
+
+Tests cleaning up generated commands, caching per shell and OS, debounced
+prefetching, confirmation before running and the shell integration.
+"""
+
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import gpt4shell
+from gpt4shell import main
+from gpt4shell.command import (command_mode, command_template, extract_command, generate_command,
+                               get_prefetch_path, prefetch, shell_init_command)
+from gpt4shell.settings import DEFAULT_CONFIG, validate_config
+
+
+class TestCommandText(unittest.TestCase):
+    """Test building prompts and cleaning up replies."""
+
+    def test_extract_command(self):
+        """Test that fences, shell prompts and chatter around a fenced block are removed."""
+        self.assertEqual(extract_command("ls -la\n"), "ls -la")
+        self.assertEqual(extract_command("`ls -la`"), "ls -la")
+        self.assertEqual(extract_command("Here you go:\n```bash\n$ du -sh *\n```\nThis sums sizes."), "du -sh *")
+
+    def test_template_fills_shell_and_os(self):
+        """Test that only {question} is left to fill."""
+        config = {"cmd_prompt_template": "One {shell} command on {os}: {question}"}
+        self.assertEqual(command_template(config, "fish", "Linux"), "One fish command on Linux: {question}")
+
+    def test_template_is_validated(self):
+        """Test that {shell} and {os} are accepted but other variables are not."""
+        self.assertEqual(validate_config({"cmd_prompt_template": "{shell} {os} {question}"}, "test"), [])
+        config = {"cmd_prompt_template": "{shell} {question} {distro}"}
+        warnings = validate_config(config, "test")
+        self.assertEqual(warnings, ["Warning: Ignoring cmd_prompt_template from test: "
+                                    "template uses unknown variables: {distro}; using the default"])
+        self.assertEqual(config["cmd_prompt_template"], DEFAULT_CONFIG["cmd_prompt_template"])
+
+
+class TestGenerateCommand(unittest.TestCase):
+    """Test generating, caching and prefetching commands."""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        for module in ('gpt4shell.cache', 'gpt4shell.command'):
+            patcher = patch(f'{module}.get_config_path', return_value=Path(temp_dir.name) / "config.json")
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.config = {"provider": "mock", "mock_response": "```sh\nfind . -mtime 0\n```", "temperature": 1.0}
+
+    def test_cached_per_request_shell_and_os(self):
+        """Test that a repeated request is answered from the cache, but not for another shell."""
+        with patch('gpt4shell._build_chain', wraps=gpt4shell._build_chain) as build_chain, \
+             patch('gpt4shell.command.detect_shell', return_value="bash"):
+            self.assertEqual(generate_command(self.config, "files changed  today"), "find . -mtime 0")
+            self.assertEqual(generate_command(self.config, "files changed today"), "find . -mtime 0")
+            self.assertEqual(build_chain.call_count, 1)
+            with patch('gpt4shell.command.detect_shell', return_value="fish"):
+                generate_command(self.config, "files changed today")
+            self.assertEqual(build_chain.call_count, 2)
+
+    def test_prefetch_fills_the_cache(self):
+        """Test that a prefetched request is answered without a model."""
+        self.assertEqual(prefetch(self.config, "files changed today", delay=0), 0)
+        with patch('gpt4shell._build_chain') as build_chain:
+            self.assertEqual(generate_command(self.config, "files changed today"), "find . -mtime 0")
+        build_chain.assert_not_called()
+
+    def test_superseded_prefetch_sends_nothing(self):
+        """Test that a prefetch gives up when a newer request was typed meanwhile."""
+        def keep_typing(delay):
+            get_prefetch_path().write_text("files changed today and")
+
+        with patch('gpt4shell.command.time.sleep', side_effect=keep_typing), \
+             patch('gpt4shell._build_chain') as build_chain:
+            self.assertEqual(prefetch(self.config, "files changed today"), 0)
+        build_chain.assert_not_called()
+
+    def test_run_after_confirmation(self):
+        """Test that --run only executes a confirmed command."""
+        with patch('gpt4shell.command.run_command', return_value=3) as run_command, \
+             patch('sys.stderr', new=io.StringIO()):
+            with patch('gpt4shell.command.confirm', return_value=False):
+                self.assertEqual(command_mode(self.config, "files changed today", run=True), 1)
+            run_command.assert_not_called()
+            with patch('gpt4shell.command.confirm', return_value=True):
+                self.assertEqual(command_mode(self.config, "files changed today", run=True), 3)
+            run_command.assert_called_once_with("find . -mtime 0")
+
+
+class TestCommandLine(unittest.TestCase):
+    """Test --cmd and `gpt shell-init`."""
+
+    def test_cmd_prints_the_command(self):
+        """Test that --cmd writes only the command."""
+        config = {"provider": "mock", "mock_response": "$ ls -S | head", "cache": False, "daemon": False}
+        with patch('gpt4shell.get_config', return_value=config), \
+             patch('sys.stdout', new=io.StringIO()) as stdout:
+            self.assertEqual(main(['--cmd', 'largest files']), 0)
+        self.assertEqual(stdout.getvalue(), "ls -S | head\n")
+
+    def test_cmd_rejects_a_named_prompt(self):
+        """Test that --prompt is refused with --cmd rather than silently ignored."""
+        config = {"provider": "mock", "prompts": {"short": "Briefly: {question}"}}
+        with patch('gpt4shell.get_config', return_value=config), \
+             patch('sys.stderr', new=io.StringIO()) as stderr, \
+             self.assertRaises(SystemExit):
+            main(['--cmd', '--prompt', 'short', 'largest files'])
+        self.assertIn("--prompt", stderr.getvalue())
+
+    def test_shell_init(self):
+        """Test that the integrations bind Ctrl-G and prefetch."""
+        for shell, binding in (("bash", "bind -x"), ("zsh", "bindkey '^G'")):
+            with patch('sys.stdout', new=io.StringIO()) as stdout:
+                self.assertEqual(shell_init_command([shell]), 0)
+            self.assertIn(binding, stdout.getvalue())
+            self.assertIn("gpt --cmd --prefetch", stdout.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
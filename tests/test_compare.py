@@ -0,0 +1,108 @@
+"""
+Unit tests for gpt4shell.compare module.
+
+Tests expanding --models, concurrent fan-out against the local stand-in
+server and the command-line output of a comparison.
+"""
+
+import io
+import json
+import os
+import time
+import unittest
+from unittest.mock import patch
+
+from benchmarks.mock_server import MockOpenAIServer
+from gpt4shell import create_model, main
+from gpt4shell.compare import compare_models, model_configs, summary_table
+from gpt4shell.transport import close_http_clients
+
+
+class TestModelConfigs(unittest.TestCase):
+    """Test expanding the --models list."""
+
+    def test_models_and_providers(self):
+        """Test plain model names, provider prefixes and names containing colons."""
+        config = {"provider": "openai", "model": "gpt-4", "routes": ["gpt-4o"], "temperature": 0}
+        configs = model_configs(config, "gpt-4o, mock:echo,llama3:8b,gpt-4o")
+
+        self.assertEqual([c["label"] for c in configs], ["gpt-4o", "mock:echo", "llama3:8b"])
+        self.assertEqual([(c["provider"], c["model"]) for c in configs],
+                         [("openai", "gpt-4o"), ("mock", "echo"), ("openai", "llama3:8b")])
+        self.assertTrue(all("routes" not in c and c["temperature"] == 0 for c in configs))
+
+    def test_empty_list_is_rejected(self):
+        """Test that an empty list is an error."""
+        with self.assertRaises(ValueError):
+            model_configs({}, " , ")
+
+
+class TestCompareModels(unittest.TestCase):
+    """Test asking several models at once."""
+
+    def tearDown(self):
+        close_http_clients()
+
+    def test_models_run_concurrently(self):
+        """Test that the comparison takes as long as the slowest model, not the sum."""
+        with MockOpenAIServer(response_text="same answer", latency=0.5) as server, \
+             patch.dict(os.environ, {"OPENAI_API_KEY": "test"}):
+            config = {"api_base": server.url, "max_retries": 0}
+            # Provider imports are a one-off cost that would blur the timing
+            create_model(config)
+            configs = model_configs(config, "gpt-4o,gpt-4o-mini,gpt-3.5-turbo")
+            started = time.perf_counter()
+            results = compare_models(configs, "{question}", "hi")
+            elapsed = time.perf_counter() - started
+
+        self.assertEqual([r["answer"] for r in results], ["same answer"] * 3)
+        self.assertEqual(sorted(body["model"] for body in server.requests),
+                         ["gpt-3.5-turbo", "gpt-4o", "gpt-4o-mini"])
+        self.assertTrue(all(r["latency_ms"] >= 500 for r in results))
+        # Run one after another, three models would take at least 1.5 seconds
+        self.assertLess(elapsed, 1.2)
+        self.assertTrue(all(r["cost"] > 0 for r in results))
+
+    def test_failures_are_reported_per_model(self):
+        """Test that one failing model does not stop the others."""
+        configs = model_configs({"provider": "nope", "mock_response": "fine"}, "mock:a,gpt-4o")
+        results = compare_models(configs, "{question}", "hi")
+
+        self.assertEqual(results[0]["answer"], "fine")
+        self.assertIsNone(results[0]["error"])
+        self.assertIn("Unsupported provider", results[1]["error"])
+        self.assertIn("failed", summary_table(results).splitlines()[2])
+
+
+class TestCompareCommandLine(unittest.TestCase):
+    """Test --models through main()."""
+
+    config = {"provider": "mock", "prompt_template": "Q: {question}", "cache": False, "daemon": False}
+
+    def test_raw_sections_and_summary(self):
+        """Test that every model gets a section followed by the summary table."""
+        with patch('gpt4shell.get_config', return_value=self.config), \
+             patch('sys.stdout', new=io.StringIO()) as stdout:
+            result = main(['--models', 'gpt-4o,gpt-4o-mini', 'hi'])
+
+        output = stdout.getvalue()
+        self.assertEqual(result, 0)
+        self.assertIn("=== gpt-4o ===\nQ: hi\n", output)
+        self.assertIn("=== gpt-4o-mini ===\nQ: hi\n", output)
+        self.assertIn("Model", output.splitlines()[-3])
+
+    def test_json_results(self):
+        """Test that --json writes every model's answer and measurements."""
+        with patch('gpt4shell.get_config', return_value=self.config), \
+             patch('sys.stdout', new=io.StringIO()) as stdout:
+            main(['--models', 'gpt-4o,gpt-4o-mini', '--json', 'hi'])
+
+        record = json.loads(stdout.getvalue())
+        self.assertEqual(record["question"], "hi")
+        self.assertEqual([r["model"] for r in record["results"]], ["gpt-4o", "gpt-4o-mini"])
+        self.assertEqual({r["answer"] for r in record["results"]}, {"Q: hi"})
+        self.assertGreater(record["results"][0]["cost"], record["results"][1]["cost"])
+
+
+if __name__ == '__main__':
+    unittest.main()
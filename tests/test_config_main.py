@@ -11,7 +11,7 @@ import tempfile
 import unittest
 from io import StringIO
 from pathlib import Path
-from unittest.mock import patch, MagicMock, call
+from unittest.mock import ANY, patch, MagicMock, call
 
 from gpt4shell import create_model, main
 from gpt4shell.settings import SUPPORTED_PROVIDERS
@@ -36,9 +36,13 @@ class TestCreateModel(unittest.TestCase):
             
             mock_openai.assert_called_once_with(
                 model="gpt-3.5-turbo",
-                temperature=1.0
+                temperature=1.0,
+                max_retries=0,
+                http_client=ANY,
+                http_async_client=ANY,
+                request_timeout=ANY
             )
-            self.assertEqual(result, mock_instance)
+            self.assertEqual(result.model, mock_instance)
 
     def test_create_model_with_openai_custom_config(self):
         """Test creating OpenAI model with custom configuration."""
@@ -60,9 +64,13 @@ class TestCreateModel(unittest.TestCase):
                 model="gpt-4",
                 temperature=0.7,
                 max_tokens=1000,
-                openai_api_base="https://custom.api.com"
+                openai_api_base="https://custom.api.com",
+                max_retries=0,
+                http_client=ANY,
+                http_async_client=ANY,
+                request_timeout=ANY
             )
-            self.assertEqual(result, mock_instance)
+            self.assertEqual(result.model, mock_instance)
 
     def test_create_model_with_openai_partial_config(self):
         """Test creating OpenAI model with partial configuration."""
@@ -83,9 +91,13 @@ class TestCreateModel(unittest.TestCase):
             mock_openai.assert_called_once_with(
                 model="gpt-4",
                 temperature=0.5,
-                max_tokens=500
+                max_tokens=500,
+                max_retries=0,
+                http_client=ANY,
+                http_async_client=ANY,
+                request_timeout=ANY
             )
-            self.assertEqual(result, mock_instance)
+            self.assertEqual(result.model, mock_instance)
 
     def test_create_model_with_unsupported_provider(self):
         """Test creating model with unsupported provider raises error."""
@@ -118,7 +130,7 @@ class TestCreateModel(unittest.TestCase):
             result = create_model(config)
             
             mock_openai.assert_called_once()
-            self.assertEqual(result, mock_instance)
+            self.assertEqual(result.model, mock_instance)
 
     def test_create_model_with_missing_provider_uses_default(self):
         """Test creating model with missing provider uses openai default."""
@@ -136,9 +148,13 @@ class TestCreateModel(unittest.TestCase):
             
             mock_openai.assert_called_once_with(
                 model="gpt-4",
-                temperature=0.7
+                temperature=0.7,
+                max_retries=0,
+                http_client=ANY,
+                http_async_client=ANY,
+                request_timeout=ANY
             )
-            self.assertEqual(result, mock_instance)
+            self.assertEqual(result.model, mock_instance)
 
 
 class TestMainFunction(unittest.TestCase):
@@ -192,11 +208,11 @@ class TestMainFunction(unittest.TestCase):
         
         with patch('gpt4shell.get_config', return_value=mock_config), \
              patch('gpt4shell.create_model', return_value=mock_model), \
-             patch('gpt4shell.ChatPromptTemplate') as mock_prompt_class, \
+             patch('gpt4shell.compile_prompt') as mock_compile_prompt, \
              patch('gpt4shell.StrOutputParser', return_value=mock_parser), \
-             patch('gpt4shell.rich.print') as mock_print:
+             patch('sys.stdout', new=StringIO()) as stdout:
             
-            mock_prompt_class.from_template.return_value = mock_prompt
+            mock_compile_prompt.return_value = mock_prompt
             
             # Mock the chain creation (prompt | model | parser)
             # Simulate the pipe operator chain
@@ -207,7 +223,7 @@ class TestMainFunction(unittest.TestCase):
             main()
             
             # Verify prompt template was created
-            mock_prompt_class.from_template.assert_called_once_with("Answer: {question}")
+            mock_compile_prompt.assert_called_once_with("Answer: {question}")
             
             # Verify chain was created properly
             mock_prompt.__or__.assert_called_once_with(mock_model)
@@ -217,7 +233,7 @@ class TestMainFunction(unittest.TestCase):
             mock_chain.invoke.assert_called_once_with({"question": "What is Python?"})
             
             # Verify answer was printed
-            mock_print.assert_called_once_with("Python is a programming language.")
+            self.assertEqual(stdout.getvalue(), "Python is a programming language.\n")
 
     def test_main_with_custom_prompt_template(self):
         """Test main function uses custom prompt template from config."""
@@ -238,11 +254,11 @@ class TestMainFunction(unittest.TestCase):
         
         with patch('gpt4shell.get_config', return_value=mock_config), \
              patch('gpt4shell.create_model', return_value=mock_model), \
-             patch('gpt4shell.ChatPromptTemplate') as mock_prompt_class, \
+             patch('gpt4shell.compile_prompt') as mock_compile_prompt, \
              patch('gpt4shell.StrOutputParser', return_value=mock_parser), \
-             patch('gpt4shell.rich.print'):
+             patch('sys.stdout', new=StringIO()):
             
-            mock_prompt_class.from_template.return_value = mock_prompt
+            mock_compile_prompt.return_value = mock_prompt
             
             # Mock the chain creation
             temp_chain1 = MagicMock()
@@ -251,7 +267,7 @@ class TestMainFunction(unittest.TestCase):
             
             main()
             
-            mock_prompt_class.from_template.assert_called_once_with(custom_template)
+            mock_compile_prompt.assert_called_once_with(custom_template)
 
     def test_main_uses_default_prompt_template_when_missing(self):
         """Test main function uses default prompt template when not in config."""
@@ -273,11 +289,11 @@ class TestMainFunction(unittest.TestCase):
         
         with patch('gpt4shell.get_config', return_value=mock_config), \
              patch('gpt4shell.create_model', return_value=mock_model), \
-             patch('gpt4shell.ChatPromptTemplate') as mock_prompt_class, \
+             patch('gpt4shell.compile_prompt') as mock_compile_prompt, \
              patch('gpt4shell.StrOutputParser', return_value=mock_parser), \
-             patch('gpt4shell.rich.print'):
+             patch('sys.stdout', new=StringIO()):
             
-            mock_prompt_class.from_template.return_value = mock_prompt
+            mock_compile_prompt.return_value = mock_prompt
             
             # Mock the chain creation
             temp_chain1 = MagicMock()
@@ -286,7 +302,7 @@ class TestMainFunction(unittest.TestCase):
             
             main()
             
-            mock_prompt_class.from_template.assert_called_once_with(expected_default)
+            mock_compile_prompt.assert_called_once_with(expected_default)
 
 
 class TestArgumentParsing(unittest.TestCase):
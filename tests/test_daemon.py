@@ -0,0 +1,180 @@
+"""
+Unit tests for gpt4shell.daemon module.
+
+Runs a daemon on a temporary Unix socket backed by the local stand-in
+server and checks that the CLI forwards to it and falls back without it.
+"""
+
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from benchmarks.mock_server import MockOpenAIServer
+from gpt4shell import main
+from gpt4shell.daemon import DaemonError, DaemonServer, ask, is_running, serve_command
+from gpt4shell.singleflight import Lease
+
+
+class TestDaemon(unittest.TestCase):
+    """Test the daemon server and its client."""
+
+    def setUp(self):
+        temp_dir = tempfile.mkdtemp(dir="/tmp")
+        self.addCleanup(lambda: os.path.isdir(temp_dir) and os.rmdir(temp_dir))
+        self.socket_path = Path(temp_dir) / "daemon.sock"
+
+        home = tempfile.TemporaryDirectory()
+        self.addCleanup(home.cleanup)
+        for module in ("cache", "singleflight", "usage", "policy"):
+            patcher = patch(f'gpt4shell.{module}.get_config_path', return_value=Path(home.name) / "config.json")
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        env = patch.dict(os.environ, {"OPENAI_API_KEY": "mock-key"})
+        env.start()
+        self.addCleanup(env.stop)
+
+        self.mock_server = MockOpenAIServer(response_text="daemon answer").start()
+        self.addCleanup(self.mock_server.stop)
+        self.config = {"api_base": self.mock_server.url, "temperature": 1.0,
+                       "prompt_template": "{question}", "daemon": True}
+
+    def _start_daemon(self):
+        server = DaemonServer(self.socket_path)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            thread.join(timeout=5)
+        self.addCleanup(stop)
+        return server
+
+    def test_ask_returns_none_without_daemon(self):
+        """Test that the client reports no daemon so callers can fall back."""
+        self.assertIsNone(ask("hi", self.config, socket_path=self.socket_path))
+        self.assertFalse(is_running(self.socket_path))
+
+    def test_ask_through_daemon(self):
+        """Test that a question is answered by the daemon."""
+        self._start_daemon()
+
+        self.assertTrue(is_running(self.socket_path))
+        self.assertEqual(ask("hi", self.config, socket_path=self.socket_path), "daemon answer")
+
+    def test_client_is_reused_across_requests(self):
+        """Test that the daemon builds one Client per distinct configuration."""
+        server = self._start_daemon()
+        ask("one", self.config, socket_path=self.socket_path)
+        ask("two", self.config, socket_path=self.socket_path)
+
+        self.assertEqual(len(server._clients), 1)
+        self.assertEqual(len(self.mock_server.requests), 2)
+
+    def test_least_recently_used_clients_are_evicted(self):
+        """Test that only the newest MAX_CLIENTS configurations keep a Client, and evicted ones are closed."""
+        server = self._start_daemon()
+        with patch('gpt4shell.daemon.MAX_CLIENTS', 2), \
+             patch('gpt4shell.client.Client.close', autospec=True) as mock_close:
+            first = server.client_for(self.config, use_cache=True)
+            server.client_for(dict(self.config, temperature=0.5), use_cache=True)
+            server.client_for(self.config, use_cache=True)
+            server.client_for(dict(self.config, temperature=0.2), use_cache=True)
+
+        self.assertEqual(len(server._clients), 2)
+        self.assertIs(server.client_for(self.config, use_cache=True), first)
+        self.assertEqual(mock_close.call_count, 1)
+        self.assertEqual(mock_close.call_args[0][0].config["temperature"], 0.5)
+
+    def test_streaming_chunks_are_forwarded(self):
+        """Test that streamed chunks reach the client callback."""
+        self._start_daemon()
+        chunks = []
+
+        answer = ask("hi", self.config, stream=True, on_chunk=chunks.append, socket_path=self.socket_path)
+
+        self.assertEqual(answer, "daemon answer")
+        self.assertEqual("".join(chunks), "daemon answer")
+        self.assertGreater(len(chunks), 1)
+
+    def test_errors_are_reported_to_client(self):
+        """Test that a failing request raises DaemonError on the client."""
+        self._start_daemon()
+
+        with self.assertRaises(DaemonError) as context:
+            ask("hi", dict(self.config, provider="nope"), socket_path=self.socket_path)
+        self.assertIn("Unsupported provider", str(context.exception))
+
+    def test_main_forwards_to_running_daemon(self):
+        """Test that main() answers through the daemon's warm chain."""
+        server = self._start_daemon()
+
+        with patch('gpt4shell.get_config', return_value=self.config), \
+             patch('gpt4shell.daemon.get_socket_path', return_value=self.socket_path), \
+             patch('gpt4shell.stream_answer') as mock_stream_answer, \
+             patch('sys.stdout', new=io.StringIO()) as stdout:
+            main(['hi'])
+
+        mock_stream_answer.assert_not_called()
+        self.assertEqual(stdout.getvalue(), "daemon answer\n")
+        self.assertEqual(len(server._clients), 1)
+
+    def test_main_renders_forwarded_streams_in_rich_mode(self):
+        """Test that a streamed answer from the daemon is rendered like an in-process one."""
+        self._start_daemon()
+        config = dict(self.config, stream=True, output="rich")
+
+        with patch('gpt4shell.get_config', return_value=config), \
+             patch('gpt4shell.daemon.get_socket_path', return_value=self.socket_path), \
+             patch('gpt4shell.stream_answer', side_effect=lambda source, question: "".join(source.stream(question))) \
+                as mock_stream_answer, \
+             patch('sys.stdout', new=io.StringIO()) as stdout:
+            main(['hi'])
+
+        mock_stream_answer.assert_called_once()
+        self.assertEqual(stdout.getvalue(), "")
+
+    def test_cache_hits_and_single_flight_match_the_in_process_path(self):
+        """Test that forwarded questions are cached, coalesced and counted like in-process ones."""
+        self._start_daemon()
+        config = dict(self.config, temperature=0)
+
+        with patch('gpt4shell.client.record_cache_hit') as mock_record_cache_hit, \
+             patch('gpt4shell.client.SingleFlight.join', autospec=True,
+                   side_effect=lambda flights, key: (None, Lease(None, None))) as mock_join:
+            ask("hi", config, socket_path=self.socket_path)
+            self.assertEqual(ask("hi", config, stream=True, socket_path=self.socket_path), "daemon answer")
+
+        mock_join.assert_called_once()
+        mock_record_cache_hit.assert_called_once_with(config)
+        self.assertEqual(len(self.mock_server.requests), 1)
+
+    def test_socket_is_private_and_bad_requests_get_an_error(self):
+        """Test that only the owner can connect and that malformed lines are answered, not dropped."""
+        self._start_daemon()
+        self.assertEqual(self.socket_path.stat().st_mode & 0o077, 0)
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(self.socket_path))
+            sock.sendall(b"not json\n")
+            response = json.loads(sock.makefile("rb").readline())
+        self.assertIn("Invalid request", response["error"])
+        self.assertTrue(is_running(self.socket_path))
+
+    def test_serve_command_status_and_stop(self):
+        """Test `gpt serve --status` and `gpt serve --stop`."""
+        with patch('sys.stdout', new=io.StringIO()):
+            self.assertEqual(serve_command(['--status', '--socket', str(self.socket_path)]), 1)
+            self._start_daemon()
+            self.assertEqual(serve_command(['--status', '--socket', str(self.socket_path)]), 0)
+            self.assertEqual(serve_command(['--stop', '--socket', str(self.socket_path)]), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,14 @@
 """Integration tests for gpt4shell CLI."""
 
+import json
 import subprocess
 import sys
+
+import httpx
 import pytest
 
+from benchmarks.mock_server import MockOpenAIServer
+
 
 class TestCLIIntegration:
     """Integration test cases for the CLI interface."""
@@ -49,6 +54,58 @@ class TestCLIIntegration:
         assert result.returncode == 1
         assert "openai_api_key" in result.stderr.lower()
 
+    def test_import_does_not_load_provider_stack(self):
+        """Test that importing gpt4shell defers asyncio, LangChain, OpenAI and rich imports."""
+        result = subprocess.run(
+            [sys.executable, "-c",
+             "import sys, gpt4shell; "
+             "print(sorted(m for m in ('asyncio', 'langchain_core', 'langchain_openai', 'openai', 'rich') "
+             "if m in sys.modules))"],
+            capture_output=True,
+            text=True,
+            cwd="."
+        )
+
+        assert result.returncode == 0
+        assert result.stdout.strip() == "[]"
+
+    def test_startup_benchmark_reports_no_heavy_imports(self):
+        """Test that the startup benchmark runs and finds no heavy imports."""
+        result = subprocess.run(
+            [sys.executable, "benchmarks/startup.py", "--runs", "1"],
+            capture_output=True,
+            text=True,
+            cwd="."
+        )
+
+        assert result.returncode == 0
+        assert '"heavy_modules_imported": []' in result.stdout
+
+    def test_benchmark_suite_reports_every_metric(self):
+        """Test that the benchmark suite measures both the CLI and the Python API."""
+        result = subprocess.run(
+            [sys.executable, "benchmarks/suite.py", "--runs", "1", "--requests", "4"],
+            capture_output=True,
+            text=True,
+            cwd="."
+        )
+
+        assert result.returncode == 0, result.stderr
+        results = json.loads(result.stdout)
+        for section in ("cli", "api"):
+            for metric in ("cold_start", "time_to_first_token", "end_to_end"):
+                assert results[section][metric]["median_ms"] > 0
+            assert results[section]["batch_throughput_rps"] > 0
+        assert results["server"]["errors"] == 0
+
+    def test_mock_server_simulates_errors(self):
+        """Test that the stand-in server fails the configured share of requests."""
+        with MockOpenAIServer(error_rate=1.0) as server:
+            response = httpx.post(f"{server.url}/chat/completions", json={"messages": []})
+
+        assert response.status_code == 500
+        assert server.errors == 1
+
     def test_poetry_run_help(self):
         """Test that poetry run gpt --help works."""
         result = subprocess.run(
@@ -1,7 +1,7 @@
 """Tests for the main gpt4shell functionality."""
 
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import ANY, patch, MagicMock
 import sys
 from io import StringIO
 
@@ -12,9 +12,9 @@ class TestMain:
     """Test cases for the main function."""
 
     @patch('gpt4shell.ChatOpenAI')
-    @patch('gpt4shell.rich.print')
+    @patch('sys.stdout', new_callable=StringIO)
     @patch('sys.argv', ['gpt', 'What is Python?'])
-    def test_main_successful_execution(self, mock_rich_print, mock_chat_openai):
+    def test_main_successful_execution(self, mock_stdout, mock_chat_openai):
         """Test successful execution of main function with mocked OpenAI."""
         # Setup mocks
         mock_model = MagicMock()
@@ -24,11 +24,11 @@ class TestMain:
         expected_response = "Python is a programming language."
         
         # Patch the chain creation (prompt | model | parser)
-        with patch('gpt4shell.ChatPromptTemplate') as mock_prompt_template, \
+        with patch('gpt4shell.compile_prompt') as mock_compile_prompt, \
              patch('gpt4shell.StrOutputParser') as mock_output_parser:
             
             mock_prompt = MagicMock()
-            mock_prompt_template.from_template.return_value = mock_prompt
+            mock_compile_prompt.return_value = mock_prompt
             mock_parser = MagicMock()
             mock_output_parser.return_value = mock_parser
             
@@ -45,12 +45,14 @@ class TestMain:
             main()
             
             # Verify interactions
-            mock_chat_openai.assert_called_once_with(model="gpt-3.5-turbo", temperature=1.0)
-            mock_prompt_template.from_template.assert_called_once_with(
+            mock_chat_openai.assert_called_once_with(model="gpt-3.5-turbo", temperature=1.0,
+                                                     max_retries=0, http_client=ANY,
+                                                     http_async_client=ANY, request_timeout=ANY)
+            mock_compile_prompt.assert_called_once_with(
                 "Answer the question from the user in simple terms:\n{question}"
             )
             mock_final_chain.invoke.assert_called_once_with({"question": "What is Python?"})
-            mock_rich_print.assert_called_once_with(expected_response)
+            assert mock_stdout.getvalue() == expected_response + "\n"
 
     @patch('sys.argv', ['gpt', '--help'])
     def test_help_argument(self):
@@ -86,9 +88,9 @@ class TestMain:
             main()
 
     @patch('gpt4shell.ChatOpenAI')
-    @patch('gpt4shell.rich.print')
+    @patch('sys.stdout', new_callable=StringIO)
     @patch('sys.argv', ['gpt', 'Hello world'])
-    def test_main_with_different_question(self, mock_rich_print, mock_chat_openai):
+    def test_main_with_different_question(self, mock_stdout, mock_chat_openai):
         """Test main function with a different question to ensure argument parsing works."""
         # Setup mocks
         mock_model = MagicMock()
@@ -98,11 +100,11 @@ class TestMain:
         expected_response = "Hello! How can I help you?"
         
         # Patch the chain creation
-        with patch('gpt4shell.ChatPromptTemplate') as mock_prompt_template, \
+        with patch('gpt4shell.compile_prompt') as mock_compile_prompt, \
              patch('gpt4shell.StrOutputParser') as mock_output_parser:
             
             mock_prompt = MagicMock()
-            mock_prompt_template.from_template.return_value = mock_prompt
+            mock_compile_prompt.return_value = mock_prompt
             mock_parser = MagicMock()
             mock_output_parser.return_value = mock_parser
             
@@ -120,12 +122,12 @@ class TestMain:
             
             # Verify the question was passed correctly
             mock_final_chain.invoke.assert_called_once_with({"question": "Hello world"})
-            mock_rich_print.assert_called_once_with(expected_response)
+            assert mock_stdout.getvalue() == expected_response + "\n"
 
     @patch('gpt4shell.ChatOpenAI')
-    @patch('gpt4shell.rich.print')
+    @patch('sys.stdout', new_callable=StringIO)
     @patch('sys.argv', ['gpt', 'What is the meaning of life?'])
-    def test_chain_components_creation(self, mock_rich_print, mock_chat_openai):
+    def test_chain_components_creation(self, mock_stdout, mock_chat_openai):
         """Test that all chain components are created correctly."""
         # Setup mocks
         mock_model = MagicMock()
@@ -134,27 +136,30 @@ class TestMain:
         mock_chain = MagicMock()
         mock_chain.invoke.return_value = "42"
         
-        with patch('gpt4shell.ChatPromptTemplate') as mock_prompt_template, \
+        with patch('gpt4shell.compile_prompt') as mock_compile_prompt, \
              patch('gpt4shell.StrOutputParser') as mock_output_parser:
             
             mock_prompt = MagicMock()
-            mock_prompt_template.from_template.return_value = mock_prompt
+            mock_compile_prompt.return_value = mock_prompt
             mock_parser = MagicMock()
             mock_output_parser.return_value = mock_parser
             
             # Mock the pipe operator behavior
             mock_prompt.__or__ = MagicMock(return_value=mock_chain)
             mock_model.__or__ = MagicMock(return_value=mock_chain)
+            mock_chain.__or__ = MagicMock(return_value=mock_chain)
             
             # Execute main
             main()
             
             # Verify all components were created
-            mock_chat_openai.assert_called_once_with(model="gpt-3.5-turbo", temperature=1.0)
-            mock_prompt_template.from_template.assert_called_once()
+            mock_chat_openai.assert_called_once_with(model="gpt-3.5-turbo", temperature=1.0,
+                                                     max_retries=0, http_client=ANY,
+                                                     http_async_client=ANY, request_timeout=ANY)
+            mock_compile_prompt.assert_called_once()
             mock_output_parser.assert_called_once()
             
             # Verify the prompt template is correct
-            template_call = mock_prompt_template.from_template.call_args[0][0]
+            template_call = mock_compile_prompt.call_args[0][0]
             assert "Answer the question from the user in simple terms:" in template_call
             assert "{question}" in template_call
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""
+Unit tests for gpt4shell.output module.
+
+Tests splitting Markdown into blocks, choosing the output mode and the raw
+and JSON output of the command line.
+"""
+
+import io
+import json
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+from gpt4shell import main
+from gpt4shell.output import MarkdownBlocks, markdown_blocks, output_mode, show_answer
+
+
+class TestMarkdownBlocks(unittest.TestCase):
+    """Test splitting Markdown into top-level blocks."""
+
+    def test_paragraphs(self):
+        """Test that blank lines separate paragraphs."""
+        self.assertEqual(markdown_blocks("one\ntwo\n\nthree\n"), ["one\ntwo", "three"])
+
+    def test_fenced_code_keeps_blank_lines(self):
+        """Test that a code block is one block even with blank lines inside."""
+        text = "Run:\n```python\nimport os\n\nprint(os.listdir())\n```\nDone."
+        self.assertEqual(markdown_blocks(text),
+                         ["Run:", "```python\nimport os\n\nprint(os.listdir())\n```", "Done."])
+
+    def test_longer_fence_is_not_closed_by_a_shorter_one(self):
+        """Test that a four-backtick block showing a ``` fence ends only at its own fence."""
+        code = "````markdown\nExample:\n\n```sh\nls\n```\n\nMore text.\n````"
+        self.assertEqual(markdown_blocks(code + "\nDone."), [code, "Done."])
+        self.assertEqual(markdown_blocks("~~~\n```\n~~~\nDone."), ["~~~\n```\n~~~", "Done."])
+
+    def test_indented_lines_continue_a_block(self):
+        """Test that a multi-paragraph list item stays in one block."""
+        text = "- first\n\n  more about first\n- second\n\nAfter."
+        self.assertEqual(markdown_blocks(text), ["- first\n\n  more about first\n- second", "After."])
+
+    def test_streamed_chunks(self):
+        """Test that blocks are returned as soon as they are complete, whatever the chunking."""
+        text = "Intro line.\n\n```sh\nls -la\n```\n\nLast line."
+        blocks = MarkdownBlocks()
+        done = []
+        for i in range(0, len(text), 3):
+            done.extend(blocks.feed(text[i:i + 3]))
+        self.assertEqual(done, ["Intro line.", "```sh\nls -la\n```"])
+        self.assertEqual(blocks.pending(), "Last line.")
+        self.assertEqual(blocks.close(), ["Last line."])
+
+
+class TestOutputMode(unittest.TestCase):
+    """Test choosing between rich, raw and JSON output."""
+
+    def test_auto_follows_the_terminal(self):
+        """Test that "auto" renders on a terminal and writes raw text to a pipe."""
+        tty = MagicMock(isatty=MagicMock(return_value=True))
+        self.assertEqual(output_mode({}, stream=tty), "rich")
+        self.assertEqual(output_mode({"output": "auto"}, stream=io.StringIO()), "raw")
+
+    def test_setting_and_flags(self):
+        """Test that the setting overrides auto-detection and the flags override the setting."""
+        self.assertEqual(output_mode({"output": "rich"}, stream=io.StringIO()), "rich")
+        self.assertEqual(output_mode({"output": "rich"}, raw=True), "raw")
+        self.assertEqual(output_mode({"output": "raw"}, json_output=True), "json")
+
+    def test_rich_answer_is_printed_block_by_block(self):
+        """Test that a rich answer is rendered one Markdown block at a time."""
+        console = MagicMock()
+        with patch('gpt4shell.rich.get_console', return_value=console):
+            show_answer("one\n\ntwo", "rich")
+
+        markdown = [call[0][0] for call in console.print.call_args_list if call[0]]
+        self.assertEqual([block.markup for block in markdown], ["one", "two"])
+
+
+class TestOutputCommandLine(unittest.TestCase):
+    """Test --raw and --json through main()."""
+
+    config = {"provider": "mock", "mock_response": "**bold** answer", "prompt_template": "{question}",
+              "cache": False, "daemon": False, "stream": False}
+
+    def test_json_output(self):
+        """Test that --json writes one JSON object."""
+        with patch('gpt4shell.get_config', return_value=self.config), \
+             patch('sys.stdout', new=io.StringIO()) as stdout:
+            main(['--json', 'hi'])
+
+        self.assertEqual(json.loads(stdout.getvalue()),
+                         {"question": "hi", "answer": "**bold** answer", "model": "gpt-3.5-turbo"})
+
+    def test_raw_output_does_not_import_rich(self):
+        """Test that --raw writes the answer verbatim without loading rich."""
+        config = dict(self.config, output="rich", stream=True)
+        with patch('gpt4shell.get_config', return_value=config), \
+             patch.dict(sys.modules, {"rich": None}), \
+             patch('sys.stdout', new=io.StringIO()) as stdout:
+            main(['--raw', 'hi'])
+
+        self.assertEqual(stdout.getvalue(), "**bold** answer\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
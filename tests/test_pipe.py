@@ -0,0 +1,200 @@
+"""
+Unit tests for gpt4shell.pipe module.
+
+Tests stdin detection, chunking, map-reduce folding and piping into the
+command line against the local stand-in server.
+"""
+
+import asyncio
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from benchmarks.mock_server import MockOpenAIServer
+from gpt4shell import main
+from gpt4shell.pipe import PipeError, amap_reduce, iter_chunks, split_first, stdin_is_piped
+
+
+class TestStdinDetection(unittest.TestCase):
+    """Test which standard inputs count as piped."""
+
+    def test_stream_without_descriptor_is_not_piped(self):
+        """Test that in-memory streams (e.g. a test runner's stdin) are ignored."""
+        self.assertFalse(stdin_is_piped(io.StringIO("text")))
+
+    def test_pipe_and_file_are_piped(self):
+        """Test that pipes and redirected files are detected."""
+        read_fd, write_fd = os.pipe()
+        with os.fdopen(read_fd) as reader, os.fdopen(write_fd, "w"):
+            self.assertTrue(stdin_is_piped(reader))
+        with tempfile.TemporaryFile("w+") as redirected:
+            self.assertTrue(stdin_is_piped(redirected))
+
+    def test_dev_null_is_not_piped(self):
+        """Test that `gpt ... < /dev/null` behaves like a terminal."""
+        with open(os.devnull) as null:
+            self.assertFalse(stdin_is_piped(null))
+
+
+class TestChunking(unittest.TestCase):
+    """Test splitting input by token budget."""
+
+    def test_chunks_end_on_line_boundaries(self):
+        """Test that lines are grouped up to the budget and nothing is lost."""
+        text = "aaaa\nbbbb\ncccc\ndddd\n"
+        chunks = list(iter_chunks(io.StringIO(text), 10, len))
+
+        self.assertEqual(chunks, ["aaaa\nbbbb\n", "cccc\ndddd\n"])
+        self.assertEqual("".join(chunks), text)
+
+    def test_long_lines_are_read_in_pieces(self):
+        """Test that a line longer than the budget is split rather than held whole."""
+        chunks = list(iter_chunks(io.StringIO("x" * 25), 10, len))
+        self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 5])
+
+    def test_split_first(self):
+        """Test telling empty, single-chunk and multi-chunk input apart."""
+        self.assertEqual(split_first(iter([])), ("", None))
+        self.assertEqual(split_first(iter(["only"])), ("only", None))
+
+        single, chunks = split_first(iter(["a", "b", "c"]))
+        self.assertIsNone(single)
+        self.assertEqual(list(chunks), ["a", "b", "c"])
+
+
+class TestMapReduce(unittest.TestCase):
+    """Test summarising chunks into a final question."""
+
+    def test_notes_are_collected_in_order(self):
+        """Test that every chunk is mapped and its notes kept in input order."""
+        async def ask(question):
+            await asyncio.sleep(0.02 if "first" in question else 0)
+            return "note " + question.split("<input>\n")[1].split("\n")[0]
+
+        final = asyncio.run(amap_reduce(ask, "find errors", iter(["first", "second"]), 1000, len))
+
+        self.assertIn("Part 1:\nnote first\n\nPart 2:\nnote second", final)
+        self.assertTrue(final.endswith("find errors"))
+
+    def test_notes_over_budget_are_merged(self):
+        """Test that notes are folded together once they outgrow the budget."""
+        questions = []
+
+        async def ask(question):
+            questions.append(question)
+            return "merged" if question.startswith("Below are notes") else "n" * 20
+
+        final = asyncio.run(amap_reduce(ask, "task", iter(["a", "b", "c", "d"]), 70, len))
+
+        self.assertEqual(sum(q.startswith("Below are notes") for q in questions), 1)
+        self.assertIn("merged\n\nPart 3:", final)
+
+    def test_failed_part_raises(self):
+        """Test that a failed map request aborts with the part number."""
+        async def ask(question):
+            if "part 2" in question:
+                raise RuntimeError("boom")
+            return "ok"
+
+        with self.assertRaises(PipeError) as context:
+            asyncio.run(amap_reduce(ask, "task", iter(["a", "b"]), 1000, len))
+        self.assertIn("Part 2", str(context.exception))
+
+    def test_failed_merge_raises(self):
+        """Test that a failed request merging the notes aborts like a failed part."""
+        async def ask(question):
+            if question.startswith("Below are notes"):
+                raise ConnectionError("connection refused")
+            return "n" * 20
+
+        with self.assertRaises(PipeError) as context:
+            asyncio.run(amap_reduce(ask, "task", iter(["a", "b", "c", "d"]), 70, len))
+        self.assertIn("ConnectionError: connection refused", str(context.exception))
+
+
+class TestPipedCommandLine(unittest.TestCase):
+    """Test `cat file | gpt "..."` against the stand-in server."""
+
+    def run_main(self, text, config, argv):
+        with patch.dict(os.environ, {"OPENAI_API_KEY": "mock-key"}), \
+             patch('gpt4shell.get_config', return_value=config), \
+             patch('gpt4shell.stdin_is_piped', return_value=True), \
+             patch('gpt4shell.pipe.open_stdin', return_value=io.StringIO(text)), \
+             patch('sys.stdout', new=io.StringIO()) as stdout:
+            result = main(argv)
+        return result, stdout.getvalue()
+
+    def test_small_input_is_attached_to_the_question(self):
+        """Test that input fitting one chunk is sent in a single request."""
+        with MockOpenAIServer(response_text="summary") as server:
+            config = {"api_base": server.url, "prompt_template": "{question}"}
+            result, output = self.run_main("line one\nline two\n", config, ["--stdin", "summarise"])
+
+        self.assertIsNone(result)
+        self.assertEqual(len(server.requests), 1)
+        content = server.requests[0]["messages"][-1]["content"]
+        self.assertEqual(content, "summarise\n\n<input>\nline one\nline two\n</input>")
+        self.assertEqual(output, "summary\n")
+
+    def test_large_input_is_map_reduced(self):
+        """Test that each chunk gets a map request before the final answer."""
+        text = "".join(f"log line {i:03d}\n" for i in range(40))
+        with MockOpenAIServer(response_text="notes") as server:
+            config = {"api_base": server.url, "prompt_template": "{question}", "chunk_tokens": 40}
+            result, output = self.run_main(text, config, ["--stdin", "summarise errors"])
+
+        contents = [request["messages"][-1]["content"] for request in server.requests]
+        map_requests = [c for c in contents if c.startswith("The text below is part")]
+        self.assertIsNone(result)
+        self.assertGreater(len(map_requests), 1)
+        self.assertEqual(len(contents), len(map_requests) + 1)
+        self.assertTrue(contents[-1].endswith("summarise errors"))
+        self.assertEqual(output, "notes\n")
+
+    def test_dry_run_reports_chunks_without_sending(self):
+        """Test that --dry-run counts map requests instead of making them."""
+        text = "".join(f"log line {i:03d}\n" for i in range(40))
+        config = {"prompt_template": "{question}", "chunk_tokens": 40}
+        with patch('gpt4shell.create_model') as mock_create_model:
+            result, output = self.run_main(text, config, ["--stdin", "--dry-run", "summarise errors"])
+
+        self.assertEqual(result, 0)
+        self.assertIn("Piped input:", output)
+        mock_create_model.assert_not_called()
+
+    def test_stdin_is_left_alone_when_a_question_is_given(self):
+        """Test that piped stdin is only attached with --stdin, and that ignoring it is reported."""
+        with MockOpenAIServer(response_text="answer") as server, \
+             patch('sys.stderr', new=io.StringIO()) as stderr:
+            config = {"api_base": server.url, "prompt_template": "{question}", "cache": False, "daemon": False}
+            self.run_main("other input\n", config, ["explain alpha"])
+
+        self.assertEqual(server.requests[0]["messages"][-1]["content"], "explain alpha")
+        self.assertIn("use --stdin", stderr.getvalue())
+
+    def test_stdin_is_the_question_without_one(self):
+        """Test that `echo question | gpt` asks what was piped in."""
+        with MockOpenAIServer(response_text="answer") as server:
+            config = {"api_base": server.url, "prompt_template": "{question}", "cache": False, "daemon": False}
+            self.run_main("what is a monad?\n", config, [])
+
+        self.assertEqual(server.requests[0]["messages"][-1]["content"], "what is a monad?")
+
+    def test_while_read_loop_asks_every_line(self):
+        """Test that gpt inside `while read` does not swallow the loop's remaining input."""
+        with tempfile.TemporaryDirectory() as home:
+            env = dict(os.environ, HOME=home, GPT4SHELL_PROVIDER="mock", GPT4SHELL_DAEMON="false",
+                       GPT4SHELL_PROMPT_TEMPLATE="{question}")
+            script = (f"printf 'alpha\\nbeta\\ngamma\\n' | "
+                      f"while read l; do {sys.executable} -m gpt4shell --raw \"explain $l\"; done")
+            result = subprocess.run(["sh", "-c", script], env=env, capture_output=True, text=True, timeout=60)
+
+        self.assertEqual(result.stdout.splitlines(), ["explain alpha", "explain beta", "explain gamma"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,249 @@
+"""
+Unit tests for gpt4shell.policy module.
+
+Tests retries, the retry budget, request deadlines and the persisted
+circuit breaker against the local fault-injecting stand-in server.
+"""
+
+import asyncio
+import io
+import multiprocessing
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from benchmarks.mock_server import MockOpenAIServer
+from gpt4shell import Client, create_model, main
+from gpt4shell.policy import (CircuitBreaker, CircuitOpenError, DeadlineExceededError, RetryBudget,
+                              endpoint_name, get_circuits_path, is_outage)
+from gpt4shell.transport import close_http_clients
+
+
+def ask(config, results):
+    try:
+        results.put(create_model(config).invoke("hi").content)
+    except Exception as e:
+        results.put(type(e).__name__)
+
+
+class TestPolicy(unittest.TestCase):
+    """Test the policy applied to requests."""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        for patcher in (
+            patch('gpt4shell.policy.get_config_path', return_value=Path(temp_dir.name) / "config.json"),
+            patch('gpt4shell.policy.BACKOFF_BASE', 0.01),
+            patch.dict('gpt4shell.policy._budgets', clear=True),
+            patch.dict(os.environ, {"OPENAI_API_KEY": "test"}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        close_http_clients()
+
+    def test_rate_limit_is_retried_after_the_requested_delay(self):
+        """Test that a 429 is retried once the Retry-After delay has passed."""
+        with MockOpenAIServer(response_text="answer", rate_limit=1, rate_limit_window=0.3) as server:
+            model = create_model({"api_base": server.url})
+            model.invoke("first")
+            begun = time.monotonic()
+            self.assertEqual(model.invoke("second").content, "answer")
+
+        self.assertEqual(server.rate_limited, 1)
+        self.assertEqual(len(server.requests), 3)
+        self.assertGreater(time.monotonic() - begun, 0.2)
+
+    def test_server_errors_are_retried_up_to_max_retries(self):
+        """Test that a failing endpoint is called 1 + max_retries times."""
+        with MockOpenAIServer(error_rate=1.0) as server:
+            with self.assertRaises(Exception) as context:
+                create_model({"api_base": server.url, "max_retries": 2}).invoke("hi")
+
+        self.assertEqual(getattr(context.exception, "status_code", None), 500)
+        self.assertEqual(len(server.requests), 3)
+
+    def test_retry_budget_caps_retries(self):
+        """Test that retries stop once the budget is spent and resume as requests earn it."""
+        budget = RetryBudget(0.5, reserve=1)
+        self.assertTrue(budget.withdraw())
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        self.assertFalse(budget.withdraw())
+        budget.deposit()
+        self.assertTrue(budget.withdraw())
+
+        with MockOpenAIServer(error_rate=1.0) as server, patch('gpt4shell.policy.RETRY_RESERVE', 1):
+            config = {"api_base": server.url, "max_retries": 5, "retry_budget": 0.0}
+            with self.assertRaises(Exception):
+                create_model(config).invoke("hi")
+        self.assertEqual(len(server.requests), 2)
+
+    def test_deadline_bounds_the_request(self):
+        """Test that invoke, stream and ainvoke give up at the deadline."""
+        with MockOpenAIServer(latency=2.0) as server:
+            model = create_model({"api_base": server.url, "request_deadline": 0.3})
+            for call in (lambda: model.invoke("hi"),
+                         lambda: list(model.stream("hi")),
+                         lambda: asyncio.run(model.ainvoke("hi"))):
+                begun = time.monotonic()
+                with self.assertRaises(DeadlineExceededError):
+                    call()
+                self.assertLess(time.monotonic() - begun, 1.0)
+
+    def test_async_requests_follow_the_same_policy(self):
+        """Test that scheduled async requests honour max_retries, the retry budget and the deadline."""
+        with MockOpenAIServer(error_rate=1.0) as server:
+            config = {"api_base": server.url, "max_retries": 2, "cache": False, "single_flight": False}
+            [error] = Client(config, "{question}").batch(["hi"], return_exceptions=True)
+        self.assertEqual(getattr(error, "status_code", None), 500)
+        self.assertEqual(len(server.requests), 3)
+
+        with MockOpenAIServer(error_rate=1.0) as server, patch('gpt4shell.policy.RETRY_RESERVE', 1):
+            config = {"api_base": server.url, "max_retries": 5, "retry_budget": 0.0, "cache": False,
+                      "single_flight": False}
+            Client(config, "{question}").batch(["hi"], return_exceptions=True)
+        self.assertEqual(len(server.requests), 2)
+
+        with MockOpenAIServer(latency=2.0) as server:
+            config = {"api_base": server.url, "request_deadline": 0.3, "cache": False, "single_flight": False}
+            begun = time.monotonic()
+            with self.assertRaises(DeadlineExceededError):
+                Client(config, "{question}").batch(["hi"])
+            self.assertLess(time.monotonic() - begun, 1.0)
+
+    def test_deadline_from_the_command_line(self):
+        """Test that --deadline makes gpt fail with a message instead of waiting."""
+        with MockOpenAIServer(latency=2.0) as server:
+            config = {"api_base": server.url, "cache": False, "daemon": False}
+            with patch('gpt4shell.get_config', return_value=config), \
+                 patch('sys.stderr', new=io.StringIO()) as stderr:
+                self.assertEqual(main(['--deadline', '0.2', 'hi']), 1)
+
+        self.assertIn("within the 0.2s deadline", stderr.getvalue())
+
+    def test_missed_deadlines_do_not_open_the_circuit(self):
+        """Test that a caller's tight --deadline never makes later requests refuse a working endpoint."""
+        with MockOpenAIServer(latency=0.5, response_text="answer") as server:
+            config = {"api_base": server.url, "cache": False, "daemon": False, "circuit_failure_threshold": 2}
+            with patch('gpt4shell.get_config', return_value=config), \
+                 patch('sys.stderr', new=io.StringIO()), \
+                 patch('sys.stdout', new=io.StringIO()) as stdout:
+                for _ in range(3):
+                    self.assertEqual(main(['--deadline', '0.1', 'hi']), 1)
+                main(['no deadline now'])
+
+        self.assertEqual(stdout.getvalue(), "answer\n")
+
+    def test_provider_error_from_the_command_line(self):
+        """Test that a server error left after retries is one line of output and exit code 1."""
+        with MockOpenAIServer(error_rate=1.0) as server:
+            config = {"api_base": server.url, "max_retries": 0, "cache": False, "daemon": False}
+            with patch('gpt4shell.get_config', return_value=config), \
+                 patch('sys.stderr', new=io.StringIO()) as stderr:
+                self.assertEqual(main(['hi']), 1)
+
+        [line] = stderr.getvalue().splitlines()
+        self.assertTrue(line.startswith("Error: "))
+        self.assertIn("500", line)
+
+    def test_open_circuit_does_not_build_the_model(self):
+        """Test that a request refused by an open circuit never builds the provider's model."""
+        config = {"api_base": "http://127.0.0.1:9/v1", "circuit_failure_threshold": 1}
+        CircuitBreaker.from_config(config).record_failure(endpoint_name(config))
+
+        with patch('gpt4shell.providers.get_provider') as mock_get_provider:
+            with self.assertRaises(CircuitOpenError):
+                create_model(config).invoke("hi")
+        mock_get_provider.return_value.assert_not_called()
+
+    def test_open_circuit_fails_fast_in_a_new_process(self):
+        """Test that once an endpoint's circuit opens, other processes do not call it."""
+        with MockOpenAIServer(error_rate=1.0) as server:
+            config = {"api_base": server.url, "max_retries": 0, "circuit_failure_threshold": 2}
+            model = create_model(config)
+            for _ in range(2):
+                with self.assertRaises(Exception):
+                    model.invoke("hi")
+            self.assertTrue(get_circuits_path().exists())
+
+            context = multiprocessing.get_context("fork")
+            results = context.Queue()
+            process = context.Process(target=ask, args=(config, results))
+            process.start()
+            outcome = results.get(timeout=10)
+            process.join()
+
+        self.assertEqual(outcome, "CircuitOpenError")
+        self.assertEqual(len(server.requests), 2)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test circuit state transitions."""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.now = 1000.0
+        self.breaker = CircuitBreaker(Path(temp_dir.name) / "circuits.json", failure_threshold=3,
+                                      reset_timeout=30.0, clock=lambda: self.now)
+
+    def test_opens_after_consecutive_failures_only(self):
+        """Test that a success in between resets the failure count."""
+        for _ in range(2):
+            self.breaker.record_failure("api")
+        self.breaker.record_success("api")
+        for _ in range(2):
+            self.breaker.record_failure("api")
+        self.assertEqual(self.breaker.state("api"), "closed")
+
+        self.breaker.record_failure("api")
+        self.assertEqual(self.breaker.state("api"), "open")
+        with self.assertRaises(CircuitOpenError) as context:
+            self.breaker.before_call("api")
+        self.assertAlmostEqual(context.exception.retry_in, 30.0)
+        # Other endpoints are unaffected
+        self.breaker.before_call("other")
+
+    def test_one_probe_after_the_reset_timeout(self):
+        """Test that a single request probes a recovered endpoint and closes the circuit."""
+        for _ in range(3):
+            self.breaker.record_failure("api")
+        self.now += 31
+        self.assertEqual(self.breaker.state("api"), "half-open")
+
+        self.breaker.before_call("api")
+        # Everyone else keeps failing fast while the probe is out
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call("api")
+
+        self.breaker.record_success("api")
+        self.assertEqual(self.breaker.state("api"), "closed")
+        self.breaker.before_call("api")
+
+    def test_failed_probe_reopens_the_circuit(self):
+        """Test that a probe failing opens the circuit again at once."""
+        for _ in range(3):
+            self.breaker.record_failure("api")
+        self.now += 31
+        self.breaker.before_call("api")
+        self.breaker.record_failure("api")
+
+        self.assertEqual(self.breaker.state("api"), "open")
+
+    def test_only_outages_count_as_failures(self):
+        """Test that rate limits and client errors do not open circuits."""
+        self.assertTrue(is_outage(SimpleNamespace(status_code=503)))
+        self.assertFalse(is_outage(DeadlineExceededError("api", 1.0)))
+        self.assertFalse(is_outage(SimpleNamespace(status_code=429)))
+        self.assertFalse(is_outage(SimpleNamespace(status_code=400)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Unit tests for gpt4shell.prompts module.
+
+Tests template checks at load time, the compiled template cache and
+selecting a named prompt with --prompt.
+"""
+
+import io
+import unittest
+from unittest.mock import patch
+
+from gpt4shell import main
+from gpt4shell.prompts import (UnknownPromptError, check_template, compile_prompt,
+                               get_prompt_template)
+from gpt4shell.settings import validate_config
+
+
+class TestCheckTemplate(unittest.TestCase):
+    """Test template validation."""
+
+    def test_valid_template(self):
+        """Test that a template using only {question} passes, escaped braces included."""
+        self.assertIsNone(check_template('Answer as JSON like {{"a": 1}}:\n{question}'))
+
+    def test_problems_are_described(self):
+        """Test missing, unknown and malformed placeholders."""
+        self.assertEqual(check_template("No placeholder"), "has no {question} placeholder")
+        self.assertEqual(check_template("{question} in {language}"), "uses unknown variables: {language}")
+        self.assertIn("not a valid template", check_template("{question"))
+        self.assertEqual(check_template(3), "is a int, not a string")
+
+    def test_invalid_prompts_are_dropped_at_load_time(self):
+        """Test that validate_config reports and removes unusable prompts."""
+        config = {"prompts": {"good": "Q: {question}", "typo": "Q: {questoin}"}}
+
+        warnings = validate_config(config, "config.json")
+
+        self.assertEqual(config["prompts"], {"good": "Q: {question}"})
+        self.assertEqual(len(warnings), 1)
+        self.assertIn("'typo'", warnings[0])
+        self.assertIn("{questoin}", warnings[0])
+
+
+class TestPromptSelection(unittest.TestCase):
+    """Test looking up and compiling templates."""
+
+    def test_get_prompt_template(self):
+        """Test the default template and named lookups."""
+        config = {"prompt_template": "Default: {question}", "prompts": {"shell": "Shell: {question}"}}
+        self.assertEqual(get_prompt_template(config), "Default: {question}")
+        self.assertEqual(get_prompt_template(config, "shell"), "Shell: {question}")
+        with self.assertRaises(UnknownPromptError) as context:
+            get_prompt_template(config, "missing")
+        self.assertIn("Available prompts: shell", str(context.exception))
+
+    def test_compiled_templates_are_cached(self):
+        """Test that each template string is parsed once."""
+        compile_prompt.cache_clear()
+        self.addCleanup(compile_prompt.cache_clear)
+        with patch('gpt4shell.ChatPromptTemplate') as mock_template:
+            first = compile_prompt("Cached: {question}")
+            second = compile_prompt("Cached: {question}")
+            compile_prompt("Other: {question}")
+
+        self.assertIs(first, second)
+        self.assertEqual(mock_template.from_template.call_count, 2)
+
+
+class TestPromptCommandLine(unittest.TestCase):
+    """Test --prompt from the command line."""
+
+    config = {"provider": "mock", "cache": False, "daemon": False, "prompt_template": "Default: {question}",
+              "prompts": {"shell": "Shell: {question}"}}
+
+    def test_named_prompt_is_used(self):
+        """Test that --prompt renders the question with the named template."""
+        with patch('gpt4shell.get_config', return_value=self.config), \
+             patch('sys.stdout', new=io.StringIO()) as stdout:
+            main(['--prompt', 'shell', 'list files'])
+
+        # The mock provider echoes the rendered prompt back
+        self.assertEqual(stdout.getvalue(), "Shell: list files\n")
+
+    def test_unknown_prompt_fails(self):
+        """Test that an unknown name is reported without sending anything."""
+        with patch('gpt4shell.get_config', return_value=self.config), \
+             patch('gpt4shell.create_model') as mock_create_model, \
+             patch('sys.stderr', new=io.StringIO()) as stderr:
+            self.assertEqual(main(['--prompt', 'nope', 'list files']), 1)
+
+        mock_create_model.assert_not_called()
+        self.assertIn("Unknown prompt: nope", stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+Unit tests for gpt4shell.providers package.
+
+Tests provider lookup, entry point discovery, lazy loading and the
+built-in OpenAI-compatible and mock providers.
+"""
+
+import io
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+from gpt4shell import create_model, main
+from gpt4shell.providers import available_providers, get_provider
+
+
+class TestRegistry(unittest.TestCase):
+    """Test resolving provider names to model factories."""
+
+    def setUp(self):
+        # Start every test with nothing resolved yet
+        patcher = patch.dict('gpt4shell.providers._factories', clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def entry_points(self, **factories):
+        entry_points = {}
+        for name, factory in factories.items():
+            entry_point = MagicMock()
+            entry_point.load.return_value = factory
+            entry_points[name] = entry_point
+        return patch('gpt4shell.providers._entry_points', return_value=entry_points)
+
+    def test_unknown_provider_lists_available_ones(self):
+        """Test that unknown names raise ValueError naming every provider."""
+        with self.entry_points(custom=MagicMock()):
+            with self.assertRaises(ValueError) as context:
+                get_provider("nope")
+
+        message = str(context.exception)
+        self.assertIn("Unsupported provider: nope", message)
+        for name in ("openai", "openai-compatible", "mock", "custom"):
+            self.assertIn(name, message)
+
+    def test_entry_point_providers_are_loaded_on_demand(self):
+        """Test that third-party providers come from entry points."""
+        factory = MagicMock(return_value="custom model")
+        with self.entry_points(custom=factory):
+            self.assertIn("custom", available_providers())
+            self.assertEqual(create_model({"provider": "Custom"}).model, "custom model")
+
+        factory.assert_called_once_with({"provider": "Custom"})
+
+    def test_builtin_providers_take_precedence(self):
+        """Test that an entry point cannot replace a built-in provider."""
+        with self.entry_points(mock=MagicMock()) as mock_entry_points:
+            factory = get_provider("mock")
+
+        self.assertEqual(factory.__module__, "gpt4shell.providers.mock")
+        mock_entry_points.assert_not_called()
+
+    def test_only_the_selected_provider_is_imported(self):
+        """Test that selecting the mock provider never imports the OpenAI one."""
+        code = (
+            "import sys, gpt4shell; "
+            "gpt4shell.create_model({'provider': 'mock'}); "
+            "print('gpt4shell.providers.openai' in sys.modules, 'langchain_openai' in sys.modules)"
+        )
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), "False False")
+
+
+class TestOpenAICompatibleProvider(unittest.TestCase):
+    """Test the provider for self-hosted OpenAI-compatible servers."""
+
+    def test_requires_api_base(self):
+        """Test that a missing api_base is reported."""
+        with self.assertRaises(ValueError) as context:
+            create_model({"provider": "openai-compatible"})
+        self.assertIn("api_base", str(context.exception))
+
+    def test_api_key_is_optional(self):
+        """Test that a placeholder key is sent when none is configured."""
+        config = {"provider": "openai-compatible", "api_base": "http://localhost:8000/v1", "model": "llama3"}
+        with patch.dict(os.environ, {}, clear=True), patch('gpt4shell.ChatOpenAI') as mock_openai:
+            create_model(config)
+
+        kwargs = mock_openai.call_args.kwargs
+        self.assertEqual(kwargs["openai_api_base"], "http://localhost:8000/v1")
+        self.assertEqual(kwargs["openai_api_key"], "not-needed")
+
+
+class TestMockProvider(unittest.TestCase):
+    """Test the in-process mock provider."""
+
+    def test_echoes_the_prompt(self):
+        """Test that the mock answers with the last message by default."""
+        model = create_model({"provider": "mock"})
+        self.assertEqual(model.invoke("hello there").content, "hello there")
+
+    def test_streams_fixed_response_word_by_word(self):
+        """Test streaming a configured response."""
+        model = create_model({"provider": "mock", "mock_response": "one two three"})
+        chunks = [chunk.content for chunk in model.stream("anything")]
+        self.assertEqual(chunks, ["one ", "two ", "three"])
+
+    def test_answers_from_the_command_line(self):
+        """Test a full CLI round trip without any network access."""
+        config = {"provider": "mock", "prompt_template": "Q: {question}"}
+        with patch('gpt4shell.get_config', return_value=config), \
+             patch('sys.stdout', new=io.StringIO()) as stdout:
+            main(['What is Python?'])
+
+        self.assertEqual(stdout.getvalue(), "Q: What is Python?\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+Unit tests for gpt4shell.repl module.
+
+Tests conversation token accounting and trimming, and the interactive loop
+with a mocked chain.
+"""
+
+import unittest
+from unittest.mock import patch, MagicMock
+
+from gpt4shell import main
+from gpt4shell.repl import Conversation, run_repl
+
+
+def count_words(text):
+    return len(text.split())
+
+
+class TestConversation(unittest.TestCase):
+    """Test history bookkeeping."""
+
+    def test_token_counts_are_cached_per_message(self):
+        """Test that each message is counted exactly once."""
+        counter = MagicMock(side_effect=count_words)
+        conversation = Conversation(max_tokens=100, count_tokens=counter)
+
+        conversation.add_turn("one two", "three")
+        conversation.add_turn("four", "five six seven")
+        conversation.messages()
+        conversation.messages()
+
+        self.assertEqual(counter.call_count, 4)
+        self.assertEqual(conversation.total_tokens, 7)
+
+    def test_oldest_turns_are_trimmed_over_budget(self):
+        """Test that whole turns are dropped from the front once over budget."""
+        conversation = Conversation(max_tokens=6, count_tokens=count_words)
+        conversation.add_turn("a b", "c")
+        conversation.add_turn("d e", "f")
+        conversation.add_turn("g h", "i")
+
+        contents = [m.content for m in conversation.messages()]
+        self.assertEqual(contents, ["d e", "f", "g h", "i"])
+        self.assertEqual(conversation.total_tokens, 6)
+        self.assertEqual(conversation.trimmed_turns, 1)
+
+    def test_latest_turn_is_kept_even_if_too_large(self):
+        """Test that a single oversized turn is not dropped."""
+        conversation = Conversation(max_tokens=2, count_tokens=count_words)
+        conversation.add_turn("a b c", "d e f")
+        self.assertEqual(len(conversation), 2)
+
+
+class TestRunRepl(unittest.TestCase):
+    """Test the interactive loop."""
+
+    def _run(self, inputs, first_question=None, config=None):
+        answers = iter(["first answer", "second answer", "third answer"])
+        calls = []
+
+        def fake_stream_answer(chain, inputs):
+            calls.append([m.content for m in inputs["history"]] + [inputs["question"]])
+            if inputs["question"] == "fail":
+                raise ConnectionError("Circuit for api.openai.com is open")
+            return next(answers)
+
+        lines = iter(inputs)
+
+        def read_input(prompt):
+            try:
+                return next(lines)
+            except StopIteration:
+                raise EOFError
+
+        with patch('gpt4shell.repl.build_chat_chain'), \
+             patch('gpt4shell.stream_answer', side_effect=fake_stream_answer), \
+             patch('gpt4shell.rich.get_console'):
+            result = run_repl(config or {"history_max_tokens": 1000}, "{question}", first_question, read_input)
+        return result, calls
+
+    def test_history_is_sent_with_each_turn(self):
+        """Test that later turns include earlier questions and answers."""
+        result, calls = self._run(["hello", "again"])
+
+        self.assertEqual(result, 0)
+        self.assertEqual(calls, [["hello"], ["hello", "first answer", "again"]])
+
+    def test_clear_and_exit_commands(self):
+        """Test that /clear forgets history and /exit stops the loop."""
+        _, calls = self._run(["hello", "/clear", "again", "/exit", "never"])
+
+        self.assertEqual(calls, [["hello"], ["again"]])
+
+    def test_failed_turn_does_not_end_the_chat(self):
+        """Test that a request error is reported and the unanswered question is left out of the history."""
+        result, calls = self._run(["hello", "fail", "again"])
+
+        self.assertEqual(result, 0)
+        self.assertEqual(calls, [["hello"], ["hello", "first answer", "fail"], ["hello", "first answer", "again"]])
+
+    def test_turns_are_checked_with_their_history(self):
+        """Test that a question that only overflows the window together with the history is not sent."""
+        # Estimates without a tokenizer: "hello" + "first answer" is 4 tokens, 200 x's are 50
+        config = {"history_max_tokens": 1000, "model": "gpt-4", "context_window": 60}
+        with patch('gpt4shell.tokens.get_encoding', return_value=None):
+            _, calls = self._run(["hello", "x" * 200, "again"], config=config)
+
+        self.assertEqual(calls, [["hello"], ["hello", "first answer", "again"]])
+
+    def test_oversized_turns_are_truncated_when_configured(self):
+        """Test that prompt_overflow "truncate" shortens the question to fit beside the history."""
+        config = {"history_max_tokens": 1000, "model": "gpt-4", "context_window": 60,
+                  "prompt_overflow": "truncate"}
+        with patch('gpt4shell.tokens.get_encoding', return_value=None):
+            _, calls = self._run(["hello", "x" * 200], config=config)
+
+        self.assertEqual(calls, [["hello"], ["hello", "first answer", "x" * 196]])
+
+    def test_first_question_from_command_line(self):
+        """Test that `gpt -i "question"` asks it as the first turn."""
+        _, calls = self._run([], first_question="from argv")
+        self.assertEqual(calls, [["from argv"]])
+
+    def test_main_interactive_flag_starts_repl(self):
+        """Test that -i runs the REPL without requiring a question."""
+        with patch('gpt4shell.get_config', return_value={}), \
+             patch('gpt4shell.repl.run_repl', return_value=0) as mock_run_repl:
+            self.assertEqual(main(['-i']), 0)
+
+        mock_run_repl.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
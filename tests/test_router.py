@@ -0,0 +1,224 @@
+"""
+Unit tests for gpt4shell.router module.
+
+Tests route ranking, failover, hedging, persisted statistics and the
+routes subcommand, using stand-in models with scripted delays and errors.
+"""
+
+import asyncio
+import io
+import json
+import multiprocessing
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from gpt4shell import create_model, main
+from gpt4shell.router import STATS_MAX_AGE, RouteStats, Router, RoutingError
+
+
+class FakeModel:
+    """Model stand-in answering after a delay, or failing."""
+
+    def __init__(self, answer="answer", delay=0.0, error=None):
+        self.answer = answer
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def invoke(self, input, config=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.answer
+
+    def stream(self, input, config=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        yield from self.answer.split(" ")
+
+    async def ainvoke(self, input, config=None):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.answer
+
+
+def record_samples(path, writer):
+    stats = RouteStats(path)
+    for sample in range(10):
+        stats.record("shared", writer + sample / 100)
+    stats.record(f"writer-{writer}", 1.0)
+
+
+def make_router(*models, hedge_after=None, stats=None):
+    config = {"routes": [f"model-{index}" for index in range(len(models))], "hedge_after": hedge_after}
+    router = Router(config, stats=stats or RouteStats())
+    for route, model in zip(router.routes, models):
+        route._model = model
+    return router
+
+
+class TestRanking(unittest.TestCase):
+    """Test the order routes are tried in."""
+
+    def test_fastest_healthy_route_goes_first(self):
+        """Test ordering by median latency, with unhealthy routes last."""
+        stats = RouteStats()
+        router = make_router(FakeModel(), FakeModel(), FakeModel(), stats=stats)
+        slow, fast, broken = (route.name for route in router.routes)
+        for _ in range(3):
+            stats.record(slow, 2.0)
+            stats.record(fast, 0.5)
+            stats.record(broken, None)
+
+        self.assertEqual([route.name for route in router.ranked()], [fast, slow, broken])
+
+    def test_unmeasured_routes_come_after_measured_ones(self):
+        """Test that routes without a latency keep config order behind a measured route."""
+        router = make_router(FakeModel(), FakeModel(), FakeModel())
+        first, second, third = router.routes
+        self.assertEqual(router.ranked(), [first, second, third])
+
+        router.stats.record(third.name, 1.0)
+        router.stats.record(first.name, None)
+        self.assertEqual(router.ranked(), [third, first, second])
+
+
+class TestFailover(unittest.TestCase):
+    """Test falling back to the next route on errors."""
+
+    def test_error_fails_over_to_next_route(self):
+        """Test that a failing route is skipped and its error recorded."""
+        router = make_router(FakeModel(error=RuntimeError("down")), FakeModel("backup"))
+
+        self.assertEqual(router.invoke("hi"), "backup")
+        self.assertEqual(router.stats.error_rate(router.routes[0].name), 1.0)
+
+    def test_all_routes_failing_raises(self):
+        """Test that RoutingError lists every failure."""
+        router = make_router(FakeModel(error=RuntimeError("a")), FakeModel(error=RuntimeError("b")))
+
+        with self.assertRaises(RoutingError) as context:
+            router.invoke("hi")
+        self.assertIn("RuntimeError: a", str(context.exception))
+        self.assertIn("RuntimeError: b", str(context.exception))
+
+    def test_stream_fails_over_before_first_chunk(self):
+        """Test that streaming falls back when a route fails before any output."""
+        router = make_router(FakeModel(error=RuntimeError("down")), FakeModel("streamed answer"))
+        self.assertEqual(list(router.stream("hi")), ["streamed", "answer"])
+
+    def test_ainvoke_fails_over(self):
+        """Test failover for async calls."""
+        router = make_router(FakeModel(error=RuntimeError("down")), FakeModel("backup"))
+        self.assertEqual(asyncio.run(router.ainvoke("hi")), "backup")
+
+
+class TestHedging(unittest.TestCase):
+    """Test backup requests for slow routes."""
+
+    def test_slow_route_is_hedged(self):
+        """Test that a backup answers when the first route is slow."""
+        slow, fast = FakeModel("slow", delay=1.0), FakeModel("fast")
+        router = make_router(slow, fast, hedge_after=0.05)
+
+        start = time.monotonic()
+        self.assertEqual(router.invoke("hi"), "fast")
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_no_hedging_by_default(self):
+        """Test that without hedge_after only one route is called."""
+        slow, fast = FakeModel("slow", delay=0.1), FakeModel("fast")
+        router = make_router(slow, fast)
+
+        self.assertEqual(router.invoke("hi"), "slow")
+        self.assertEqual(fast.calls, 0)
+
+    def test_ainvoke_is_hedged(self):
+        """Test hedging for async calls."""
+        router = make_router(FakeModel("slow", delay=1.0), FakeModel("fast"), hedge_after=0.05)
+        self.assertEqual(asyncio.run(router.ainvoke("hi")), "fast")
+
+
+class TestRouteStats(unittest.TestCase):
+    """Test persisted routing statistics."""
+
+    def test_stats_persist_between_processes(self):
+        """Test that samples are written and loaded again, dropping old ones."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "routes.json"
+            stats = RouteStats(path)
+            stats.record("route", 0.25)
+            stats.record("route", 0.75)
+
+            data = json.loads(path.read_text())
+            data["route"].append([time.time() - STATS_MAX_AGE - 1, 9.0])
+            path.write_text(json.dumps(data))
+
+            loaded = RouteStats(path)
+            self.assertEqual(loaded.percentile("route", 50), 0.25)
+            self.assertEqual(loaded.percentile("route", 95), 0.75)
+
+    def test_concurrent_writers_keep_each_others_samples(self):
+        """Test that processes saving at the same time do not overwrite each other's samples."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "routes.json"
+            context = multiprocessing.get_context("fork")
+            processes = [context.Process(target=record_samples, args=(path, writer)) for writer in range(4)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+
+            data = json.loads(path.read_text())
+        self.assertEqual(sorted(latency for _, latency in data["shared"]),
+                         [writer + sample / 100 for writer in range(4) for sample in range(10)])
+        self.assertEqual(sorted(data), ["shared", "writer-0", "writer-1", "writer-2", "writer-3"])
+
+
+class TestRoutedCommandLine(unittest.TestCase):
+    """Test routing through create_model and main."""
+
+    def setUp(self):
+        patcher = patch('gpt4shell.router.get_route_stats', return_value=RouteStats())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_create_model_builds_a_router(self):
+        """Test that routes in the config make create_model return a Router."""
+        model = create_model({"routes": [{"provider": "mock", "mock_response": "routed"}]})
+
+        self.assertIsInstance(model, Router)
+        self.assertEqual(model.invoke("hi").content, "routed")
+
+    def test_main_answers_through_routes(self):
+        """Test a streamed CLI answer through the router."""
+        config = {"prompt_template": "{question}", "stream": True,
+                  "routes": [{"provider": "mock", "mock_response": "routed answer"}]}
+        with patch('gpt4shell.get_config', return_value=config), \
+             patch('sys.stdout', new=io.StringIO()) as stdout:
+            main(['hi'])
+
+        self.assertEqual(stdout.getvalue(), "routed answer\n")
+
+    def test_routes_command_lists_routes(self):
+        """Test that `gpt routes` shows routes in ranked order."""
+        config = {"routes": ["gpt-4o-mini", "gpt-3.5-turbo"]}
+        with patch('gpt4shell.settings.get_config', return_value=config), \
+             patch('sys.stdout', new=io.StringIO()) as stdout:
+            self.assertEqual(main(['routes']), 0)
+
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith("openai:default:gpt-4o-mini"))
+
+
+if __name__ == '__main__':
+    unittest.main()
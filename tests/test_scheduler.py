@@ -0,0 +1,146 @@
+"""
+Unit tests for gpt4shell.scheduler module.
+
+Tests token buckets, Retry-After parsing, 429 backoff and quota pacing,
+including against the local stand-in server injecting 429s.
+"""
+
+import asyncio
+import os
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+from benchmarks.mock_server import MockOpenAIServer
+from gpt4shell import create_model
+from gpt4shell.scheduler import RateLimitScheduler, TokenBucket, retry_after
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class StatusError(Exception):
+    """Exception shaped like openai.APIStatusError."""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = MagicMock(headers=headers or {})
+
+
+class TestTokenBucket(unittest.TestCase):
+    """Test token bucket refill and debt."""
+
+    def test_bucket_refills_over_time(self):
+        """Test that consumed capacity comes back at the configured rate."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+        bucket.consume(2)
+
+        self.assertAlmostEqual(bucket.delay_for(1), 0.5)
+        clock.now += 0.5
+        self.assertEqual(bucket.delay_for(1), 0.0)
+
+    def test_large_requests_go_into_debt(self):
+        """Test that a request bigger than capacity delays later ones."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, capacity=10, clock=clock)
+        bucket.consume(30)
+
+        self.assertAlmostEqual(bucket.delay_for(10), 3.0)
+
+
+class TestRetryAfter(unittest.TestCase):
+    """Test Retry-After header parsing."""
+
+    def test_seconds_and_milliseconds(self):
+        """Test both header variants, preferring retry-after-ms."""
+        self.assertEqual(retry_after(StatusError(429, {"retry-after": "2"})), 2.0)
+        self.assertEqual(retry_after(StatusError(429, {"retry-after-ms": "250", "retry-after": "2"})), 0.25)
+
+    def test_missing_header(self):
+        """Test that no header gives None."""
+        self.assertIsNone(retry_after(StatusError(429)))
+        self.assertIsNone(retry_after(ValueError("no response")))
+
+
+class TestRateLimitScheduler(unittest.TestCase):
+    """Test retry and pacing behaviour of the scheduler."""
+
+    def test_retries_429_after_retry_after_delay(self):
+        """Test that a 429 is retried after the delay the server asked for."""
+        scheduler = RateLimitScheduler()
+        calls = []
+
+        async def call():
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise StatusError(429, {"retry-after": "0.1"})
+            return "ok"
+
+        self.assertEqual(asyncio.run(scheduler.run(call)), "ok")
+        self.assertGreaterEqual(calls[1] - calls[0], 0.09)
+        self.assertEqual(scheduler.stats["rate_limited"], 1)
+
+    def test_non_retryable_errors_are_raised(self):
+        """Test that client errors other than 429 are not retried."""
+        scheduler = RateLimitScheduler()
+
+        async def call():
+            raise StatusError(400)
+
+        with self.assertRaises(StatusError):
+            asyncio.run(scheduler.run(call))
+        self.assertEqual(scheduler.stats["calls"], 1)
+
+    def test_gives_up_after_max_retries(self):
+        """Test that persistent 429s eventually surface."""
+        scheduler = RateLimitScheduler(max_retries=2)
+
+        async def call():
+            raise StatusError(429, {"retry-after": "0"})
+
+        with self.assertRaises(StatusError):
+            asyncio.run(scheduler.run(call))
+        self.assertEqual(scheduler.stats["calls"], 3)
+
+    def test_requests_are_paced_to_quota(self):
+        """Test that requests_per_minute spaces out admissions."""
+        scheduler = RateLimitScheduler(requests_per_minute=600)  # 10 per second
+
+        async def run_all():
+            async def call():
+                return time.monotonic()
+            return await asyncio.gather(*(scheduler.run(call) for _ in range(15)))
+
+        start = time.monotonic()
+        asyncio.run(run_all())
+        # Ten go out as a burst; the other five need half a second of refill
+        self.assertGreaterEqual(time.monotonic() - start, 0.45)
+
+    def test_against_server_injecting_429s(self):
+        """Test that every request succeeds against a rate-limited stand-in server."""
+        with patch.dict(os.environ, {"OPENAI_API_KEY": "mock-key"}), \
+             MockOpenAIServer(response_text="ok", rate_limit=3, rate_limit_window=0.2) as server:
+            model = create_model({"api_base": server.url, "max_retries": 0})
+            scheduler = RateLimitScheduler(base_delay=0.05)
+
+            async def run_all():
+                return await asyncio.gather(*(scheduler.run(lambda: model.ainvoke("hi")) for _ in range(8)))
+
+            results = asyncio.run(run_all())
+
+        self.assertEqual([r.content for r in results], ["ok"] * 8)
+        self.assertGreater(server.rate_limited, 0)
+        self.assertEqual(scheduler.stats["rate_limited"], server.rate_limited)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+"""
+Unit tests for gpt4shell.semantic_cache module.
+
+Tests the local embedding, the memory-mapped index, the thresholds used
+with and without an embedding model and serving similar questions from
+the cache through the command line.
+"""
+
+import io
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+
+from benchmarks.mock_server import EMBEDDING_DIMENSIONS, MockOpenAIServer
+import gpt4shell
+from gpt4shell import main
+from gpt4shell.semantic_cache import LOCAL_DIMENSIONS, SemanticCache, SemanticIndex, local_embedding
+
+
+def similarity(first, second):
+    a, b = local_embedding(first), local_embedding(second)
+    return float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+class TestLocalEmbedding(unittest.TestCase):
+    """Test the built-in lexical embedding."""
+
+    def test_rephrased_questions_are_similar(self):
+        """Test that rewordings score high and changes of case or punctuation score 1."""
+        self.assertGreaterEqual(similarity("how do I list files in python", "python list files in directory"), 0.8)
+        self.assertAlmostEqual(similarity("How to undo a git commit?", "how to undo a git commit"), 1.0, places=5)
+
+    def test_different_questions_are_not(self):
+        """Test that questions about different things stay apart."""
+        self.assertLess(similarity("how to delete files in python", "how to list files in python"), 0.8)
+        self.assertLess(similarity("what is the capital of france", "what is the capital of spain"), 0.8)
+
+
+class TestSemanticIndex(unittest.TestCase):
+    """Test storing and searching vectors."""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.index = SemanticIndex(Path(temp_dir.name), 4)
+
+    def vector(self, *values):
+        vector = np.array(values, dtype=np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def test_empty_index_finds_nothing(self):
+        """Test searching before anything was added."""
+        self.assertIsNone(self.index.search(self.vector(1, 0, 0, 0)))
+
+    def test_search_returns_nearest_key(self):
+        """Test that the most similar vector's key is returned."""
+        self.index.add(self.vector(1, 0, 0, 0), "aa" * 32)
+        self.index.add(self.vector(0, 1, 0, 0), "bb" * 32)
+
+        score, key = self.index.search(self.vector(0.1, 1, 0, 0))
+        self.assertEqual(key, "bb" * 32)
+        self.assertGreater(score, 0.99)
+        self.assertEqual(len(self.index), 2)
+
+    def test_compact_keeps_newest_live_entries(self):
+        """Test that compaction drops dead entries and then the oldest ones."""
+        for index, key in enumerate(["aa", "bb", "cc", "dd"]):
+            self.index.add(self.vector(index + 1, 1, 0, 0), key * 32)
+
+        removed = self.index.compact(lambda key: key != "dd" * 32, limit=2)
+
+        self.assertEqual(removed, 2)
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.index.search(self.vector(3, 1, 0, 0))[1], "cc" * 32)
+        self.assertEqual(self.index.search(self.vector(0, 1, 0, 0))[1], "bb" * 32)
+
+
+class TestSemanticCache(unittest.TestCase):
+    """Test threshold handling and scoping."""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        patcher = patch('gpt4shell.semantic_cache.get_semantic_dir', return_value=Path(temp_dir.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_lookup_respects_threshold(self):
+        """Test that only sufficiently similar questions match."""
+        cache = SemanticCache(SemanticIndex(Path(self.index_dir()), LOCAL_DIMENSIONS), local_embedding, 0.8)
+        cache.add(cache.embed("how do I list files in python"), "aa" * 32)
+
+        self.assertEqual(cache.lookup(cache.embed("python list files in directory")), "aa" * 32)
+        self.assertIsNone(cache.lookup(cache.embed("how do I parse json in go")))
+
+    def test_lexical_fallback_needs_the_same_words_in_order(self):
+        """Test that without an embedding model only case, punctuation and filler words may differ."""
+        cache = SemanticCache.from_config({"model": "gpt-4", "semantic_cache_threshold": 0.5}, "{question}")
+        self.assertEqual(cache.index.dimensions, LOCAL_DIMENSIONS)
+        cache.add(cache.embed("How do I list files in Python?"), "aa" * 32)
+
+        self.assertEqual(cache.lookup(cache.embed("how do i list the files in python")), "aa" * 32)
+        self.assertIsNone(cache.lookup(cache.embed("python list files in directory")))
+
+    def test_reversed_questions_do_not_match(self):
+        """Test that questions with the same words but opposite meaning are never served each other's answer."""
+        pairs = [
+            ("convert celsius to fahrenheit", "convert fahrenheit to celsius"),
+            ("sort a list in ascending order in python", "sort a list in descending order in python"),
+            ("how do I undo the last git commit", "how do I redo the last git commit"),
+        ]
+        for first, second in pairs:
+            with self.subTest(first=first):
+                cache = SemanticCache.from_config({"model": first}, "{question}")
+                cache.add(cache.embed(first), "aa" * 32)
+                self.assertIsNone(cache.lookup(cache.embed(second)))
+
+    def test_threshold_applies_with_an_embedding_model(self):
+        """Test that semantic_cache_threshold is used as given when questions are embedded remotely."""
+        with patch('gpt4shell.semantic_cache._remote_embedder', return_value=local_embedding):
+            cache = SemanticCache.from_config({"model": "gpt-4", "embedding_model": "text-embedding-3-small"},
+                                              "{question}")
+        self.assertEqual(cache.threshold, 0.8)
+
+    def test_dimensions_are_learned_from_the_first_question(self):
+        """Test that nothing is embedded until a question is, and the size is remembered after."""
+        config = {"model": "gpt-4", "embedding_model": "text-embedding-3-small"}
+        with patch.dict(os.environ, {"OPENAI_API_KEY": "mock-key"}), MockOpenAIServer() as server:
+            config["api_base"] = server.url
+            cache = SemanticCache.from_config(config, "{question}")
+            self.assertEqual(server.requests, [])
+            self.assertIsNone(cache.lookup(cache.embed("how do I list files in python")))
+            self.assertEqual(cache.index.dimensions, EMBEDDING_DIMENSIONS)
+
+            reopened = SemanticCache.from_config(config, "{question}")
+        self.assertEqual(reopened.index.dimensions, EMBEDDING_DIMENSIONS)
+        self.assertEqual(len(server.requests), 1)
+
+    def index_dir(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        return temp_dir.name
+
+    def test_settings_get_separate_indexes(self):
+        """Test that answers are never shared across models."""
+        first = SemanticCache.from_config({"model": "gpt-4"}, "{question}")
+        second = SemanticCache.from_config({"model": "gpt-4o"}, "{question}")
+        local = SemanticCache.from_config({"model": "gpt-4", "api_base": "http://localhost:8000/v1"}, "{question}")
+        self.assertEqual(len({first.index.directory, second.index.directory, local.index.directory}), 3)
+
+
+class TestSemanticCacheCommandLine(unittest.TestCase):
+    """Test answering similar questions from the command line."""
+
+    def test_similar_question_is_served_from_cache(self):
+        """Test that a question differing in case and punctuation reuses the first answer without a model."""
+        config = {"provider": "mock", "mock_response": "Use os.listdir()", "prompt_template": "{question}",
+                  "semantic_cache": True}
+        with tempfile.TemporaryDirectory() as temp_dir, \
+             patch('gpt4shell.cache.get_config_path', return_value=Path(temp_dir) / "config.json"), \
+             patch('gpt4shell.get_config', return_value=config), \
+             patch('sys.stdout', new=io.StringIO()) as stdout:
+            main(['How do I list files in Python?'])
+            with patch('gpt4shell.create_model') as mock_create_model:
+                main(['how do i list the files in python'])
+
+        mock_create_model.assert_not_called()
+        self.assertEqual(stdout.getvalue().splitlines()[1], "Use os.listdir()")
+
+    def run_twice(self, config, first, second):
+        with tempfile.TemporaryDirectory() as temp_dir, \
+             patch.dict(os.environ, {"OPENAI_API_KEY": "mock-key"}), \
+             patch('gpt4shell.cache.get_config_path', return_value=Path(temp_dir) / "config.json"), \
+             patch('gpt4shell.get_config', return_value=config), \
+             patch('sys.stderr', new=io.StringIO()) as stderr, \
+             patch('sys.stdout', new=io.StringIO()) as stdout:
+            main([first])
+            with patch('gpt4shell.create_model', wraps=gpt4shell.create_model) as mock_create_model:
+                main([second])
+        return mock_create_model, stdout.getvalue(), stderr.getvalue()
+
+    def test_embedding_model_matches_rephrased_questions(self):
+        """Test that with an embedding model a reworded question reuses the first answer."""
+        with MockOpenAIServer() as server:
+            config = {"provider": "mock", "mock_response": "Use os.listdir()", "prompt_template": "{question}",
+                      "semantic_cache": True, "embedding_model": "text-embedding-3-small",
+                      "semantic_cache_threshold": 0.6, "api_base": server.url}
+            mock_create_model, output, _ = self.run_twice(config, "how do I list files in python",
+                                                          "python list files in directory")
+
+        mock_create_model.assert_not_called()
+        self.assertEqual(output.splitlines()[1], "Use os.listdir()")
+
+    def test_failing_embedding_endpoint_falls_back_to_the_model(self):
+        """Test that an unreachable embedding endpoint only costs the cache hit."""
+        config = {"provider": "mock", "mock_response": "Use os.listdir()", "prompt_template": "{question}",
+                  "semantic_cache": True, "embedding_model": "text-embedding-3-small",
+                  "api_base": "http://127.0.0.1:9/v1", "max_retries": 0}
+        mock_create_model, output, errors = self.run_twice(config, "how do I list files in python",
+                                                           "python list files in directory")
+
+        mock_create_model.assert_called_once()
+        self.assertEqual(output.splitlines(), ["Use os.listdir()", "Use os.listdir()"])
+        self.assertIn("Warning: Semantic cache unavailable", errors)
+
+
+if __name__ == '__main__':
+    unittest.main()
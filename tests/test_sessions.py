@@ -0,0 +1,187 @@
+"""
+Unit tests for gpt4shell.sessions module.
+
+Tests appending and resuming sessions, segment rollover, recovery from a
+crashed writer, compaction, concurrent appends from several processes and
+the `gpt sessions` command.
+"""
+
+import io
+import multiprocessing
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from benchmarks.mock_server import MockOpenAIServer
+from gpt4shell import main
+from gpt4shell.sessions import INDEX_RECORD, Session, SessionError, _SegmentReader, sessions_command
+from gpt4shell.transport import close_http_clients
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def append_turns(directory, writer, turns):
+    session = Session(Path(directory))
+    for turn in range(turns):
+        session.append(f"question {writer}-{turn}", "answer " * 50)
+
+
+class TestSession(unittest.TestCase):
+    """Test the on-disk session store."""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.session = Session(Path(temp_dir.name) / "demo")
+
+    def test_tail_returns_newest_turns_oldest_first(self):
+        """Test reading the end of a session by turn count and by token budget."""
+        for turn in range(100):
+            self.session.append(f"q{turn}", f"a{turn} extra words")
+
+        self.assertEqual(len(self.session), 100)
+        self.assertEqual([t["question"] for t in self.session.tail(limit=3)], ["q97", "q98", "q99"])
+        # Each turn is four words, so a budget of ten fits two of them
+        turns = self.session.tail(max_tokens=10, count_tokens=count_words)
+        self.assertEqual([t["question"] for t in turns], ["q98", "q99"])
+        # The newest turn is kept even when it alone is over budget
+        self.assertEqual(len(self.session.tail(max_tokens=1, count_tokens=count_words)), 1)
+
+    def test_tail_only_reads_the_turns_it_returns(self):
+        """Test that resuming a long session does not read the rest of it."""
+        for turn in range(1000):
+            self.session.append(f"q{turn}", "a")
+
+        with patch.object(_SegmentReader, 'read', autospec=True, side_effect=_SegmentReader.read) as read:
+            self.session.tail(limit=5)
+        self.assertEqual(read.call_count, 5)
+
+    def test_segments_roll_over(self):
+        """Test that turns spread over several segments read back in order."""
+        with patch('gpt4shell.sessions.SEGMENT_BYTES', 200):
+            for turn in range(20):
+                self.session.append(f"q{turn}", "a" * 50)
+
+        self.assertGreater(len(list(self.session.directory.glob("*.jsonl"))), 5)
+        self.assertEqual([t["question"] for t in self.session.tail()], [f"q{turn}" for turn in range(20)])
+
+    def test_crashed_writer_is_recovered(self):
+        """Test that unindexed bytes and half index records are dropped on the next append."""
+        self.session.append("q0", "a0")
+        with open(self.session.directory / "00000001.jsonl", "ab") as f:
+            f.write(b'{"question": "half')
+        with open(self.session.directory / "index.bin", "ab") as f:
+            f.write(INDEX_RECORD.pack(1, 999, 5)[:7])
+
+        self.session.append("q1", "a1")
+
+        self.assertEqual([t["question"] for t in self.session.tail()], ["q0", "q1"])
+
+    def test_compact_keeps_newest_turns(self):
+        """Test that compaction drops the oldest turns and their segments."""
+        with patch('gpt4shell.sessions.SEGMENT_BYTES', 200):
+            for turn in range(20):
+                self.session.append(f"q{turn}", "a" * 50)
+            self.assertEqual(self.session.compact(keep=3), 17)
+            self.session.append("q20", "a")
+
+        self.assertEqual([t["question"] for t in self.session.tail()], ["q17", "q18", "q19", "q20"])
+        self.assertEqual(self.session.compact(keep=0), 4)
+        self.assertEqual(self.session.tail(), [])
+        self.assertEqual(list(self.session.directory.glob("*.jsonl")), [])
+
+    def test_concurrent_appends_from_several_processes(self):
+        """Test that appends from several processes all land intact."""
+        context = multiprocessing.get_context("fork")
+        writers = [context.Process(target=append_turns, args=(self.session.directory, writer, 25))
+                   for writer in range(4)]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+
+        turns = self.session.tail()
+        self.assertEqual(len(turns), 100)
+        self.assertEqual(len({t["question"] for t in turns}), 100)
+        for writer in range(4):
+            mine = [t["question"] for t in turns if t["question"].startswith(f"question {writer}-")]
+            self.assertEqual(mine, [f"question {writer}-{turn}" for turn in range(25)])
+
+    def test_invalid_names_are_rejected(self):
+        """Test that a session name cannot escape the sessions directory."""
+        for name in ("../etc", "a/b", "", ".hidden"):
+            with self.assertRaises(SessionError):
+                Session.open(name)
+
+
+class TestSessionCommandLine(unittest.TestCase):
+    """Test --session and `gpt sessions`."""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        patcher = patch('gpt4shell.sessions.get_sessions_dir', return_value=Path(temp_dir.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        close_http_clients()
+
+    def test_session_history_is_sent(self):
+        """Test that the second call in a session sends the first exchange."""
+        with MockOpenAIServer(response_text="noted") as server, \
+             patch.dict(os.environ, {"OPENAI_API_KEY": "test"}):
+            config = {"api_base": server.url, "prompt_template": "{question}", "cache": False, "daemon": False}
+            with patch('gpt4shell.get_config', return_value=config), \
+                 patch('sys.stdout', new=io.StringIO()) as stdout:
+                main(['--session', 'work', 'my name is Ada'])
+                main(['--session', 'work', 'what is my name?'])
+
+        self.assertEqual(stdout.getvalue(), "noted\nnoted\n")
+        self.assertEqual([m["content"] for m in server.requests[1]["messages"]],
+                         ["my name is Ada", "noted", "what is my name?"])
+        self.assertEqual(len(Session.open("work")), 2)
+
+    def test_session_history_counts_against_the_context_window(self):
+        """Test that a question fitting on its own is rejected when the session's history makes it too large."""
+        with MockOpenAIServer(response_text="noted " * 30) as server, \
+             patch.dict(os.environ, {"OPENAI_API_KEY": "test"}), \
+             patch('gpt4shell.tokens.get_encoding', return_value=None):
+            config = {"api_base": server.url, "prompt_template": "{question}", "cache": False, "daemon": False,
+                      "model": "gpt-4", "context_window": 60}
+            with patch('gpt4shell.get_config', return_value=config), \
+                 patch('sys.stdout', new=io.StringIO()), \
+                 patch('sys.stderr', new=io.StringIO()) as stderr:
+                self.assertIsNone(main(['--session', 'work', 'my name is Ada']))
+                self.assertEqual(main(['--session', 'work', 'what is my name? ' * 6]), 1)
+
+        self.assertEqual(len(server.requests), 1)
+        self.assertIn("of them earlier turns", stderr.getvalue())
+        self.assertEqual(len(Session.open("work")), 1)
+
+    def test_sessions_command(self):
+        """Test listing, showing and pruning sessions."""
+        for turn in range(5):
+            Session.open("work").append(f"q{turn}", f"a{turn}")
+        Session.open("old").append("q", "a")
+        os.utime(Session.open("old").directory / "index.bin", (0, 0))
+
+        with patch('sys.stdout', new=io.StringIO()) as stdout:
+            sessions_command(['list'])
+            sessions_command(['show', 'work', '--last', '1'])
+            sessions_command(['prune', '--older-than', '30', '--keep', '2'])
+            sessions_command(['list'])
+
+        lines = stdout.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith("work  5 turns"))
+        self.assertIn("> q4", lines)
+        self.assertIn("Deleted 1 sessions, dropped 3 old turns", lines)
+        self.assertTrue(lines[-1].startswith("work  2 turns"))
+
+
+if __name__ == '__main__':
+    unittest.main()
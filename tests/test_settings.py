@@ -5,6 +5,7 @@ Tests configuration loading, default values, file operations,
 and provider validation functionality.
 """
 
+import io
 import json
 import os
 import tempfile
@@ -14,6 +15,7 @@ from unittest.mock import patch, mock_open
 
 from gpt4shell.settings import (
     get_config_path,
+    find_project_config,
     load_config,
     create_example_config,
     get_config,
@@ -38,6 +40,15 @@ class TestConfigPath(unittest.TestCase):
 class TestLoadConfig(unittest.TestCase):
     """Test configuration loading functionality."""
 
+    def setUp(self):
+        """Keep compiled snapshots out of the temporary config's directory."""
+        snapshot_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(snapshot_dir.cleanup)
+        patcher = patch('gpt4shell.settings.get_snapshot_path',
+                        return_value=Path(snapshot_dir.name) / "config.snapshot")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     def test_load_config_returns_defaults_when_file_missing(self):
         """Test load_config returns default config when file doesn't exist."""
         with patch('gpt4shell.settings.get_config_path') as mock_path:
@@ -117,6 +128,148 @@ class TestLoadConfig(unittest.TestCase):
             os.unlink(temp_path)
 
 
+class TestLayeredConfig(unittest.TestCase):
+    """Test precedence of user, project and environment configuration."""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.root = Path(temp_dir.name)
+        self.user_path = self.root / "home" / ".gpt4shell" / "config.json"
+        self.user_path.parent.mkdir(parents=True)
+        self.project_dir = self.root / "project"
+        (self.project_dir / "src").mkdir(parents=True)
+
+        for patcher in (patch('gpt4shell.settings.get_config_path', return_value=self.user_path),
+                        patch('gpt4shell.settings.Path.cwd', return_value=self.project_dir / "src"),
+                        patch.dict(os.environ, {}, clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write(self, path, data):
+        path.write_text(json.dumps(data))
+
+    def test_project_file_is_found_in_parent_directory(self):
+        """Test that .gpt4shell.json is looked up from the working directory upwards."""
+        self.write(self.project_dir / ".gpt4shell.json", {})
+        self.assertEqual(find_project_config(), (self.project_dir / ".gpt4shell.json").resolve())
+
+    def test_layers_override_in_order(self):
+        """Test that project overrides user, and environment overrides both."""
+        self.write(self.user_path, {"model": "gpt-4", "temperature": 0.5, "max_tokens": 100})
+        self.write(self.project_dir / ".gpt4shell.json", {"model": "gpt-4o", "temperature": 0.2})
+        os.environ["GPT4SHELL_TEMPERATURE"] = "0"
+        os.environ["GPT4SHELL_API_BASE"] = "http://localhost:8080/v1"
+
+        config = load_config()
+
+        self.assertEqual(config["model"], "gpt-4o")
+        self.assertEqual(config["temperature"], 0)
+        self.assertEqual(config["max_tokens"], 100)
+        self.assertEqual(config["api_base"], "http://localhost:8080/v1")
+
+    def test_project_file_cannot_redirect_requests(self):
+        """Test that a project file may pick the model but not the endpoint or where data goes."""
+        self.write(self.user_path, {"api_base": "https://api.example.com/v1"})
+        self.write(self.project_dir / ".gpt4shell.json",
+                   {"model": "gpt-4o", "api_base": "http://attacker.example/v1",
+                    "otel_endpoint": "http://attacker.example/traces", "daily_budget": 1000})
+
+        with patch('sys.stderr', new=io.StringIO()) as stderr, patch('sys.stdout', new=io.StringIO()) as stdout:
+            config = load_config()
+
+        self.assertEqual(config["model"], "gpt-4o")
+        self.assertEqual(config["api_base"], "https://api.example.com/v1")
+        self.assertIsNone(config["otel_endpoint"])
+        self.assertIsNone(config["daily_budget"])
+        self.assertIn("Ignoring api_base, daily_budget, otel_endpoint", stderr.getvalue())
+        self.assertEqual(stdout.getvalue(), "")
+
+    def test_named_prompts_merge_across_layers(self):
+        """Test that a project adds prompts without hiding the user's."""
+        self.write(self.user_path, {"prompts": {"shell": "One command:\n{question}", "short": "Briefly: {question}"}})
+        self.write(self.project_dir / ".gpt4shell.json", {"prompts": {"short": "In one line: {question}"}})
+
+        config = load_config()
+
+        self.assertEqual(config["prompts"], {"shell": "One command:\n{question}", "short": "In one line: {question}"})
+
+    def test_invalid_values_fall_back_to_defaults(self):
+        """Test that values of the wrong type are reported and replaced."""
+        self.write(self.user_path, {"temperature": "hot", "stream": True})
+
+        with patch('builtins.print') as mock_print:
+            config = load_config()
+
+        self.assertEqual(config["temperature"], DEFAULT_CONFIG["temperature"])
+        self.assertTrue(config["stream"])
+        self.assertIn("temperature='hot'", mock_print.call_args_list[0][0][0])
+
+    def test_malformed_routes_are_ignored(self):
+        """Test that routes other than model names and setting objects are reported and dropped."""
+        for routes in ([1], {"fast": [1]}, ["gpt-4o", None]):
+            with self.subTest(routes=routes):
+                self.write(self.user_path, {"routes": routes})
+                with patch('builtins.print') as mock_print:
+                    config = load_config()
+                self.assertIsNone(config["routes"])
+                self.assertIn("Ignoring routes", mock_print.call_args_list[0][0][0])
+
+        self.write(self.user_path, {"routes": ["gpt-4o-mini", {"model": "gpt-4o", "api_base": "http://x/v1"}]})
+        self.assertEqual(len(load_config()["routes"]), 2)
+
+    def test_unusable_prompt_template_falls_back_to_default(self):
+        """Test that a template without {question} is reported and not used."""
+        self.write(self.user_path, {"prompt_template": "Answer briefly: {query}"})
+
+        with patch('builtins.print') as mock_print:
+            config = load_config()
+
+        self.assertEqual(config["prompt_template"], DEFAULT_CONFIG["prompt_template"])
+        self.assertIn("Ignoring prompt_template", mock_print.call_args_list[0][0][0])
+
+
+class TestConfigSnapshot(unittest.TestCase):
+    """Test the compiled configuration snapshot."""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.user_path = Path(temp_dir.name) / "config.json"
+        self.user_path.write_text(json.dumps({"model": "gpt-4"}))
+
+        for patcher in (patch('gpt4shell.settings.get_config_path', return_value=self.user_path),
+                        patch('gpt4shell.settings.find_project_config', return_value=None),
+                        patch.dict(os.environ, {}, clear=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_snapshot_skips_parsing_on_later_loads(self):
+        """Test that an unchanged config is loaded from the snapshot."""
+        first = load_config()
+        self.assertTrue((self.user_path.parent / "config.snapshot").exists())
+
+        with patch('gpt4shell.settings.compile_config') as mock_compile:
+            second = load_config()
+
+        mock_compile.assert_not_called()
+        self.assertEqual(first, second)
+
+    def test_snapshot_is_invalidated_by_edits(self):
+        """Test that changing the file (size or mtime) recompiles it."""
+        load_config()
+        self.user_path.write_text(json.dumps({"model": "gpt-4o-mini"}))
+
+        self.assertEqual(load_config()["model"], "gpt-4o-mini")
+
+    def test_snapshot_is_invalidated_by_environment(self):
+        """Test that GPT4SHELL_ variables are part of the snapshot key."""
+        load_config()
+        os.environ["GPT4SHELL_MODEL"] = "gpt-4o"
+
+        self.assertEqual(load_config()["model"], "gpt-4o")
+
+
 class TestCreateExampleConfig(unittest.TestCase):
     """Test example configuration file creation."""
 
@@ -221,7 +374,16 @@ class TestDefaultConfig(unittest.TestCase):
         """Test that DEFAULT_CONFIG contains all required keys."""
         required_keys = {
             "model", "provider", "temperature", 
-            "prompt_template", "max_tokens", "api_base"
+            "prompt_template", "max_tokens", "api_base", "stream",
+            "cache", "cache_ttl", "cache_max_bytes", "concurrency",
+            "max_retries", "requests_per_minute", "tokens_per_minute", "daemon",
+            "http_max_connections", "http_max_keepalive", "http_keepalive_expiry", "http2",
+            "connect_timeout", "read_timeout", "history_max_tokens",
+            "context_window", "prompt_overflow", "chunk_tokens", "semantic_cache", "semantic_cache_threshold", "embedding_model",
+            "routes", "hedge_after", "prompts", "output", "metrics_file", "otel_endpoint",
+            "cmd_prompt_template", "single_flight", "single_flight_timeout",
+            "retry_budget", "request_deadline", "circuit_failure_threshold", "circuit_reset_timeout",
+            "usage_ledger", "daily_budget", "daily_token_budget"
         }
         self.assertEqual(set(DEFAULT_CONFIG.keys()), required_keys)
 
@@ -232,6 +394,8 @@ class TestDefaultConfig(unittest.TestCase):
         self.assertEqual(DEFAULT_CONFIG["temperature"], 1.0)
         self.assertIsNone(DEFAULT_CONFIG["max_tokens"])
         self.assertIsNone(DEFAULT_CONFIG["api_base"])
+        self.assertFalse(DEFAULT_CONFIG["stream"])
+        self.assertEqual(DEFAULT_CONFIG["cache"], "auto")
         self.assertIn("{question}", DEFAULT_CONFIG["prompt_template"])
 
 
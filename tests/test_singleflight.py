@@ -0,0 +1,164 @@
+"""
+Unit tests for gpt4shell.singleflight module.
+
+Tests coalescing identical requests from several processes against the
+local stand-in server, taking over from a crashed leader, giving up on a
+hung one, that finished calls are never reused and that answers do not
+stay on disk once read.
+"""
+
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from benchmarks.mock_server import MockOpenAIServer
+from gpt4shell import Client
+from gpt4shell.singleflight import SingleFlight
+from gpt4shell.transport import close_http_clients
+
+
+def ask(config, results):
+    results.put(Client(config, "{question}").ask("same question"))
+
+
+def lead_then_crash(directory, started):
+    _, lease = SingleFlight(directory).join("key")
+    started.set()
+    time.sleep(0.3)
+    # Exit without finishing or releasing, as a killed process would
+    os._exit(1)
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Test coalescing through lock files."""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.directory = Path(temp_dir.name) / "inflight"
+        patcher = patch('gpt4shell.singleflight.get_config_path', return_value=Path(temp_dir.name) / "config.json")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.context = multiprocessing.get_context("fork")
+
+    def tearDown(self):
+        close_http_clients()
+
+    def test_identical_requests_from_processes_share_one_call(self):
+        """Test that concurrent processes asking the same question make one request."""
+        with MockOpenAIServer(response_text="shared answer", latency=0.5) as server, \
+             patch.dict(os.environ, {"OPENAI_API_KEY": "test"}):
+            config = {"api_base": server.url, "cache": False}
+            results = self.context.Queue()
+            processes = [self.context.Process(target=ask, args=(config, results)) for _ in range(6)]
+            for process in processes:
+                process.start()
+            answers = [results.get(timeout=10) for _ in processes]
+            for process in processes:
+                process.join()
+
+        self.assertEqual(answers, ["shared answer"] * 6)
+        self.assertEqual(len(server.requests), 1)
+        self.assertEqual(list(self.directory.glob("*.json")), [])
+
+    def test_batch_duplicates_share_one_call(self):
+        """Test that identical questions in one batch make one request."""
+        with MockOpenAIServer(response_text="shared answer", latency=0.3) as server, \
+             patch.dict(os.environ, {"OPENAI_API_KEY": "test"}):
+            client = Client({"api_base": server.url, "cache": False}, "{question}")
+            answers = client.batch(["same question"] * 4 + ["other question"], concurrency=5)
+
+        self.assertEqual(answers, ["shared answer"] * 5)
+        self.assertEqual(len(server.requests), 2)
+
+    def test_crashed_leader_is_taken_over(self):
+        """Test that a waiting request makes the call itself once the leader's process dies."""
+        started = self.context.Event()
+        leader = self.context.Process(target=lead_then_crash, args=(self.directory, started))
+        leader.start()
+        self.assertTrue(started.wait(5))
+
+        begun = time.monotonic()
+        answer, lease = SingleFlight(self.directory).join("key")
+        leader.join()
+
+        self.assertIsNone(answer)
+        self.assertIsNotNone(lease._lock)
+        self.assertGreater(time.monotonic() - begun, 0.1)
+        lease.release()
+
+    def test_hung_leader_times_out(self):
+        """Test that a request stops waiting for a leader after the timeout."""
+        _, leader = SingleFlight(self.directory).join("key")
+
+        begun = time.monotonic()
+        answer, lease = SingleFlight(self.directory, timeout=0.2).join("key")
+
+        self.assertIsNone(answer)
+        self.assertIsNone(lease._lock)
+        self.assertGreaterEqual(time.monotonic() - begun, 0.2)
+        # The waiter's answer is still published for anyone else waiting
+        lease.finish("late answer")
+        leader.release()
+
+    def test_finished_calls_are_not_reused(self):
+        """Test that a request made after the call finished is sent again."""
+        flight = SingleFlight(self.directory)
+        _, lease = flight.join("key")
+        with lease:
+            lease.finish("first answer")
+
+        answer, lease = flight.join("key")
+        self.assertIsNone(answer)
+        self.assertIsNotNone(lease)
+        lease.release()
+
+    def test_answer_is_deleted_once_every_waiter_has_read_it(self):
+        """Test that a published answer is kept for waiting requests only."""
+        flight = SingleFlight(self.directory)
+        _, lease = flight.join("key")
+        waiting = []
+        waiter = threading.Thread(target=lambda: waiting.append(SingleFlight(self.directory).join("key")))
+        waiter.start()
+        time.sleep(0.1)
+
+        with lease:
+            lease.finish("shared answer")
+        waiter.join(5)
+
+        self.assertEqual(waiting, [("shared answer", None)])
+        self.assertFalse((self.directory / "key.json").exists())
+
+        # With no one waiting the answer is not written to stay at all
+        _, lease = flight.join("other")
+        with lease:
+            lease.finish("unshared answer")
+        self.assertFalse((self.directory / "other.json").exists())
+
+    def test_lock_files_are_deleted_once_released(self):
+        """Test that no lock file is left behind per question once its call is over."""
+        flight = SingleFlight(self.directory)
+        _, lease = flight.join("key")
+        waiter = threading.Thread(target=lambda: SingleFlight(self.directory).join("key"))
+        waiter.start()
+        time.sleep(0.1)
+
+        with lease:
+            lease.finish("shared answer")
+        waiter.join(5)
+
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+    def test_disabled_by_config(self):
+        """Test that single_flight false turns coalescing off."""
+        self.assertIsNone(SingleFlight.from_config({"single_flight": False}))
+        self.assertEqual(SingleFlight.from_config({"single_flight_timeout": 5}).timeout, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
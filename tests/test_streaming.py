@@ -0,0 +1,88 @@
+"""
+Tests for streaming output mode.
+
+Uses the local OpenAI-compatible stand-in server from benchmarks/ to check
+that tokens really arrive over SSE through `api_base`.
+"""
+
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+
+from benchmarks.mock_server import MockOpenAIServer
+from gpt4shell import create_model, main, stream_answer
+
+
+class TestStreamAnswer(unittest.TestCase):
+    """Test stream_answer against the SSE stand-in server."""
+
+    def setUp(self):
+        patcher = patch.dict(os.environ, {"OPENAI_API_KEY": "mock-key"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _chain(self, server):
+        from langchain_core.output_parsers import StrOutputParser
+        from langchain_core.prompts import ChatPromptTemplate
+
+        config = {"provider": "openai", "model": "gpt-3.5-turbo", "temperature": 0, "api_base": server.url}
+        prompt = ChatPromptTemplate.from_template("{question}")
+        return prompt | create_model(config) | StrOutputParser()
+
+    def test_stream_answer_returns_full_text(self):
+        """Test that streamed chunks are joined into the complete answer."""
+        with MockOpenAIServer(response_text="Streaming **works** fine") as server, \
+             patch('sys.stdout'):
+            answer = stream_answer(self._chain(server), {"question": "Does it stream?"})
+
+        self.assertEqual(answer, "Streaming **works** fine")
+        self.assertTrue(server.requests[0]["stream"])
+
+    def test_stream_answer_receives_multiple_chunks(self):
+        """Test that the chain yields one chunk per token from the server."""
+        with MockOpenAIServer(response_text="one two three four") as server:
+            chunks = [c for c in self._chain(server).stream({"question": "Count"}) if c]
+
+        self.assertEqual(chunks, ["one ", "two ", "three ", "four"])
+
+
+class TestMainStreaming(unittest.TestCase):
+    """Test that main() selects the streaming path."""
+
+    def _run_main(self, argv, config):
+        mock_chain = MagicMock()
+        mock_chain.stream.return_value = iter(["Hello", " world"])
+        mock_prompt = MagicMock()
+        temp_chain = MagicMock()
+        temp_chain.__or__ = MagicMock(return_value=mock_chain)
+        mock_prompt.__or__ = MagicMock(return_value=temp_chain)
+
+        with patch('sys.argv', argv), \
+             patch('gpt4shell.get_config', return_value=config), \
+             patch('gpt4shell.create_model', return_value=MagicMock()), \
+             patch('gpt4shell.compile_prompt') as mock_compile_prompt, \
+             patch('gpt4shell.StrOutputParser'), \
+             patch('gpt4shell.rich.print') as mock_print, \
+             patch('sys.stdout'):
+            mock_compile_prompt.return_value = mock_prompt
+            main()
+        return mock_chain, mock_print
+
+    def test_stream_flag_uses_chain_stream(self):
+        """Test --stream uses chain.stream instead of chain.invoke."""
+        chain, mock_print = self._run_main(['gpt', '--stream', 'Hi'], {"prompt_template": "{question}"})
+
+        chain.stream.assert_called_once_with({"question": "Hi"})
+        chain.invoke.assert_not_called()
+        mock_print.assert_not_called()
+
+    def test_stream_config_key_enables_streaming(self):
+        """Test that stream: true in config enables streaming without the flag."""
+        chain, _ = self._run_main(['gpt', 'Hi'], {"prompt_template": "{question}", "stream": True})
+
+        chain.stream.assert_called_once_with({"question": "Hi"})
+        chain.invoke.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+Unit tests for gpt4shell.timings module.
+
+Tests span recording, the disabled fast path, JSON Lines and OTLP export,
+and the --timings breakdown from the command line.
+"""
+
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from gpt4shell import main, timings
+
+
+class TestSpans(unittest.TestCase):
+    """Test recording spans."""
+
+    def setUp(self):
+        timings.disable()
+        self.addCleanup(timings.disable)
+
+    def test_disabled_spans_are_shared_no_ops(self):
+        """Test that nothing is allocated or recorded when recording is off."""
+        self.assertIs(timings.span("a"), timings.span("b"))
+        with timings.span("a"):
+            pass
+        timings.record("b", 0.0, 1.0)
+        self.assertIsNone(timings.get_recorder())
+
+    def test_nested_spans_record_depth(self):
+        """Test that spans record their nesting and duration."""
+        recorder = timings.enable()
+        with timings.span("outer"):
+            with timings.span("inner", model="gpt-4"):
+                pass
+
+        spans = {span["name"]: span for span in recorder.spans}
+        self.assertEqual(spans["outer"]["depth"], 0)
+        self.assertEqual(spans["inner"]["depth"], 1)
+        self.assertEqual(spans["inner"]["attributes"], {"model": "gpt-4"})
+        self.assertGreaterEqual(spans["outer"]["duration_ms"], spans["inner"]["duration_ms"])
+
+    def test_configure_enables_export(self):
+        """Test that metrics settings turn recording on."""
+        timings.configure({"metrics_file": None, "otel_endpoint": None})
+        self.assertFalse(timings.enabled())
+
+        timings.configure({"metrics_file": "~/metrics.jsonl"})
+        self.assertEqual(timings.get_recorder().metrics_file, "~/metrics.jsonl")
+
+
+class TestExport(unittest.TestCase):
+    """Test exporting recorded spans."""
+
+    def setUp(self):
+        timings.disable()
+        self.addCleanup(timings.disable)
+
+    def test_finish_appends_jsonl_and_stops_recording(self):
+        """Test that each run becomes one JSON line."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "metrics.jsonl"
+            for _ in range(2):
+                timings.configure({"metrics_file": str(path)})
+                with timings.span("request"):
+                    pass
+                timings.finish()
+
+            lines = path.read_text().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn("request", [span["name"] for span in json.loads(lines[0])["spans"]])
+        self.assertFalse(timings.enabled())
+
+    def test_otlp_payload_nests_spans_under_a_root(self):
+        """Test the OTLP/HTTP JSON trace layout."""
+        recorder = timings.enable()
+        with timings.span("request"):
+            pass
+
+        spans = timings.otlp_payload(recorder)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        root = spans[0]
+        self.assertEqual(root["name"], "gpt")
+        self.assertTrue(all(span["parentSpanId"] == root["spanId"] for span in spans[1:]))
+        self.assertEqual({span["traceId"] for span in spans}, {root["traceId"]})
+        request = next(span for span in spans if span["name"] == "request")
+        self.assertLessEqual(int(request["startTimeUnixNano"]), int(request["endTimeUnixNano"]))
+
+    def test_export_failure_only_warns(self):
+        """Test that an unreachable collector never fails the command."""
+        timings.configure({"otel_endpoint": "http://127.0.0.1:9/v1/traces"})
+        with patch('gpt4shell.timings.export_otlp', side_effect=OSError("refused")), \
+             patch('sys.stderr', new=io.StringIO()) as stderr:
+            timings.finish()
+        self.assertIn("Could not export timings: refused", stderr.getvalue())
+
+
+class TestTimingsCommandLine(unittest.TestCase):
+    """Test the --timings flag."""
+
+    def test_timings_breakdown_goes_to_stderr(self):
+        """Test that the answer stays on stdout and the breakdown on stderr."""
+        config = {"provider": "mock", "mock_response": "answer", "prompt_template": "{question}",
+                  "cache": False, "daemon": False}
+        with patch('gpt4shell.get_config', return_value=config), \
+             patch('sys.stdout', new=io.StringIO()) as stdout, \
+             patch('sys.stderr', new=io.StringIO()) as stderr:
+            main(['--timings', 'hi'])
+
+        self.assertEqual(stdout.getvalue(), "answer\n")
+        report = stderr.getvalue()
+        for name in ("create_model", "request", "render", "total"):
+            self.assertIn(name, report)
+        self.assertFalse(timings.enabled())
+
+
+if __name__ == '__main__':
+    unittest.main()
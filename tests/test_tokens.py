@@ -0,0 +1,160 @@
+"""
+Unit tests for gpt4shell.tokens module.
+
+Uses a character-level fake encoding so results do not depend on tiktoken
+encoding files being downloadable.
+"""
+
+import io
+import unittest
+from unittest.mock import patch
+
+from gpt4shell import main
+from gpt4shell.tokens import (
+    MESSAGE_OVERHEAD,
+    PromptTooLargeError,
+    check_prompt,
+    context_window,
+    count_tokens,
+    dry_run_report,
+    estimate_cost,
+    estimate_tokens,
+    get_encoding,
+)
+
+
+class CharEncoding:
+    """One token per character."""
+
+    def encode(self, text, disallowed_special=()):
+        return list(text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+class TestTokenCounting(unittest.TestCase):
+    """Test counting, windows and prices."""
+
+    def test_count_uses_encoding_when_available(self):
+        """Test that the tokenizer is used when it can be loaded."""
+        with patch('gpt4shell.tokens.get_encoding', return_value=CharEncoding()):
+            self.assertEqual(count_tokens("hello"), 5)
+
+    def test_count_falls_back_to_estimate(self):
+        """Test the four-characters-per-token estimate without a tokenizer."""
+        with patch('gpt4shell.tokens.get_encoding', return_value=None):
+            self.assertEqual(count_tokens("x" * 40), 10)
+            self.assertEqual(count_tokens(""), 0)
+
+    def test_count_falls_back_when_the_encoding_cannot_be_downloaded(self):
+        """Test that a network error loading the encoding files gives the estimate instead."""
+        get_encoding.cache_clear()
+        self.addCleanup(get_encoding.cache_clear)
+        with patch('tiktoken.encoding_for_model', side_effect=ConnectionError("no network")), \
+             patch('tiktoken.get_encoding', side_effect=ConnectionError("no network")):
+            self.assertEqual(count_tokens("x" * 40, "gpt-4"), 10)
+            # Non-ASCII text takes more tokens than characters/4
+            self.assertEqual(count_tokens("日本語" * 4, "gpt-4"), 9)
+
+    def test_context_window_uses_longest_prefix(self):
+        """Test model lookup and the config override."""
+        self.assertEqual(context_window({"model": "gpt-4"}), 8192)
+        self.assertEqual(context_window({"model": "gpt-4-32k-0613"}), 32768)
+        self.assertEqual(context_window({"model": "gpt-4o-mini"}), 128000)
+        self.assertIsNone(context_window({"model": "llama3"}))
+        self.assertEqual(context_window({"model": "llama3", "context_window": 4096}), 4096)
+
+    def test_estimate_cost(self):
+        """Test cost from per-million prices."""
+        self.assertAlmostEqual(estimate_cost("gpt-4", 1000, 1000), 0.09)
+        self.assertIsNone(estimate_cost("llama3", 1000, 1000))
+
+
+class TestCheckPrompt(unittest.TestCase):
+    """Test prompt-size guardrails."""
+
+    def setUp(self):
+        patcher = patch('gpt4shell.tokens.get_encoding', return_value=CharEncoding())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.config = {"model": "gpt-4", "context_window": 100, "max_tokens": 20}
+
+    def test_small_prompt_skips_tokenizer(self):
+        """Test that prompts whose byte size fits are never tokenized."""
+        with patch('gpt4shell.tokens.count_tokens') as mock_count:
+            report = check_prompt(self.config, "Q: {question}", "short")
+
+        mock_count.assert_not_called()
+        self.assertEqual(report["question"], "short")
+        self.assertFalse(report["truncated"])
+
+    def test_oversized_prompt_is_rejected(self):
+        """Test that the default policy rejects prompts that do not fit."""
+        with self.assertRaises(PromptTooLargeError) as context:
+            check_prompt(self.config, "Q: {question}", "x" * 200)
+        self.assertIn("gpt-4 allows", str(context.exception))
+
+    def test_oversized_prompt_is_truncated(self):
+        """Test that the truncate policy shortens the question to fit."""
+        config = dict(self.config, prompt_overflow="truncate")
+        report = check_prompt(config, "Q: {question}", "x" * 200)
+
+        available = 100 - 20 - MESSAGE_OVERHEAD
+        self.assertTrue(report["truncated"])
+        self.assertEqual(len("Q: " + report["question"]), available)
+        self.assertEqual(report["prompt_tokens"], available + MESSAGE_OVERHEAD)
+
+    def test_truncation_without_a_tokenizer_fits_the_estimate(self):
+        """Test that non-ASCII questions are cut to the estimated budget, not to a character count."""
+        config = dict(self.config, prompt_overflow="truncate")
+        with patch('gpt4shell.tokens.get_encoding', return_value=None):
+            report = check_prompt(config, "Q: {question}", "日本語" * 200)
+
+        available = 100 - 20 - MESSAGE_OVERHEAD
+        self.assertTrue(report["truncated"])
+        self.assertLessEqual(estimate_tokens("Q: " + report["question"]), available)
+        self.assertTrue(report["question"].startswith("日本語"))
+
+    def test_unknown_model_is_not_checked(self):
+        """Test that models without a known window are passed through."""
+        report = check_prompt({"model": "llama3"}, "{question}", "x" * 10_000)
+        self.assertIsNone(report["context_window"])
+
+    def test_dry_run_report(self):
+        """Test the --dry-run summary."""
+        text = dry_run_report(check_prompt(self.config, "Q: {question}", "hello"))
+
+        self.assertIn(f"Prompt tokens:    {8 + MESSAGE_OVERHEAD}", text)
+        self.assertIn("Context window:   100", text)
+        self.assertIn("Estimated cost:   $", text)
+
+
+class TestGuardrailsInMain(unittest.TestCase):
+    """Test --dry-run and rejection from the command line."""
+
+    def test_dry_run_does_not_send(self):
+        """Test that --dry-run prints a report without creating a model."""
+        with patch('gpt4shell.get_config', return_value={"model": "gpt-4"}), \
+             patch('gpt4shell.create_model') as mock_create_model, \
+             patch('sys.stdout', new=io.StringIO()) as stdout:
+            self.assertEqual(main(['--dry-run', 'What is Python?']), 0)
+
+        mock_create_model.assert_not_called()
+        self.assertIn("Model:            gpt-4", stdout.getvalue())
+
+    def test_oversized_question_is_rejected_before_sending(self):
+        """Test that an oversized prompt exits with an error and no request."""
+        config = {"model": "gpt-4", "context_window": 50}
+        with patch('gpt4shell.get_config', return_value=config), \
+             patch('gpt4shell.tokens.get_encoding', return_value=CharEncoding()), \
+             patch('gpt4shell.create_model') as mock_create_model, \
+             patch('sys.stderr', new=io.StringIO()) as stderr:
+            self.assertEqual(main(['x' * 500]), 1)
+
+        mock_create_model.assert_not_called()
+        self.assertIn("Error: Prompt is", stderr.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""
+Unit tests for gpt4shell.transport module.
+
+Tests client sharing, settings handling and connection reuse against the
+local stand-in server.
+"""
+
+import os
+import unittest
+from unittest.mock import patch
+
+from benchmarks.mock_server import MockOpenAIServer
+from gpt4shell import create_model
+from gpt4shell.transport import (
+    close_http_clients,
+    get_async_http_client,
+    get_http_client,
+    http2_available,
+    request_timeout,
+    run_async,
+    transport_settings,
+)
+
+
+class TestTransport(unittest.TestCase):
+    """Test the shared HTTP client layer."""
+
+    def tearDown(self):
+        close_http_clients()
+
+    def test_same_settings_share_one_client(self):
+        """Test that models with the same transport settings share a client."""
+        client1 = get_http_client({"model": "gpt-4"})
+        client2 = get_http_client({"model": "gpt-3.5-turbo", "http_max_connections": 20})
+        self.assertIs(client1, client2)
+
+    def test_different_settings_get_different_clients(self):
+        """Test that changing a transport setting gives a separate pool."""
+        self.assertIsNot(get_http_client({}), get_http_client({"http_max_connections": 2}))
+
+    def test_timeouts_come_from_config(self):
+        """Test that connect and read timeouts are applied."""
+        timeout = request_timeout({"connect_timeout": 1.5, "read_timeout": 30})
+        self.assertEqual(timeout.connect, 1.5)
+        self.assertEqual(timeout.read, 30)
+        self.assertEqual(get_http_client({"connect_timeout": 1.5}).timeout.connect, 1.5)
+
+    def test_http2_requires_h2(self):
+        """Test that HTTP/2 is only requested when h2 is installed."""
+        settings = transport_settings({"http2": True})
+        self.assertEqual(settings[3], http2_available())
+        self.assertFalse(transport_settings({"http2": False})[3])
+
+    def test_connections_are_reused_across_models(self):
+        """Test that separately created models reuse one keep-alive connection."""
+        with patch.dict(os.environ, {"OPENAI_API_KEY": "mock-key"}), \
+             MockOpenAIServer(response_text="ok") as server:
+            for _ in range(5):
+                create_model({"api_base": server.url}).invoke("hi")
+
+        self.assertEqual(len(server.requests), 5)
+        self.assertEqual(len(server.connections), 1)
+
+    def test_async_clients_are_shared_per_loop_and_closed_with_it(self):
+        """Test that models on one event loop share an async client that run_async closes."""
+        async def clients():
+            return get_async_http_client({}), get_async_http_client({"model": "gpt-4"})
+
+        first, second = run_async(clients())
+        self.assertIs(first, second)
+        self.assertTrue(first.is_closed)
+        self.assertIsNot(run_async(clients())[0], first)
+
+
+if __name__ == '__main__':
+    unittest.main()
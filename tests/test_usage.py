@@ -0,0 +1,186 @@
+"""
+Unit tests for gpt4shell.usage module.
+
+Tests recording calls made through create_model and cache hits, reports
+that combine the daily rollup with raw calls, daily budgets and the
+`gpt usage` command.
+"""
+
+import io
+import os
+import random
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from benchmarks.mock_server import MockOpenAIServer
+from gpt4shell import Client, create_model, main
+from gpt4shell.transport import close_http_clients
+from gpt4shell.usage import (BudgetExceededError, UsageLedger, day_of, get_usage_ledger, parse_since,
+                             usage_command)
+
+
+class UsageTestCase(unittest.TestCase):
+    """Points the ledger and the cache at a temporary directory."""
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        for patcher in (
+            patch('gpt4shell.usage.get_config_path', return_value=Path(temp_dir.name) / "config.json"),
+            patch('gpt4shell.cache.get_config_path', return_value=Path(temp_dir.name) / "config.json"),
+            patch.dict('gpt4shell.usage._ledgers', clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.ledger = get_usage_ledger({})
+        self.addCleanup(self.ledger.close)
+
+
+class TestRecording(UsageTestCase):
+    """Test what gets recorded."""
+
+    def tearDown(self):
+        close_http_clients()
+
+    def test_calls_through_create_model_are_recorded(self):
+        """Test that provider-reported tokens and latency are recorded per model."""
+        with MockOpenAIServer(response_text="one two three", latency=0.05) as server, \
+             patch.dict(os.environ, {"OPENAI_API_KEY": "test"}):
+            create_model({"api_base": server.url, "model": "gpt-4o-mini"}).invoke("four words of prompt")
+
+        [row] = self.ledger.report()
+        self.assertEqual(row["model"], "gpt-4o-mini")
+        self.assertEqual((row["calls"], row["cache_hits"]), (1, 0))
+        self.assertEqual((row["prompt_tokens"], row["completion_tokens"]), (4, 3))
+        self.assertGreaterEqual(row["avg_latency_ms"], 50)
+        self.assertGreater(row["cost"], 0)
+
+    def test_streams_without_reported_usage_are_estimated(self):
+        """Test that tokens are counted when the provider reports none."""
+        model = create_model({"provider": "mock", "mock_response": "a streamed answer of some length"})
+        list(model.stream("question"))
+
+        [row] = self.ledger.report()
+        self.assertGreater(row["prompt_tokens"], 0)
+        self.assertGreater(row["completion_tokens"], 0)
+
+    def test_cache_hits_are_recorded(self):
+        """Test that answers from the response cache count as calls without tokens."""
+        client = Client({"provider": "mock", "temperature": 0, "single_flight": False}, "{question}")
+        client.ask("same question")
+        client.ask("same question")
+
+        [row] = self.ledger.report()
+        self.assertEqual((row["calls"], row["cache_hits"]), (2, 1))
+
+    def test_disabled_by_config(self):
+        """Test that usage_ledger false records nothing."""
+        self.assertIsNone(get_usage_ledger({"usage_ledger": False}))
+        create_model({"provider": "mock", "usage_ledger": False}).invoke("question")
+        self.assertEqual(self.ledger.report(), [])
+
+
+class TestReports(UsageTestCase):
+    """Test aggregate queries."""
+
+    def test_report_matches_the_raw_calls(self):
+        """Test that rollup days plus the partial first day add up to every call since then."""
+        now = time.time()
+        randomness = random.Random(7)
+        calls = [(now - randomness.uniform(0, 30 * 24 * 3600), randomness.choice(["gpt-4o", "gpt-4o-mini"]),
+                  randomness.random() < 0.2, randomness.randint(1, 500), randomness.randint(1, 500),
+                  randomness.uniform(100, 2000), None)
+                 for _ in range(20000)]
+        self.ledger.record_many(calls)
+
+        since = parse_since("7d", now)
+        rows = {row["model"]: row for row in self.ledger.report(since, by="model")}
+        for model in ("gpt-4o", "gpt-4o-mini"):
+            expected = [call for call in calls if call[0] >= since and call[1] == model]
+            self.assertEqual(rows[model]["calls"], len(expected))
+            self.assertEqual(rows[model]["cache_hits"], sum(call[2] for call in expected))
+            self.assertEqual(rows[model]["prompt_tokens"], sum(call[3] for call in expected))
+
+        days = self.ledger.report(since, by="day")
+        self.assertEqual(days[0]["day"], day_of(since))
+        self.assertEqual(sum(day["calls"] for day in days), sum(row["calls"] for row in rows.values()))
+        [total] = self.ledger.report(by="total")
+        self.assertEqual(total["calls"], len(calls))
+
+    def test_report_only_scans_calls_of_the_first_day(self):
+        """Test that raw calls are read through the time index and whole days from the rollup."""
+        connection = self.ledger._connect()
+        plan = " ".join(row[-1] for row in connection.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM calls WHERE ts >= ? AND ts < ?", (0, 1)))
+        self.assertIn("calls_ts", plan)
+        plan = " ".join(row[-1] for row in connection.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM daily WHERE day = ? AND cached = 0", ("2024-01-01",)))
+        self.assertIn("PRIMARY KEY", plan)
+
+    def test_parse_since(self):
+        """Test relative durations and dates."""
+        self.assertEqual(parse_since("7d", now=1_000_000), 1_000_000 - 7 * 24 * 3600)
+        self.assertEqual(parse_since("90m", now=1_000_000), 1_000_000 - 90 * 60)
+        self.assertEqual(day_of(parse_since("2024-05-01")), "2024-05-01")
+        with self.assertRaises(ValueError):
+            parse_since("last week")
+
+
+class TestBudgets(UsageTestCase):
+    """Test daily budgets and the command line."""
+
+    def test_requests_are_refused_once_the_budget_is_spent(self):
+        """Test that a model refuses calls after today's spending reaches the cap."""
+        config = {"provider": "mock", "model": "gpt-4o", "daily_budget": 0.01}
+        model = create_model(config)
+        model.invoke("question")
+
+        self.ledger.record("gpt-4o", prompt_tokens=1000, completion_tokens=1000, cost=0.02)
+        with self.assertRaises(BudgetExceededError):
+            model.invoke("question")
+        # Yesterday's spending does not count
+        self.assertEqual(self.ledger.spent(day_of(time.time() - 24 * 3600))["cost"], 0)
+
+    def test_token_budget_from_the_command_line(self):
+        """Test that gpt prints an error instead of asking once the token budget is used."""
+        self.ledger.record("gpt-3.5-turbo", prompt_tokens=60, completion_tokens=60)
+        config = {"provider": "mock", "daily_token_budget": 100, "cache": False, "daemon": False}
+        with patch('gpt4shell.get_config', return_value=config), \
+             patch('sys.stderr', new=io.StringIO()) as stderr:
+            self.assertEqual(main(['hello']), 1)
+        self.assertIn("Daily token budget of 100 reached", stderr.getvalue())
+
+    def test_usage_command(self):
+        """Test the table report and the budget line."""
+        self.ledger.record("gpt-4o", prompt_tokens=10, completion_tokens=20, latency_ms=500, cost=0.5)
+        self.ledger.record("gpt-4o", cached=True)
+        self.ledger.record("gpt-4o-mini", prompt_tokens=5, completion_tokens=5, latency_ms=100, cost=0.1,
+                           ts=time.time() - 30 * 24 * 3600)
+        config = {"daily_budget": 2.0}
+        with patch('gpt4shell.settings.get_config', return_value=config), \
+             patch('sys.stdout', new=io.StringIO()) as stdout:
+            self.assertEqual(usage_command(['--since', '7d', '--by', 'model']), 0)
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(lines[0].split(), ["model", "calls", "cached", "prompt", "completion", "latency", "cost"])
+        self.assertEqual(lines[1].split(), ["gpt-4o", "2", "1", "10", "20", "500ms", "$0.500000"])
+        self.assertEqual(lines[-1], "Today: $0.500000 of the $2.00 daily budget")
+
+
+class TestLedgerFile(unittest.TestCase):
+    """Test the database file itself."""
+
+    def test_write_ahead_logging(self):
+        """Test that the ledger runs in WAL mode so writers do not block readers."""
+        with tempfile.TemporaryDirectory() as directory:
+            ledger = UsageLedger(Path(directory) / "usage.db")
+            ledger.record("gpt-4o")
+            mode = ledger._connect().execute("PRAGMA journal_mode").fetchone()[0]
+            ledger.close()
+        self.assertEqual(mode, "wal")
+
+
+if __name__ == '__main__':
+    unittest.main()